@@ -0,0 +1,76 @@
+import json
+import os
+import re
+import socket
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from config_transfer import is_local_url, local_path, open_local
+from configuration_flow import ConfigDigest
+
+ARTIFACT_PORTS = {"ftp": 21, "scp": 22, "sftp": 22, "http": 80, "https": 443}
+DIGEST_NAME_PATTERN = re.compile(r"-(?:running|startup)-([0-9a-f]{16})(?:\.gz)?$")
+CONNECT_TIMEOUT = 5
+
+
+def parse_saved_artifacts(saved_artifacts):
+    """Return ordered mapping of resource name to its saved artifact info.
+
+    Accepts a json object {resource name: saved artifact info} or the result
+    of orchestration_save_bulk.
+
+    :rtype: collections.OrderedDict
+    """
+    data = json.loads(saved_artifacts, object_pairs_hook=OrderedDict)
+    if "results" in data:
+        data = OrderedDict(
+            (result["resource_name"], result["result"])
+            for result in data["results"]
+            if result.get("success")
+        )
+    return OrderedDict(
+        (name, info if isinstance(info, str) else json.dumps(info))
+        for name, info in data.items()
+    )
+
+
+def check_artifact(path, timeout=CONNECT_TIMEOUT):
+    """Check that the saved configuration can be restored from the path.
+
+    Local files are read and compared with the digest from the file name of
+    deduplicated backups. For remote servers only a TCP connection to the
+    service port is checked, TFTP servers can't be checked without a
+    transfer.
+
+    :param str path: url of the configuration file
+    :return: None if the artifact is valid or the reason why it is not
+    :rtype: str
+    """
+    if is_local_url(path):
+        return _check_local_artifact(local_path(path))
+
+    url = urlparse(path)
+    port = url.port or ARTIFACT_PORTS.get(url.scheme.lower())
+    if not port:
+        return None
+    try:
+        socket.create_connection((url.hostname, port), timeout).close()
+    except (socket.error, OSError) as e:
+        return "{} is not reachable: {}".format(url.hostname, e)
+    return None
+
+
+def _check_local_artifact(path):
+    if not os.path.isfile(path):
+        return "File {} doesn't exist".format(path)
+
+    match = DIGEST_NAME_PATTERN.search(os.path.basename(path))
+    if not match:
+        return None
+    digest = ConfigDigest()
+    with open_local(path) as config_file:
+        for line in config_file:
+            digest.update(line)
+    if not digest.hexdigest().startswith(match.group(1)):
+        return "Checksum of {} doesn't match".format(path)
+    return None
@@ -0,0 +1,194 @@
+import base64
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from contextlib import closing
+from threading import Lock
+
+from cloudshell.shell.core.driver_context import (
+    AutoLoadAttribute,
+    AutoLoadDetails,
+    AutoLoadResource,
+)
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+
+from snmp_autoload import AutoloadState, get_varbind
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+_v2c = api.protoModules[api.protoVersion2c]
+
+
+def dump_autoload_state(state) -> bytes:
+    """Serialize autoload state into compressed json.
+
+    Table responses are stored as BER encoded varbinds, so their SNMP types
+    survive the round trip.
+    """
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "markers": state.markers,
+        "resources": [
+            [
+                resource.model,
+                resource.name,
+                resource.relative_address,
+                resource.unique_identifier,
+            ]
+            for resource in state.details.resources
+        ],
+        "attributes": [
+            [
+                attribute.relative_address,
+                attribute.attribute_name,
+                attribute.attribute_value,
+            ]
+            for attribute in state.details.attributes
+        ],
+        "tables": {
+            group: {
+                oid: [_encode_varbind(response) for response in responses]
+                for oid, responses in tables.items()
+            }
+            for group, tables in state.tables.items()
+        },
+    }
+    return zlib.compress(json.dumps(data).encode("utf-8"))
+
+
+def load_autoload_state(blob) -> AutoloadState:
+    """Restore autoload state, table responses become (oid, value) pairs."""
+    data = json.loads(zlib.decompress(blob).decode("utf-8"))
+    if data.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported snapshot version {}".format(data.get("version")))
+    details = AutoLoadDetails(
+        resources=[AutoLoadResource(*resource) for resource in data["resources"]],
+        attributes=[AutoLoadAttribute(*attribute) for attribute in data["attributes"]],
+    )
+    tables = {
+        group: {
+            oid: [_decode_varbind(varbind) for varbind in varbinds]
+            for oid, varbinds in group_tables.items()
+        }
+        for group, group_tables in data["tables"].items()
+    }
+    return AutoloadState(data["markers"], details, tables)
+
+
+def _encode_varbind(response):
+    varbind = _v2c.VarBind()
+    _v2c.apiVarBind.setOIDVal(varbind, get_varbind(response))
+    return base64.b64encode(encoder.encode(varbind)).decode("ascii")
+
+
+def _decode_varbind(data):
+    varbind, _ = decoder.decode(base64.b64decode(data), asn1Spec=_v2c.VarBind())
+    oid, value = _v2c.apiVarBind.getOIDVal(varbind)
+    return oid, value
+
+
+class AutoloadSnapshotStore(object):
+    """Last autoload state of every resource kept in a SQLite database.
+
+    A restarted driver process uses the snapshot as the previous state of the
+    incremental autoload, so the first discovery after the restart reads the
+    change markers and identity of the device instead of walking all tables.
+    Snapshots are indexed by resource name and by sysObjectID and chassis
+    serial number of the device.
+    """
+
+    DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "cisco_nxos_autoload.sqlite")
+    TIMEOUT = 10
+
+    def __init__(self, path=DEFAULT_PATH, max_age=None):
+        """Autoload snapshot store.
+
+        :param str path: database file
+        :param int max_age: seconds after which a snapshot is ignored
+        """
+        self._path = path
+        self._max_age = max_age
+        self._lock = Lock()
+        self._initialized = False
+
+    def get(self, key, fingerprint):
+        """Return AutoloadState stored for key and fingerprint or None."""
+        try:
+            with self._lock, closing(self._connect()) as connection:
+                row = connection.execute(
+                    "SELECT fingerprint, created, data FROM autoload_snapshot "
+                    "WHERE resource_name = ?",
+                    (key,),
+                ).fetchone()
+            if not row or row[0] != fingerprint or self._expired(row[1]):
+                return None
+            return load_autoload_state(row[2])
+        except (sqlite3.Error, ValueError, KeyError, TypeError, zlib.error) as e:
+            logger.warning("Unable to read autoload snapshot of {}: {}".format(key, e))
+
+    def put(self, key, fingerprint, state):
+        serial_oid, serial = state.chassis_serial()
+        try:
+            data = dump_autoload_state(state)
+            with self._lock, closing(self._connect()) as connection:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO autoload_snapshot (resource_name, "
+                        "fingerprint, sys_object_id, serial, created, data) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            key,
+                            fingerprint,
+                            state.markers.get("sysObjectID"),
+                            serial,
+                            time.time(),
+                            sqlite3.Binary(data),
+                        ),
+                    )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("Unable to write autoload snapshot of {}: {}".format(key, e))
+
+    def invalidate(self, key=None):
+        """Drop the snapshot for key, or every snapshot if key is not provided."""
+        try:
+            with self._lock, closing(self._connect()) as connection:
+                with connection:
+                    if key is None:
+                        connection.execute("DELETE FROM autoload_snapshot")
+                    else:
+                        connection.execute(
+                            "DELETE FROM autoload_snapshot WHERE resource_name = ?",
+                            (key,),
+                        )
+        except sqlite3.Error as e:
+            logger.warning("Unable to drop autoload snapshots: {}".format(e))
+
+    def _connect(self):
+        connection = sqlite3.connect(self._path, timeout=self.TIMEOUT)
+        if not self._initialized:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS autoload_snapshot ("
+                    "resource_name TEXT PRIMARY KEY, "
+                    "fingerprint TEXT NOT NULL, "
+                    "sys_object_id TEXT, "
+                    "serial TEXT, "
+                    "created REAL NOT NULL, "
+                    "data BLOB NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS autoload_snapshot_identity "
+                    "ON autoload_snapshot (sys_object_id, serial)"
+                )
+            self._initialized = True
+        return connection
+
+    def _expired(self, created):
+        return self._max_age is not None and time.time() - created >= self._max_age
@@ -0,0 +1,193 @@
+import time
+from threading import Lock
+
+from cloudshell.cli.session.session_exceptions import (
+    ExpectedSessionException,
+    SessionReadEmptyData,
+    SessionReadTimeout,
+)
+from cloudshell.networking.cisco.cli.cisco_command_modes import (
+    ConfigCommandMode,
+    DefaultCommandMode,
+    EnableCommandMode,
+)
+
+# prompts of the command modes, they match the last line of the output only
+MODE_PROMPTS = frozenset(
+    mode.PROMPT for mode in (DefaultCommandMode, EnableCommandMode, ConfigCommandMode)
+)
+
+
+class Ewma(object):
+    """Exponentially weighted moving average and mean deviation of samples."""
+
+    def __init__(self, alpha=0.125, beta=0.25):
+        self._alpha = alpha
+        self._beta = beta
+        self.mean = None
+        self.deviation = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        if self.mean is None:
+            self.mean = value
+            self.deviation = value / 2
+        else:
+            self.deviation += self._beta * (abs(value - self.mean) - self.deviation)
+            self.mean += self._alpha * (value - self.mean)
+        self.count += 1
+
+    def upper_bound(self):
+        """Return mean plus four deviations, like TCP retransmission timeout."""
+        return self.mean + 4 * self.deviation
+
+
+class CliLatency(object):
+    """Round-trip and command completion latency of the CLI of a resource.
+
+    Round trip is the time from sending a command to the first output, it
+    sizes the polling interval, i.e. how long the session waits for more
+    output before it checks the prompt and how long it drains the buffer
+    around a command. Command completion sizes the read timeout of commands
+    sent without an explicit timeout.
+    """
+
+    MIN_POLL_INTERVAL = 0.02
+    MAX_POLL_INTERVAL = 0.5
+    MAX_READ_TIMEOUT = 300
+    READ_TIMEOUT_FACTOR = 3
+
+    def __init__(self):
+        self._lock = Lock()
+        self.round_trip = Ewma()
+        self.completion = Ewma()
+
+    def observe_round_trip(self, seconds):
+        with self._lock:
+            self.round_trip.observe(seconds)
+
+    def observe_completion(self, seconds):
+        with self._lock:
+            self.completion.observe(seconds)
+
+    def poll_interval(self, default):
+        with self._lock:
+            if not self.round_trip.count:
+                return default
+            return min(
+                max(self.round_trip.upper_bound(), self.MIN_POLL_INTERVAL),
+                self.MAX_POLL_INTERVAL,
+            )
+
+    def read_timeout(self, default):
+        """Return read timeout, never shorter than the default of the session."""
+        with self._lock:
+            if not self.completion.count:
+                return default
+            return min(
+                max(self.READ_TIMEOUT_FACTOR * self.completion.upper_bound(), default),
+                max(self.MAX_READ_TIMEOUT, default),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "round_trip": self.round_trip.mean,
+                "completion": self.completion.mean,
+                "samples": self.completion.count,
+            }
+
+    def tune_session(self, session):
+        """Size timeouts of the CLI session from the latency of the resource."""
+        return _AdaptiveSession(self, session).attach()
+
+
+class CliLatencyRegistry(object):
+    """CLI latency of every resource handled by the driver."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._latencies = {}
+
+    def get(self, key) -> CliLatency:
+        with self._lock:
+            latency = self._latencies.get(key)
+            if latency is None:
+                latency = self._latencies[key] = CliLatency()
+            return latency
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._latencies.clear()
+            else:
+                self._latencies.pop(key, None)
+
+
+class _AdaptiveSession(object):
+    """Adaptive timeouts and tail-only prompt matching for an expect session.
+
+    Prompts of the command modes are matched against the tail of the output,
+    so long outputs don't get rescanned for every chunk read. Other expected
+    strings, i.e. of pipelined commands, may need the whole output.
+    """
+
+    PROMPT_WINDOW = 4096
+
+    def __init__(self, latency, session):
+        self._latency = latency
+        self._session = session
+        self._read_timeout = session._timeout
+        self._clear_buffer_timeout = session._clear_buffer_timeout
+        self._poll_interval = self._clear_buffer_timeout
+        self._sent_at = None
+        self._hardware_expect = session.hardware_expect
+        self._send_line = session.send_line
+        self._match_prompt = session.match_prompt
+
+    def attach(self):
+        self._session.hardware_expect = self.hardware_expect
+        self._session.send_line = self.send_line
+        self._session._receive_all = self.receive_all
+        self._session.match_prompt = self.match_prompt
+        return self._session
+
+    def hardware_expect(self, command, expected_string, logger, *args, **kwargs):
+        self._poll_interval = self._latency.poll_interval(self._clear_buffer_timeout)
+        self._session._clear_buffer_timeout = self._poll_interval
+        self._session._timeout = self._latency.read_timeout(self._read_timeout)
+        started = time.time()
+        output = self._hardware_expect(
+            command, expected_string, logger, *args, **kwargs
+        )
+        if command:
+            self._latency.observe_completion(time.time() - started)
+        return output
+
+    def send_line(self, command, logger):
+        self._send_line(command, logger)
+        self._sent_at = time.time()
+
+    def receive_all(self, timeout, logger):
+        timeout = timeout or self._session._timeout
+        started = time.time()
+        read_buffer = ""
+        while True:
+            try:
+                read_buffer += self._session._receive(self._poll_interval, logger)
+            except (SessionReadTimeout, SessionReadEmptyData):
+                if read_buffer:
+                    return read_buffer
+                if time.time() - started > timeout:
+                    raise ExpectedSessionException(
+                        self._session.__class__.__name__, "Socket closed by timeout"
+                    )
+                continue
+            if self._sent_at is not None:
+                self._latency.observe_round_trip(time.time() - self._sent_at)
+                self._sent_at = None
+
+    def match_prompt(self, prompt, match_string, logger):
+        if len(match_string) > self.PROMPT_WINDOW and prompt in MODE_PROMPTS:
+            match_string = match_string[-self.PROMPT_WINDOW :]
+        return self._match_prompt(prompt, match_string, logger)
@@ -0,0 +1,247 @@
+import json
+import re
+
+from cloudshell.networking.cisco.flows.cisco_run_command_flow import CiscoRunCommandFlow
+
+ERROR_PATTERN = re.compile(
+    r"^\s*%|invalid command|incomplete command|syntax error|ambiguous command",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+CACHEABLE_COMMANDS = (
+    "show version",
+    "show interface brief",
+    "show vlan",
+    "show inventory",
+    "show module",
+    "show hostname",
+)
+JSON_SUFFIX_PATTERN = re.compile(r"\|\s*json(?:-pretty)?\s*$", re.IGNORECASE)
+SHOW_COMMAND_PATTERN = re.compile(r"^(?:do\s+)?sh(?:ow?)?(?:\s|$)", re.IGNORECASE)
+
+
+def is_show_command(command):
+    """Check if the command only displays state and never asks to confirm."""
+    return bool(SHOW_COMMAND_PATTERN.match(command.strip()))
+
+
+def to_json_command(command):
+    """Return the show command with NX-OS "| json" output modifier."""
+    command = " ".join(command.split())
+    if JSON_SUFFIX_PATTERN.search(command):
+        return command
+    return "{} | json".format(command)
+
+
+def is_cacheable(command):
+    """Check if output of the show command may be reused between calls."""
+    command = JSON_SUFFIX_PATTERN.sub("", " ".join(command.split())).strip().lower()
+    return command in CACHEABLE_COMMANDS or any(
+        command.startswith(cacheable + " ") for cacheable in CACHEABLE_COMMANDS
+    )
+
+
+def parse_json_output(output):
+    """Return JSON document printed by the command, prompt and echo are ignored."""
+    start = output.find("{")
+    end = output.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("Command output doesn't contain JSON")
+    return json.loads(output[start : end + 1])
+
+
+def command_pattern(command):
+    """Return pattern matching echo of the command with any whitespace."""
+    return r"\s+".join(re.escape(part) for part in command.split())
+
+
+class CommandResult(object):
+    def __init__(self, command, output, success=None):
+        self.command = command
+        self.output = output
+        self.success = not ERROR_PATTERN.search(output) if success is None else success
+
+    def to_dict(self):
+        return {
+            "command": self.command,
+            "output": self.output,
+            "success": self.success,
+        }
+
+
+class PipelinedCiscoRunCommandFlow(CiscoRunCommandFlow):
+    """Run command flow sending a batch of show commands in a single write.
+
+    Output is split by the echoed commands and the prompts between them.
+    If echoes can't be located the commands are re-sent one by one. Other
+    commands may ask for a confirmation which would consume the next line of
+    the batch, they are sent one by one.
+    """
+
+    PIPELINE_BATCH_SIZE = 20
+
+    def __init__(self, logger, cli_configurator, batch_size=PIPELINE_BATCH_SIZE):
+        super(PipelinedCiscoRunCommandFlow, self).__init__(logger, cli_configurator)
+        self._batch_size = max(int(batch_size), 1)
+
+    def _run_command_flow(self, custom_command, is_config=False):
+        results = self.run_commands(custom_command, is_config)
+        return "\n".join(result.output for result in results)
+
+    def run_commands(self, custom_command, is_config=False):
+        """Execute commands and return result of every command.
+
+        :param str|list[str] custom_command: commands separated by ';'
+        :param bool is_config: if True then run commands in configuration mode
+        :rtype: list[CommandResult]
+        """
+        commands = [
+            command.strip()
+            for command in self.parse_custom_commands(custom_command)
+            if command.strip()
+        ]
+        if is_config:
+            service_manager = self._cli_configurator.config_mode_service()
+        else:
+            service_manager = self._cli_configurator.enable_mode_service()
+
+        results = []
+        with service_manager as session:
+            for batch in self._get_batches(commands):
+                results.extend(self._send_batch(session, batch))
+        return results
+
+    def _get_batches(self, commands):
+        """Group consecutive show commands, other commands are sent alone."""
+        batch = []
+        for command in commands:
+            if not is_show_command(command) or len(batch) >= self._batch_size:
+                if batch:
+                    yield batch
+                batch = []
+            if is_show_command(command):
+                batch.append(command)
+            else:
+                yield [command]
+        if batch:
+            yield batch
+
+    def run_commands_json(self, custom_command, is_config=False):
+        """Execute commands and return JSON list of the command results."""
+        return json.dumps(
+            [
+                result.to_dict()
+                for result in self.run_commands(custom_command, is_config)
+            ]
+        )
+
+    def run_json_commands(self, custom_command, cache=None):
+        """Execute show commands with "| json" and return parsed results.
+
+        Results of idempotent show commands are taken from and stored to
+        the cache.
+
+        :param str|list[str] custom_command: commands separated by ';'
+        :param resource_cache.ResourceCache cache: cache of the resource
+        :return: json list with command, parsed output, success and cached flag
+        :rtype: str
+        """
+        commands = [
+            to_json_command(command)
+            for command in self.parse_custom_commands(custom_command)
+            if command.strip()
+        ]
+        results = [None] * len(commands)
+        pending = []
+        for index, command in enumerate(commands):
+            cached = None
+            if cache is not None and is_cacheable(command):
+                cached = cache.peek(command, "")
+            if cached is None:
+                pending.append(index)
+            else:
+                results[index] = dict(cached, cached=True)
+
+        if pending:
+            command_results = self.run_commands([commands[i] for i in pending])
+            for index, command_result in zip(pending, command_results):
+                result = self._parse_json_result(command_result)
+                if (
+                    cache is not None
+                    and result["success"]
+                    and is_cacheable(result["command"])
+                ):
+                    cache.put(result["command"], "", result)
+                results[index] = dict(result, cached=False)
+        return json.dumps(results)
+
+    def _parse_json_result(self, command_result):
+        result = {"command": command_result.command, "success": False}
+        if not command_result.success:
+            result["output"] = command_result.output
+            return result
+        try:
+            result["output"] = parse_json_output(command_result.output)
+        except ValueError as e:
+            self._logger.debug("Unable to parse output: {}".format(e))
+            result["output"] = command_result.output
+        else:
+            result["success"] = True
+        return result
+
+    def _send_batch(self, session, commands):
+        if len(commands) == 1:
+            return [CommandResult(commands[0], session.send_command(commands[0]))]
+
+        prompt = session.command_mode.prompt
+        patterns = [command_pattern(command) for command in commands]
+        expected_string = ".*?".join(patterns) + ".*" + prompt
+        output = session.send_command(
+            "\n".join(commands),
+            expected_string=expected_string,
+            remove_command_from_output=False,
+        )
+
+        outputs = self._split_output(output, patterns, prompt)
+        if outputs is not None:
+            return [
+                CommandResult(command, command_output)
+                for command, command_output in zip(commands, outputs)
+            ]
+
+        self._logger.warning("Unable to split pipelined output by command echoes")
+        if not all(is_show_command(command) for command in commands):
+            # the commands have already run, re-sending would repeat them
+            return [CommandResult("\n".join(commands), output)]
+        return [
+            CommandResult(command, session.send_command(command))
+            for command in commands
+        ]
+
+    @staticmethod
+    def _split_output(output, patterns, prompt):
+        """Split the batch output into outputs of the commands.
+
+        Return None if echo of any of the commands is not found.
+        """
+        boundaries = []
+        position = 0
+        for pattern in patterns:
+            match = re.compile(pattern).search(output, position)
+            if not match:
+                return None
+            boundaries.append((match.start(), match.end()))
+            position = match.end()
+
+        outputs = []
+        for index, (_, end) in enumerate(boundaries):
+            if index + 1 < len(boundaries):
+                command_output = output[end : boundaries[index + 1][0]]
+            else:
+                command_output = output[end:]
+            lines = command_output.strip("\r\n").splitlines()
+            if lines and re.search(prompt, lines[-1]):
+                lines = lines[:-1]
+            outputs.append("\n".join(lines).strip("\r\n"))
+        return outputs
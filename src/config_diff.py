@@ -0,0 +1,113 @@
+import re
+from collections import OrderedDict
+
+VOLATILE_LINE_PATTERN = re.compile(
+    r"^\s*!(?:Time:|Running configuration last done at:|Startup config saved at:"
+    r"|Command:|No configuration change since last restart)",
+    re.IGNORECASE,
+)
+PROMPT_LINE_PATTERN = re.compile(r"^\S+#\s*$")
+IGNORED_PREFIXES = ("!", "version ", "boot ")
+# Interfaces of ports and management, these can be reset but not deleted
+PHYSICAL_INTERFACE_PATTERN = re.compile(
+    r"^interface\s+(?:Ethernet|mgmt)\d+(?:/\d+)*$", re.IGNORECASE
+)
+
+
+def normalize_config(config):
+    """Return configuration without timestamps, prompt and empty lines."""
+    lines = []
+    for line in config.splitlines():
+        line = line.rstrip()
+        if (
+            not line
+            or VOLATILE_LINE_PATTERN.match(line)
+            or PROMPT_LINE_PATTERN.match(line)
+        ):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class ConfigSection(object):
+    """Configuration line with the lines nested under it."""
+
+    def __init__(self, line=None):
+        self.line = line
+        self.children = OrderedDict()
+
+    def to_lines(self, indent=0):
+        lines = []
+        for child in self.children.values():
+            lines.append(" " * indent + child.line)
+            lines.extend(child.to_lines(indent + 2))
+        return lines
+
+
+def parse_config(config):
+    """Parse configuration text into a tree of sections by indentation."""
+    root = ConfigSection()
+    stack = [(-1, root)]
+    for line in normalize_config(config).splitlines():
+        text = line.strip()
+        if not text or text.startswith(IGNORED_PREFIXES):
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        while stack[-1][0] >= indent:
+            stack.pop()
+        parent = stack[-1][1]
+        section = parent.children.setdefault(text, ConfigSection(text))
+        stack.append((indent, section))
+    return root
+
+
+def negate(line):
+    if line.startswith("no "):
+        return line[3:]
+    return "no {}".format(line)
+
+
+def remove(line, indent=0):
+    """Return command removing the line, physical interfaces are defaulted."""
+    if not indent and PHYSICAL_INTERFACE_PATTERN.match(line):
+        return "default {}".format(line)
+    return " " * indent + negate(line)
+
+
+def diff_sections(current, target, indent=0):
+    """Return commands transforming the current section into the target one.
+
+    Lines missing in the target are negated (physical interfaces are reset
+    with "default interface") before new lines are added, changed sections
+    are entered and diffed recursively.
+    """
+    commands = []
+    prefix = " " * indent
+    for line, section in current.children.items():
+        if line not in target.children and negate(line) not in target.children:
+            commands.append(remove(line, indent))
+
+    for line, section in target.children.items():
+        current_section = current.children.get(line)
+        if current_section is None:
+            commands.append(prefix + line)
+            commands.extend(section.to_lines(indent + 2))
+            if section.children:
+                commands.append(prefix + "  exit")
+            continue
+        child_commands = diff_sections(current_section, section, indent + 2)
+        if child_commands:
+            commands.append(prefix + line)
+            commands.extend(child_commands)
+            commands.append(prefix + "  exit")
+    return commands
+
+
+def diff_config(current_config, target_config):
+    """Return configuration commands to turn current config into the target one.
+
+    :param str current_config: running configuration of the device
+    :param str target_config: configuration to restore
+    :rtype: list[str]
+    """
+    return diff_sections(parse_config(current_config), parse_config(target_config))
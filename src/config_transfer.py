@@ -0,0 +1,170 @@
+import ftplib
+import gzip
+import io
+import os
+import posixpath
+import re
+import time
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
+from cloudshell.cli.session.session_exceptions import (
+    SessionReadEmptyData,
+    SessionReadTimeout,
+)
+
+from config_diff import IGNORED_PREFIXES
+
+CHUNK_SIZE = 64 * 1024
+LOCAL_SCHEMES = ("file",)
+GZIP_MAGIC = b"\x1f\x8b"
+RECEIVE_TIMEOUT = 0.1
+READ_TIMEOUT = 300
+ARTIFACT_CHECK_TIMEOUT = 5
+
+
+def is_local_url(url):
+    """Check if the url points to the file system of the driver host."""
+    return urlparse(url).scheme.lower() in LOCAL_SCHEMES
+
+
+def local_path(url):
+    """Return file system path of the file:// url."""
+    parsed = urlparse(url)
+    return url2pathname(parsed.netloc + parsed.path)
+
+
+def artifact_exists(folder_url, filename, timeout=ARTIFACT_CHECK_TIMEOUT):
+    """Check that the file is still stored in the folder.
+
+    Local folders and FTP servers are checked, other storages, i.e. TFTP,
+    can't be checked without a transfer.
+
+    :param str folder_url: url of the folder
+    :param str filename: name of the file in the folder
+    :return: None if the storage can't be checked
+    :rtype: bool|None
+    """
+    if is_local_url(folder_url):
+        return os.path.isfile(os.path.join(local_path(folder_url), filename))
+
+    url = urlparse(folder_url)
+    if url.scheme.lower() != "ftp":
+        return None
+    try:
+        ftp = ftplib.FTP(timeout=timeout)
+        try:
+            ftp.connect(url.hostname, url.port or ftplib.FTP_PORT)
+            ftp.login(unquote(url.username or "anonymous"), unquote(url.password or ""))
+            ftp.voidcmd("TYPE I")
+            ftp.size(posixpath.join(unquote(url.path) or "/", filename))
+        finally:
+            ftp.close()
+    except ftplib.error_perm:
+        return False
+    except (ftplib.Error, OSError, EOFError):
+        return None
+    return True
+
+
+def open_local(path, mode="r", compress=False):
+    """Open configuration file as text, gzip files are detected on read.
+
+    :param str path: file system path
+    :param str mode: "r" or "w"
+    :param bool compress: write gzip compressed file
+    """
+    if mode == "r":
+        with open(path, "rb") as config_file:
+            compress = config_file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    if compress:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return io.open(path, mode, encoding="utf-8")
+
+
+def iter_config_batches(config_file, chunk_size=CHUNK_SIZE):
+    """Yield lists of configuration lines of about chunk_size characters.
+
+    Empty lines, comments and lines rejected by the device in configuration
+    mode (version, boot) are skipped.
+    """
+    batch = []
+    size = 0
+    for line in config_file:
+        line = line.rstrip()
+        if not line.strip() or line.strip().startswith(IGNORED_PREFIXES):
+            continue
+        batch.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+def stream_command_output(
+    cli_service, command, logger, chunk_size=CHUNK_SIZE, timeout=READ_TIMEOUT
+):
+    """Send the command and yield its output in chunks of whole lines.
+
+    Output is read directly from the session into a chunk buffer joined once
+    per chunk, only the current chunk and the incomplete last line are kept
+    in memory. Reading stops when the session is idle and the last line
+    matches the prompt of the mode.
+
+    :param cloudshell.cli.service.cli_service.CliService cli_service:
+    :param str command:
+    :param logging.Logger logger:
+    :param int chunk_size: approximate size of the yielded chunks
+    :param int timeout: seconds to wait for any data from the device
+    :rtype: collections.Iterable[str]
+    """
+    session = cli_service.session
+    prompt = re.compile(cli_service.command_mode.prompt)
+    session.send_line(command, logger)
+
+    echo_skipped = False
+    buffer = []
+    size = 0
+    last_read = time.time()
+    while True:
+        try:
+            data = session._receive(RECEIVE_TIMEOUT, logger)
+        except (SessionReadTimeout, SessionReadEmptyData):
+            buffer = ["".join(buffer)]
+            if prompt.search(buffer[0][buffer[0].rfind("\n") + 1 :]):
+                break
+            if time.time() - last_read > timeout:
+                raise Exception(
+                    "stream_command_output",
+                    "No output of '{}' for {}s".format(command, timeout),
+                )
+            continue
+
+        last_read = time.time()
+        data = data.replace("\r", "")
+        buffer.append(data)
+        size += len(data)
+        if not echo_skipped and "\n" in data:
+            echo_skipped = True
+            output = "".join(buffer)
+            buffer = [output[output.find("\n") + 1 :]]
+            size = len(buffer[0])
+        if echo_skipped and size >= chunk_size:
+            output = "".join(buffer)
+            start = 0
+            while len(output) - start >= chunk_size:
+                end = output.find("\n", start + chunk_size - 1)
+                if end < 0:
+                    break
+                yield output[start : end + 1]
+                start = end + 1
+            buffer = [output[start:]]
+            size = len(buffer[0])
+
+    output = buffer[0] if echo_skipped else ""
+    output = output[: output.rfind("\n") + 1]
+    if output:
+        yield output
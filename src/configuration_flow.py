@@ -0,0 +1,540 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from posixpath import join
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+
+    fcntl = None
+
+from cloudshell.networking.cisco.command_actions.system_actions import SystemActions
+from cloudshell.networking.cisco.nxos.flows.cisco_nxos_configuration_flow import (
+    CiscoNXOSConfigurationFlow,
+)
+
+from command_flow import ERROR_PATTERN, command_pattern
+from config_diff import diff_config, normalize_config
+from config_transfer import (
+    CHUNK_SIZE,
+    artifact_exists,
+    is_local_url,
+    iter_config_batches,
+    local_path,
+    open_local,
+    stream_command_output,
+)
+from metrics import timed_phase
+
+URL_CREDENTIALS_PATTERN = re.compile(r"(?<=//)[^/@]*@")
+
+
+def config_digest(config):
+    """Return SHA-256 digest of the normalized configuration."""
+    return ConfigDigest().update(config).hexdigest()
+
+
+class ConfigDigest(object):
+    """Incremental config_digest of configuration read in chunks of lines."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self._empty = True
+
+    def update(self, chunk):
+        config = normalize_config(chunk)
+        if config:
+            if not self._empty:
+                self._hash.update(b"\n")
+            self._hash.update(config.encode("utf-8"))
+            self._empty = False
+        return self
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock of the file shared between processes."""
+    with open(path, "a+") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def strip_url_credentials(url):
+    return URL_CREDENTIALS_PATTERN.sub("", url)
+
+
+class BackupIndex(object):
+    """Index of configuration backups stored by their content digest.
+
+    Only file names are stored, keyed by resource, configuration type and
+    backup folder without credentials, so the index never contains passwords.
+    The index file is shared by driver processes, it is re-read on every
+    access and updated under a file lock.
+    """
+
+    DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "cisco_nxos_backups.json")
+
+    def __init__(self, path=DEFAULT_PATH):
+        self._path = path
+        self._lock = Lock()
+
+    def get(self, key, digest):
+        """Return file name of the backup with the digest or None."""
+        return self._load().get(key, {}).get(digest, {}).get("filename")
+
+    def put(self, key, digest, filename):
+        with self._lock, file_lock("{}.lock".format(self._path)):
+            entries = self._load()
+            entries.setdefault(key, {})[digest] = {
+                "filename": filename,
+                "created": time.time(),
+            }
+            self._dump(entries)
+
+    def _load(self):
+        try:
+            with open(self._path) as index_file:
+                return json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _dump(self, entries):
+        folder, name = os.path.split(os.path.abspath(self._path))
+        handle, temp_path = tempfile.mkstemp(prefix=name, suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(handle, "w") as index_file:
+                json.dump(entries, index_file)
+            os.replace(temp_path, self._path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+class NXOSConfigurationFlow(CiscoNXOSConfigurationFlow):
+    """NX-OS configuration flow with deduplicated backups.
+
+    When backup_index is provided the configuration is read with show command
+    and hashed before the save, the upload is skipped if a backup with the
+    same digest is already stored in the folder and its path is returned.
+    New backups are named by the digest instead of a timestamp.
+
+    Backups to and restores from file:// urls on the driver host are
+    streamed through the CLI session in chunks, optionally gzip compressed.
+    Override restore from a file:// url applies the diff of the file and the
+    running config.
+
+    Restore method "incremental" copies the file to bootflash, diffs it
+    against the running config section by section and pushes only changed
+    stanzas.
+    """
+
+    INCREMENTAL_RESTORE_METHODS = ("incremental", "diff")
+    RESTORE_CANDIDATE_LOCATION = "bootflash:restore-candidate"
+    # Tail of the previous output chunk searched together with the next one
+    ERROR_CONTEXT_SIZE = 64
+
+    def __init__(
+        self,
+        cli_handler,
+        resource_config,
+        logger,
+        backup_index=None,
+        compress=False,
+        chunk_size=CHUNK_SIZE,
+    ):
+        super(NXOSConfigurationFlow, self).__init__(
+            cli_handler=cli_handler, resource_config=resource_config, logger=logger
+        )
+        self._backup_index = backup_index
+        self._compress = compress
+        self._chunk_size = chunk_size
+        self._digest = None
+
+    def save(
+        self,
+        folder_path="",
+        configuration_type="running",
+        vrf_management_name=None,
+        return_full_path=False,
+    ):
+        self._validate_configuration_type(configuration_type)
+        folder_path = self._get_path(folder_path)
+        if is_local_url(folder_path):
+            filename = self._stream_save(folder_path, configuration_type)
+            if return_full_path:
+                return join(folder_path, filename)
+            return filename
+
+        if self._backup_index is None:
+            return super(NXOSConfigurationFlow, self).save(
+                folder_path=folder_path,
+                configuration_type=configuration_type,
+                vrf_management_name=vrf_management_name,
+                return_full_path=return_full_path,
+            )
+
+        key = self._get_backup_key(folder_path, configuration_type)
+        digest = config_digest(self.get_device_config(configuration_type))
+        filename = self._get_indexed_backup(key, digest, folder_path)
+        if filename:
+            self._logger.info(
+                "Configuration is not changed since {}, skipping save".format(filename)
+            )
+        else:
+            self._digest = digest
+            try:
+                filename = super(NXOSConfigurationFlow, self).save(
+                    folder_path=folder_path,
+                    configuration_type=configuration_type,
+                    vrf_management_name=vrf_management_name,
+                    return_full_path=False,
+                )
+            finally:
+                self._digest = None
+            self._backup_index.put(key, digest, filename)
+
+        if return_full_path:
+            return self._get_path(join(folder_path, filename))
+        return filename
+
+    def _get_backup_key(self, folder_path, configuration_type):
+        return "{}|{}|{}".format(
+            self.resource_config.name,
+            configuration_type.lower(),
+            strip_url_credentials(folder_path).rstrip("/"),
+        )
+
+    def _get_indexed_backup(self, key, digest, folder_path):
+        """Return file name of the indexed backup if it still exists."""
+        filename = self._backup_index.get(key, digest)
+        if filename and artifact_exists(folder_path, filename) is False:
+            self._logger.info(
+                "Indexed backup {} doesn't exist anymore, saving".format(filename)
+            )
+            return None
+        return filename
+
+    def _stream_save(self, folder_path, configuration_type):
+        """Write configuration to the local folder while reading it from CLI.
+
+        The file is written as "<name>.part" and renamed when complete, a
+        duplicate of an indexed backup is removed instead.
+        """
+        folder = local_path(folder_path)
+        filename = self.generate_config_file_name(configuration_type)
+        part_path = os.path.join(folder, "{}.part".format(filename))
+        digest = ConfigDigest()
+        command = "show {}".format(self._get_config_name(configuration_type))
+        with timed_phase("file_transfer"), self._cli_handler.get_cli_service(
+            self._cli_handler.enable_mode
+        ) as enable_session:
+            with open_local(part_path, "w", self._compress) as config_file:
+                for chunk in stream_command_output(
+                    enable_session, command, self._logger, self._chunk_size
+                ):
+                    digest.update(chunk)
+                    config_file.write(chunk)
+
+        if self._backup_index is not None:
+            key = self._get_backup_key(folder_path, configuration_type)
+            stored = self._get_indexed_backup(key, digest.hexdigest(), folder_path)
+            if stored:
+                self._logger.info(
+                    "Configuration is not changed since {}, skipping save".format(
+                        stored
+                    )
+                )
+                os.remove(part_path)
+                return stored
+            self._digest = digest.hexdigest()
+            try:
+                filename = self.generate_config_file_name(configuration_type)
+            finally:
+                self._digest = None
+
+        if self._compress:
+            filename += ".gz"
+        os.replace(part_path, os.path.join(folder, filename))
+        if self._backup_index is not None:
+            self._backup_index.put(key, digest.hexdigest(), filename)
+        return filename
+
+    def save_command_output(self, command, folder_path="", index=None):
+        """Stream output of the show command to a file in the local folder.
+
+        Output is written in chunks while it is read from the CLI, so memory
+        doesn't grow with the output size. The folder defaults to the backup
+        location of the resource. The file is written as "<name>.part" and
+        renamed when complete, the part file is removed if reading fails.
+
+        :param str command: show command
+        :param str folder_path: file:// url of the folder
+        :param int index: position of the command among the commands saved
+            together, added to the file name to keep the names unique
+        :return: path, size, lines and SHA-256 digest of the written output and
+            success of the command, every chunk is checked for errors
+        :rtype: dict
+        """
+        folder_path = self._get_path(folder_path)
+        if not is_local_url(folder_path):
+            raise Exception(
+                self.__class__.__name__,
+                "Command output can be streamed to a local folder only, got {}".format(
+                    strip_url_credentials(folder_path)
+                ),
+            )
+        folder = local_path(folder_path)
+        filename = self.generate_command_file_name(command, index)
+        part_path = os.path.join(folder, "{}.part".format(filename))
+        digest = hashlib.sha256()
+        result = {"command": command, "size": 0, "lines": 0, "success": True}
+        unfinished_line = ""
+        try:
+            with timed_phase("file_transfer"), self._cli_handler.get_cli_service(
+                self._cli_handler.enable_mode
+            ) as enable_session:
+                with open_local(part_path, "w", self._compress) as output_file:
+                    for chunk in stream_command_output(
+                        enable_session, command, self._logger, self._chunk_size
+                    ):
+                        # errors split between chunks are matched with the line
+                        # left unfinished by the previous chunk
+                        text = unfinished_line + chunk
+                        if ERROR_PATTERN.search(text):
+                            result["success"] = False
+                        unfinished_line = text[text.rfind("\n") + 1 :][
+                            -self.ERROR_CONTEXT_SIZE :
+                        ]
+                        digest.update(chunk.encode("utf-8"))
+                        result["size"] += len(chunk)
+                        result["lines"] += chunk.count("\n")
+                        output_file.write(chunk)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+        if self._compress:
+            filename += ".gz"
+        os.replace(part_path, os.path.join(folder, filename))
+        result["path"] = join(folder_path, filename)
+        result["sha256"] = digest.hexdigest()
+        return result
+
+    def generate_command_file_name(self, command, index=None):
+        system_name = re.sub(r"\s+", "_", self.resource_config.name)
+        command_name = re.sub(r"\W+", "_", command).strip("_").lower()
+        filename = "{0}-{1}-{2}".format(
+            system_name[: self.MAX_RESOURCE_NAME_LENGTH],
+            command_name[: self.MAX_RESOURCE_NAME_LENGTH],
+            time.strftime("%d%m%y-%H%M%S", time.localtime()),
+        )
+        if index is not None:
+            filename += "-{}".format(index)
+        return filename + ".txt"
+
+    def _save_flow(self, folder_path, configuration_type, vrf_management_name=None):
+        with timed_phase("file_transfer"):
+            return super(NXOSConfigurationFlow, self)._save_flow(
+                folder_path, configuration_type, vrf_management_name
+            )
+
+    def generate_config_file_name(self, configuration_type):
+        if not self._digest:
+            return super(NXOSConfigurationFlow, self).generate_config_file_name(
+                configuration_type
+            )
+        system_name = re.sub(r"\s+", "_", self.resource_config.name)
+        return "{0}-{1}-{2}".format(
+            system_name[: self.MAX_RESOURCE_NAME_LENGTH],
+            configuration_type.lower(),
+            self._digest[:16],
+        )
+
+    def _restore_flow(
+        self, path, configuration_type, restore_method, vrf_management_name
+    ):
+        if is_local_url(path):
+            with timed_phase("file_transfer"):
+                return self._stream_restore(path, configuration_type, restore_method)
+
+        if restore_method not in self.INCREMENTAL_RESTORE_METHODS:
+            with timed_phase("file_transfer"):
+                return super(NXOSConfigurationFlow, self)._restore_flow(
+                    path=path,
+                    configuration_type=configuration_type,
+                    restore_method=restore_method,
+                    vrf_management_name=vrf_management_name,
+                )
+
+        if "running" not in configuration_type:
+            raise Exception(
+                self.__class__.__name__,
+                "Incremental restore is supported for running config only",
+            )
+        self.incremental_restore(path, vrf_management_name)
+
+    def _stream_restore(self, path, configuration_type, restore_method):
+        """Send configuration file from the driver host in configuration mode.
+
+        The file is read and sent in batches of lines, every batch waits for
+        the prompt after its last line, errors of the device stop the restore.
+        Override replaces the running config with the file, see
+        _replace_from_local.
+        """
+        if "running" not in configuration_type:
+            raise Exception(
+                self.__class__.__name__,
+                "Restore from local file is supported for running config only",
+            )
+        if restore_method == "override":
+            return self._replace_from_local(path)
+
+        with self._cli_handler.get_cli_service(
+            self._cli_handler.config_mode
+        ) as config_session:
+            with open_local(local_path(path)) as config_file:
+                for batch in iter_config_batches(config_file, self._chunk_size):
+                    output = config_session.send_command(
+                        "\n".join(batch),
+                        expected_string="{}.*{}".format(
+                            command_pattern(batch[-1]),
+                            self._cli_handler.config_mode.prompt,
+                        ),
+                    )
+                    self._check_config_output(output)
+
+    def _replace_from_local(self, path):
+        """Replace running config with the local file by applying their diff.
+
+        Lines missing in the file are negated and changed stanzas pushed,
+        the same way incremental restore does, so no reload is needed.
+        """
+        with open_local(local_path(path)) as config_file:
+            target_config = config_file.read()
+        with self._cli_handler.get_cli_service(
+            self._cli_handler.enable_mode
+        ) as enable_session:
+            current_config = enable_session.send_command(
+                "show running-config", remove_prompt=True
+            )
+            commands = diff_config(current_config, target_config)
+            self._logger.info(
+                "Override restore diff contains {} commands".format(len(commands))
+            )
+            if commands:
+                self._apply_config_commands(enable_session, commands)
+
+    def incremental_restore(self, path, vrf_management_name=None, dry_run=False):
+        """Push only the stanzas of the configuration file that differ.
+
+        :param str path: url of the configuration file
+        :param str vrf_management_name: Virtual Routing and Forwarding Name
+        :param bool dry_run: only return the commands without applying them
+        :return: configuration commands of the diff
+        :rtype: list[str]
+        """
+        path = self._get_path(path)
+        vrf_management_name = vrf_management_name or getattr(
+            self.resource_config, "vrf_management_name", None
+        )
+        with self._cli_handler.get_cli_service(
+            self._cli_handler.enable_mode
+        ) as enable_session:
+            target_config = self._read_remote_config(
+                enable_session, path, vrf_management_name
+            )
+            current_config = enable_session.send_command(
+                "show running-config", remove_prompt=True
+            )
+            commands = diff_config(current_config, target_config)
+            self._logger.info(
+                "Incremental restore diff contains {} commands".format(len(commands))
+            )
+            if dry_run or not commands:
+                return commands
+
+            self._apply_config_commands(enable_session, commands)
+        return commands
+
+    def _apply_config_commands(self, enable_session, commands):
+        with enable_session.enter_mode(self._cli_handler.config_mode) as config_session:
+            for command in commands:
+                output = config_session.send_command(command.strip())
+                self._check_config_output(output, command.strip())
+
+    def _check_config_output(self, output, command=None):
+        """Raise if the device rejected the configuration command."""
+        error = ERROR_PATTERN.search(output)
+        if error:
+            message = output[error.start() :].splitlines()[0].strip()
+            if command:
+                message = "'{}': {}".format(command, message)
+            raise Exception(
+                self.__class__.__name__,
+                "Failed to restore configuration: {}".format(message),
+            )
+
+    def _read_remote_config(self, enable_session, path, vrf_management_name):
+        system_actions = SystemActions(enable_session, self._logger)
+        with timed_phase("file_transfer"):
+            system_actions.copy(
+                source=path,
+                destination=self.RESTORE_CANDIDATE_LOCATION,
+                vrf=vrf_management_name,
+                action_map=system_actions.prepare_action_map(
+                    path, self.RESTORE_CANDIDATE_LOCATION
+                ),
+            )
+        try:
+            return enable_session.send_command(
+                "show file {}".format(self.RESTORE_CANDIDATE_LOCATION),
+                remove_prompt=True,
+            )
+        finally:
+            system_actions.delete_file(
+                self.RESTORE_CANDIDATE_LOCATION,
+                action_map={
+                    r"\(yes/no(/abort)?\)|\[y\]": lambda session, logger: (
+                        session.send_line("y", logger)
+                    )
+                },
+            )
+
+    @staticmethod
+    def _get_config_name(configuration_type):
+        configuration_type = configuration_type.lower()
+        if "-config" not in configuration_type:
+            configuration_type += "-config"
+        return configuration_type
+
+    def get_device_config(self, configuration_type="running"):
+        """Return running or startup configuration of the device."""
+        with self._cli_handler.get_cli_service(
+            self._cli_handler.enable_mode
+        ) as enable_session:
+            return enable_session.send_command(
+                "show {}".format(self._get_config_name(configuration_type)),
+                remove_prompt=True,
+            )
@@ -0,0 +1,328 @@
+import re
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import jsonpickle
+from cloudshell.networking.cisco.nxos.flows.cisco_nxos_connectivity_flow import (
+    CiscoNXOSConnectivityFlow,
+)
+from cloudshell.shell.flows.connectivity.exceptions import ApplyConnectivityException
+from cloudshell.shell.flows.connectivity.helpers.request_validation import (
+    validate_request_action,
+)
+from cloudshell.shell.flows.connectivity.helpers.utils import JsonRequestDeserializer
+from cloudshell.shell.flows.connectivity.helpers.vlan_handler import VLANHandler
+from cloudshell.shell.flows.connectivity.models.connectivity_result import (
+    ConnectivityErrorResponse,
+    ConnectivitySuccessResponse,
+)
+from cloudshell.shell.flows.connectivity.models.driver_response import DriverResponse
+from cloudshell.shell.flows.connectivity.models.driver_response_root import (
+    DriverResponseRoot,
+)
+
+SET_VLAN = "setVlan"
+REMOVE_VLAN = "removeVlan"
+SWITCHPORT_VLAN_PATTERN = re.compile(
+    r"^\s*switchport\s.*?\bvlan\s+(?:add\s+)?(?P<vlans>\d[\d,\-]*)\s*$",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
+def parse_vlans(vlan_range):
+    """Return set of VLAN ids of the VLAN string, i.e. "10-12,15"."""
+    vlans = set()
+    for vlan in vlan_range.replace(" ", "").split(","):
+        if "-" in vlan:
+            start, end = sorted(map(int, vlan.split("-")))
+            vlans.update(range(start, end + 1))
+        elif vlan:
+            vlans.add(int(vlan))
+    return vlans
+
+
+def merge_vlan_ranges(vlan_ranges):
+    """Merge VLAN strings into sorted ranges of adjacent VLANs.
+
+    merge_vlan_ranges(["12", "10-11", "15,20-21"]) == ["10-12", "15", "20-21"]
+    """
+    vlans = set()
+    for vlan_range in vlan_ranges:
+        vlans.update(parse_vlans(vlan_range))
+
+    result = []
+    for vlan in sorted(vlans):
+        if result and result[-1][1] == vlan - 1:
+            result[-1][1] = vlan
+        else:
+            result.append([vlan, vlan])
+    return [
+        str(start) if start == end else "{}-{}".format(start, end)
+        for start, end in result
+    ]
+
+
+def get_assigned_vlans(interface_config):
+    """Return set of VLAN ids assigned to the interface by switchport commands."""
+    vlans = set()
+    for match in SWITCHPORT_VLAN_PATTERN.finditer(interface_config):
+        vlans.update(parse_vlans(match.group("vlans")))
+    return vlans
+
+
+class PortActions(object):
+    """Set and remove VLAN actions of the request targeting one interface."""
+
+    def __init__(self, full_name):
+        self.full_name = full_name
+        self.set_actions = []
+        self.remove_actions = []
+
+    @property
+    def actions(self):
+        return self.remove_actions + self.set_actions
+
+    def get_vlan_configs(self, vlan_handler):
+        """Return (vlan_range, port_mode, qnq, c_tag) to configure on the port.
+
+        Trunk VLANs with the same QinQ settings are merged into range strings,
+        access VLANs are configured one by one.
+        """
+        trunk_vlans = OrderedDict()
+        configs = []
+        for action in self.set_actions:
+            port_mode, qnq, c_tag = get_connection_params(action)
+            if port_mode == "trunk":
+                key = (port_mode, qnq, c_tag)
+                trunk_vlans.setdefault(key, []).append(action.connectionParams.vlanId)
+            else:
+                configs.extend(
+                    (vlan_range, port_mode, qnq, c_tag)
+                    for vlan_range in vlan_handler.get_vlan_list(
+                        action.connectionParams.vlanId
+                    )
+                )
+
+        for (port_mode, qnq, c_tag), vlan_ranges in trunk_vlans.items():
+            merged = ",".join(merge_vlan_ranges(vlan_ranges))
+            configs.extend(
+                (vlan_range, port_mode, qnq, c_tag)
+                for vlan_range in vlan_handler.get_vlan_list(merged)
+            )
+        return configs
+
+
+def get_connection_params(action):
+    """Return port mode, QinQ flag and C-Tag of the setVlan action."""
+    qnq = False
+    c_tag = ""
+    for attribute in action.connectionParams.vlanServiceAttributes:
+        if (
+            attribute.attributeName.lower() == "qnq"
+            and attribute.attributeValue.lower() == "true"
+        ):
+            qnq = True
+        if attribute.attributeName.lower() == "ctag":
+            c_tag = attribute.attributeValue
+    return action.connectionParams.mode.lower(), qnq, c_tag
+
+
+class BatchedCiscoNXOSConnectivityFlow(CiscoNXOSConnectivityFlow):
+    """Connectivity flow applying the whole request in one config session.
+
+    Actions are grouped by interface, every interface is cleaned and
+    configured once and verified with a single show of its configuration.
+    Routers fall back to the per VLAN flow because of sub interfaces.
+
+    With max_workers > 1 interfaces are split between up to max_workers
+    pooled sessions configured in parallel, all actions of one interface
+    are executed in order by the same session.
+    """
+
+    def __init__(self, cli_handler, logger, max_workers=1, **kwargs):
+        super(BatchedCiscoNXOSConnectivityFlow, self).__init__(
+            cli_handler=cli_handler, logger=logger, **kwargs
+        )
+        self._max_workers = max(int(max_workers), 1)
+
+    def apply_connectivity(self, request):
+        if not self.is_switch:
+            return super(BatchedCiscoNXOSConnectivityFlow, self).apply_connectivity(
+                request=request
+            )
+
+        actions = self._parse_request(request)
+        ports = self._group_by_port(actions)
+        results = {}
+        self._apply_ports(list(ports.values()), results)
+        return self._prepare_response(actions, results)
+
+    def _parse_request(self, request):
+        if request is None or request == "":
+            raise ApplyConnectivityException("Request is None or empty")
+
+        holder = JsonRequestDeserializer(jsonpickle.decode(request))
+        if not holder or not hasattr(holder, "driverRequest"):
+            raise ApplyConnectivityException("Deserialized request is None or empty")
+
+        actions = []
+        for action in holder.driverRequest.actions:
+            validate_request_action(action)
+            if action.type not in (SET_VLAN, REMOVE_VLAN):
+                self._logger.warning(
+                    "Undefined action type determined '{}': {}".format(
+                        action.type, action.__dict__
+                    )
+                )
+                continue
+            actions.append(action)
+        return actions
+
+    @staticmethod
+    def _group_by_port(actions):
+        ports = OrderedDict()
+        for action in actions:
+            full_name = action.actionTarget.fullName
+            port = ports.setdefault(full_name, PortActions(full_name))
+            if action.type == SET_VLAN:
+                port.set_actions.append(action)
+            else:
+                port.remove_actions.append(action)
+        return ports
+
+    def _get_vlan_handler(self):
+        return VLANHandler(
+            is_vlan_range_supported=self.IS_VLAN_RANGE_SUPPORTED,
+            is_multi_vlan_supported=self.IS_MULTI_VLAN_SUPPORTED,
+        )
+
+    def _apply_ports(self, ports, results):
+        """Configure the ports in parallel sessions and collect results."""
+        buckets = self._split_ports(ports, self._max_workers)
+        if len(buckets) < 2:
+            return self._apply_ports_in_session(ports, results)
+
+        self._logger.info(
+            "Configuring {} interfaces in {} sessions".format(len(ports), len(buckets))
+        )
+        with ThreadPoolExecutor(max_workers=len(buckets)) as executor:
+            futures = [
+                executor.submit(self._apply_ports_in_session, bucket, results)
+                for bucket in buckets
+            ]
+            for future, bucket in zip(futures, buckets):
+                try:
+                    future.result()
+                except Exception as e:
+                    self._logger.error(traceback.format_exc())
+                    for port in bucket:
+                        for action in port.actions:
+                            results.setdefault(action.actionId, (False, str(e)))
+
+    @staticmethod
+    def _split_ports(ports, workers):
+        """Split ports between workers balancing the number of actions."""
+        buckets = [[] for _ in range(min(workers, len(ports)))]
+        loads = [0] * len(buckets)
+        for port in sorted(ports, key=lambda p: len(p.actions), reverse=True):
+            index = loads.index(min(loads))
+            buckets[index].append(port)
+            loads[index] += len(port.actions)
+        return [bucket for bucket in buckets if bucket]
+
+    def _apply_ports_in_session(self, ports, results):
+        """Configure the ports in one config session and collect results."""
+        with self._cli_handler.get_cli_service(
+            self._cli_handler.config_mode
+        ) as config_session:
+            for port in ports:
+                self._apply_port_actions(config_session, port, results)
+
+    def _apply_port_actions(self, config_session, port, results):
+        vlan_handler = self._get_vlan_handler()
+        try:
+            iface_action = self._get_iface_actions(config_session)
+            vlan_actions = self._get_vlan_actions(config_session)
+            port_name = iface_action.get_port_name(port.full_name)
+            self._logger.info("Interface {} configuration started".format(port_name))
+
+            current_config = iface_action.get_current_interface_config(port_name)
+            if "switchport" in current_config:
+                iface_action.enter_iface_config_mode(port_name)
+                iface_action.clean_interface_switchport_config(current_config)
+
+            for vlan_range, port_mode, qnq, c_tag in port.get_vlan_configs(
+                vlan_handler
+            ):
+                vlan_actions.create_vlan(vlan_range)
+                vlan_actions.set_vlan_to_interface(
+                    vlan_range, port_mode, port_name, qnq, c_tag
+                )
+
+            current_config = iface_action.get_current_interface_config(port_name)
+        except Exception as e:
+            self._logger.error(traceback.format_exc())
+            for action in port.actions:
+                results[action.actionId] = (False, str(e))
+            return
+
+        self._verify_port_actions(port, current_config, results)
+
+    @staticmethod
+    def _verify_port_actions(port, current_config, results):
+        assigned_vlans = get_assigned_vlans(current_config)
+        configured_vlans = set()
+        for action in port.set_actions:
+            vlan_range = action.connectionParams.vlanId.replace(" ", "")
+            vlans = parse_vlans(vlan_range)
+            configured_vlans.update(vlans)
+            if vlans <= assigned_vlans:
+                message = "[ OK ] VLAN(s) {} configuration completed successfully"
+                results[action.actionId] = (True, message.format(vlan_range))
+            else:
+                message = "[FAIL] VLAN(s) {} configuration failed"
+                results[action.actionId] = (False, message.format(vlan_range))
+
+        for action in port.remove_actions:
+            vlan_range = action.connectionParams.vlanId.replace(" ", "")
+            vlans = parse_vlans(vlan_range) - configured_vlans
+            if vlans & assigned_vlans:
+                message = "[FAIL] VLAN(s) {} removal failed"
+                results[action.actionId] = (False, message.format(vlan_range))
+            else:
+                message = "[ OK ] VLAN(s) {} removal completed successfully"
+                results[action.actionId] = (True, message.format(vlan_range))
+
+    @staticmethod
+    def _prepare_response(actions, results):
+        request_result = []
+        for action in actions:
+            success, message = results.get(
+                action.actionId, (False, "Action was not processed")
+            )
+            operation = "Add" if action.type == SET_VLAN else "Remove"
+            if success:
+                action_result = ConnectivitySuccessResponse(
+                    action,
+                    "{} Vlan {} configuration successfully completed".format(
+                        operation, action.connectionParams.vlanId
+                    ),
+                )
+            else:
+                action_result = ConnectivityErrorResponse(
+                    action,
+                    "{operation} Vlan {vlan} configuration failed."
+                    "\n{operation} Vlan configuration details:\n{message}".format(
+                        operation=operation,
+                        vlan=action.connectionParams.vlanId,
+                        message=message,
+                    ),
+                )
+            request_result.append(action_result)
+
+        driver_response = DriverResponse()
+        driver_response.actionResults = request_result
+        driver_response_root = DriverResponseRoot()
+        driver_response_root.driverResponse = driver_response
+        return str(jsonpickle.encode(driver_response_root, unpicklable=False))
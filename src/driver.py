@@ -1,25 +1,23 @@
+import json
+import time
+from threading import BoundedSemaphore
+
 from cloudshell.networking.cisco.flows.cisco_autoload_flow import CiscoSnmpAutoloadFlow
-from cloudshell.networking.cisco.flows.cisco_load_firmware_flow import (
-    CiscoLoadFirmwareFlow,
-)
 from cloudshell.networking.cisco.flows.cisco_run_command_flow import CiscoRunCommandFlow
 from cloudshell.networking.cisco.flows.cisco_state_flow import CiscoStateFlow
-from cloudshell.networking.cisco.nxos.cli.cisco_nxos_cli_handler import CiscoNXOSCli
-from cloudshell.networking.cisco.nxos.flows.cisco_nxos_configuration_flow import (
-    CiscoNXOSConfigurationFlow,
-)
 from cloudshell.networking.cisco.nxos.flows.cisco_nxos_connectivity_flow import (
     CiscoNXOSConnectivityFlow,
 )
-from cloudshell.networking.cisco.snmp.cisco_snmp_handler import CiscoSnmpHandler, \
-    CiscoEnableDisableSnmpFlow
+from cloudshell.networking.cisco.snmp.cisco_snmp_handler import (
+    CiscoEnableDisableSnmpFlow,
+    CiscoSnmpHandler,
+)
 from cloudshell.shell.core.driver_context import (
     AutoLoadCommandContext,
     AutoLoadDetails,
     InitCommandContext,
     ResourceCommandContext,
 )
-from cloudshell.shell.core.driver_utils import GlobalLock
 from cloudshell.shell.core.orchestration_save_restore import OrchestrationSaveRestore
 from cloudshell.shell.core.resource_driver_interface import ResourceDriverInterface
 from cloudshell.shell.core.session.cloudshell_session import CloudShellSessionContext
@@ -31,17 +29,96 @@ from cloudshell.shell.standards.networking.driver_interface import (
 from cloudshell.shell.standards.networking.resource_config import (
     NetworkingResourceConfig,
 )
+from cloudshell.snmp.snmp_parameters import SnmpParametersHelper
+
+from artifacts import check_artifact, parse_saved_artifacts
+from autoload_snapshot import AutoloadSnapshotStore
+from cli_latency import CliLatencyRegistry
+from command_flow import PipelinedCiscoRunCommandFlow
+from config_transfer import CHUNK_SIZE
+from configuration_flow import BackupIndex, NXOSConfigurationFlow
+from connectivity_flow import BatchedCiscoNXOSConnectivityFlow
+from firmware_flow import RetryPolicy, StagedCiscoLoadFirmwareFlow
+from fleet import FleetExecutor, build_resource_context, parse_resource_names
+from health_check import (
+    HealthCheckResult,
+    LiveStatusWriter,
+    TieredHealthCheck,
+    collect_health_results,
+)
+from metrics import MetricsRegistry, instrumented, timed_phase
+from resource_cache import (
+    ResourceCache,
+    connectivity_fingerprint,
+    context_fingerprint,
+)
+from resource_lock import ResourceLock
+from session_capture import SessionRecorder, SessionReplay
+from session_pool import SessionPoolRegistry
+from snmp_autoload import CiscoBulkSnmpAutoloadFlow
+from snmp_state import (
+    CachedEnableDisableSnmpFlow,
+    SnmpStateRegistry,
+    snmp_parameters_fingerprint,
+)
 
 
-class CiscoNXOSShellDriver(
-    ResourceDriverInterface, NetworkingResourceDriverInterface, GlobalLock
-):
+class CiscoNXOSShellDriver(ResourceDriverInterface, NetworkingResourceDriverInterface):
     SUPPORTED_OS = ["NX[ -]?OS|NXOS"]
     SHELL_NAME = "Cisco NXOS Switch 2G"
+    AUTOLOAD_BULK_WALK = True
+    AUTOLOAD_GET_BULK_REPETITIONS = 50
+    AUTOLOAD_INCREMENTAL = True
+    AUTOLOAD_STATE_TTL = 24 * 60 * 60
+    AUTOLOAD_SNAPSHOT = True
+    AUTOLOAD_SNAPSHOT_PATH = AutoloadSnapshotStore.DEFAULT_PATH
+    CLI_ADAPTIVE_TIMEOUTS = True
+    CONNECTIVITY_BATCHED = True
+    CONNECTIVITY_CONCURRENT = True
+    RUN_COMMAND_PIPELINED = True
+    SHOW_COMMAND_CACHE_TTL = 60
+    FLEET_MAX_CONCURRENCY = 10
+    FLEET_DEVICE_TIMEOUT = 600
+    BACKUP_DEDUPLICATE = True
+    BACKUP_INDEX_PATH = BackupIndex.DEFAULT_PATH
+    BACKUP_COMPRESS = False
+    CONFIG_TRANSFER_CHUNK_SIZE = CHUNK_SIZE
+    FIRMWARE_MAX_TRANSFERS = 4
+    FIRMWARE_TRANSFER_TIMEOUT = 60 * 60
+    FIRMWARE_TRANSFER_ATTEMPTS = 3
+    FIRMWARE_TRANSFER_BACKOFF = 30
+    FIRMWARE_TRANSFER_MAX_BACKOFF = 600
+    HEALTH_CHECK_TTL = 60
+    METRICS_LOG_BREAKDOWN = False
+    METRICS_TEXTFILE_PATH = None
+    SESSION_CAPTURE_PATH = None
+    SESSION_REPLAY_PATH = None
+    SESSION_REPLAY_SPEED = 1.0
 
     def __init__(self):
         super(CiscoNXOSShellDriver, self).__init__()
         self._cli = None
+        self._cli_latencies = CliLatencyRegistry()
+        self._api_cache = ResourceCache()
+        self._resource_config_cache = ResourceCache()
+        self._autoload_states = ResourceCache(ttl=self.AUTOLOAD_STATE_TTL)
+        self._autoload_snapshots = AutoloadSnapshotStore(
+            self.AUTOLOAD_SNAPSHOT_PATH, max_age=self.AUTOLOAD_STATE_TTL
+        )
+        self._snmp_states = SnmpStateRegistry()
+        self._show_caches = ResourceCache(ttl=self.SHOW_COMMAND_CACHE_TTL)
+        self._backup_index = BackupIndex(self.BACKUP_INDEX_PATH)
+        self._firmware_transfers = BoundedSemaphore(self.FIRMWARE_MAX_TRANSFERS)
+        self._health_checks = ResourceCache(ttl=self.HEALTH_CHECK_TTL)
+        self._live_statuses = LiveStatusWriter(ttl=self.HEALTH_CHECK_TTL)
+        self._metrics = MetricsRegistry(textfile_path=self.METRICS_TEXTFILE_PATH)
+        self._session_capture = None
+        if self.SESSION_REPLAY_PATH:
+            self._session_capture = SessionReplay(
+                self.SESSION_REPLAY_PATH, self.SESSION_REPLAY_SPEED
+            )
+        elif self.SESSION_CAPTURE_PATH:
+            self._session_capture = SessionRecorder(self.SESSION_CAPTURE_PATH)
 
     def initialize(self, context: InitCommandContext):
         api = CloudShellSessionContext(context).get_api()
@@ -49,38 +126,87 @@ class CiscoNXOSShellDriver(
             context=context, api=api
         )
 
-        self._cli = CiscoNXOSCli(resource_config)
+        self._cli = SessionPoolRegistry(
+            session_capture=self._session_capture,
+            cli_latencies=self._cli_latencies if self.CLI_ADAPTIVE_TIMEOUTS else None,
+        )
+        self._cli.get_cli(resource_config)
         return "Finished initializing"
 
-    @GlobalLock.lock
+    @instrumented
+    @ResourceLock.write
     def get_inventory(self, context: AutoLoadCommandContext) -> AutoLoadDetails:
         """Return device structure with all standard attributes."""
         with LoggingSessionContext(context) as logger:
             logger.info("Starting 'Autoload' command ...")
-            api = CloudShellSessionContext(context).get_api()
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+            resource_config = self._get_resource_config(context)
             cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            enable_disable_flow = CiscoEnableDisableSnmpFlow(cli_handler, logger)
+            enable_disable_flow = CachedEnableDisableSnmpFlow(
+                CiscoEnableDisableSnmpFlow(cli_handler, logger),
+                self._snmp_states,
+                resource_config.name,
+                logger,
+                snmp=self._get_snmp(
+                    resource_config.name,
+                    timeout=CachedEnableDisableSnmpFlow.PROBE_TIMEOUT,
+                    retry_count=CachedEnableDisableSnmpFlow.PROBE_RETRY_COUNT,
+                ),
+            )
             snmp_handler = CiscoSnmpHandler.from_config(
                 enable_disable_flow, resource_config, logger
             )
-            autoload_operations = CiscoSnmpAutoloadFlow(
-                logger=logger, snmp_handler=snmp_handler
-            )
+            snmp = self._get_snmp(resource_config.name)
+            if snmp:
+                snmp_handler._snmp = snmp
+            state_fingerprint = context_fingerprint(context)
+            if self.AUTOLOAD_BULK_WALK:
+                previous_state = None
+                if self.AUTOLOAD_INCREMENTAL:
+                    previous_state = self._autoload_states.peek(
+                        resource_config.name, state_fingerprint
+                    )
+                    if previous_state is None and self.AUTOLOAD_SNAPSHOT:
+                        previous_state = self._autoload_snapshots.get(
+                            resource_config.name, state_fingerprint
+                        )
+                autoload_operations = CiscoBulkSnmpAutoloadFlow(
+                    logger=logger,
+                    snmp_handler=snmp_handler,
+                    get_bulk_repetitions=self.AUTOLOAD_GET_BULK_REPETITIONS,
+                    previous_state=previous_state,
+                )
+            else:
+                autoload_operations = CiscoSnmpAutoloadFlow(
+                    logger=logger, snmp_handler=snmp_handler
+                )
 
             resource_model = NetworkingResourceModel.from_resource_config(
                 resource_config
             )
 
-            response = autoload_operations.discover(
-                self.SUPPORTED_OS, resource_model
+            with timed_phase("snmp_walk"):
+                response = autoload_operations.discover(
+                    self.SUPPORTED_OS, resource_model
+                )
+            if self.AUTOLOAD_BULK_WALK and self.AUTOLOAD_INCREMENTAL:
+                self._autoload_states.put(
+                    resource_config.name, state_fingerprint, autoload_operations.state
+                )
+                if self.AUTOLOAD_SNAPSHOT:
+                    self._autoload_snapshots.put(
+                        resource_config.name,
+                        state_fingerprint,
+                        autoload_operations.state,
+                    )
+            logger.debug(
+                "SNMP enable/disable stats: {}".format(self._snmp_states.stats())
             )
             logger.info("'Autoload' command completed")
 
             return response
+
+    @instrumented
+    @ResourceLock.read
     def run_custom_command(
         self, context: ResourceCommandContext, custom_command: str
     ) -> str:
@@ -91,24 +217,97 @@ class CiscoNXOSShellDriver(
         :return: result
         """
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
+            resource_config = self._get_resource_config(context)
 
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
+            cli_handler = self._cli.get_cli_handler(resource_config, logger)
+            send_command_operations = self._get_run_command_flow(cli_handler, logger)
+
+            response = send_command_operations.run_custom_command(
+                custom_command=custom_command
             )
 
+            return response
+
+    @instrumented
+    @ResourceLock.read
+    def run_custom_commands(
+        self, context: ResourceCommandContext, custom_command: str
+    ) -> str:
+        """Send custom commands and return result of every command.
+
+        :param context: an object with all Resource Attributes inside
+        :param custom_command: commands separated by ';'
+        :return: json list with command, output and success of every command
+        """
+        with LoggingSessionContext(context) as logger:
+            resource_config = self._get_resource_config(context)
+
             cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            send_command_operations = CiscoRunCommandFlow(
+            send_command_operations = PipelinedCiscoRunCommandFlow(
                 logger=logger, cli_configurator=cli_handler
             )
 
-            response = send_command_operations.run_custom_command(
-                custom_command=custom_command
+            return send_command_operations.run_commands_json(custom_command)
+
+    @instrumented
+    @ResourceLock.read
+    def run_custom_command_json(
+        self, context: ResourceCommandContext, custom_command: str
+    ) -> str:
+        """Send show commands with "| json" and return parsed output.
+
+        Output of idempotent show commands, i.e. "show version" or "show vlan",
+        is cached per resource for SHOW_COMMAND_CACHE_TTL seconds.
+
+        :param context: an object with all Resource Attributes inside
+        :param custom_command: show commands separated by ';'
+        :return: json list with command, parsed output and success of every command
+        """
+        with LoggingSessionContext(context) as logger:
+            resource_config = self._get_resource_config(context)
+
+            cli_handler = self._cli.get_cli_handler(resource_config, logger)
+            send_command_operations = PipelinedCiscoRunCommandFlow(
+                logger=logger, cli_configurator=cli_handler
             )
 
-            return response
+            return send_command_operations.run_json_commands(
+                custom_command, cache=self._get_show_cache(context)
+            )
+
+    @instrumented
+    @ResourceLock.read
+    def run_custom_command_stream(
+        self, context: ResourceCommandContext, custom_command: str, folder_path: str
+    ) -> str:
+        """Stream output of show commands to files instead of returning it.
+
+        Output of every command is written in chunks to its own file while it
+        is read, so memory stays flat for "show tech-support" and alike.
 
+        :param context: an object with all Resource Attributes inside
+        :param custom_command: show commands separated by ';'
+        :param folder_path: file:// url of the folder, Backup Location if empty
+        :return: json list with command, path, size, lines, sha256 and success
+        """
+        with LoggingSessionContext(context) as logger:
+            resource_config = self._get_resource_config(context)
+
+            cli_handler = self._cli.get_cli_handler(resource_config, logger)
+            configuration_flow = self._get_configuration_flow(
+                cli_handler, logger, resource_config
+            )
+
+            commands = [command.strip() for command in custom_command.split(";")]
+            return json.dumps(
+                [
+                    configuration_flow.save_command_output(command, folder_path, index)
+                    for index, command in enumerate(filter(None, commands), 1)
+                ]
+            )
+
+    @instrumented
+    @ResourceLock.write
     def run_custom_config_command(
         self, context: ResourceCommandContext, custom_command: str
     ) -> str:
@@ -119,17 +318,11 @@ class CiscoNXOSShellDriver(
         :return: result
         """
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
-
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+            resource_config = self._get_resource_config(context)
+            self._show_caches.invalidate(resource_config.name)
 
             cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            send_command_operations = CiscoRunCommandFlow(
-                logger=logger, cli_configurator=cli_handler
-            )
+            send_command_operations = self._get_run_command_flow(cli_handler, logger)
 
             result_str = send_command_operations.run_custom_config_command(
                 custom_command=custom_command
@@ -137,6 +330,8 @@ class CiscoNXOSShellDriver(
 
             return result_str
 
+    @instrumented
+    @ResourceLock.write
     def ApplyConnectivityChanges(
         self, context: ResourceCommandContext, request: str
     ) -> str:
@@ -148,26 +343,33 @@ class CiscoNXOSShellDriver(
         :return:
         """
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
-
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+            resource_config = self._get_resource_config(context)
+            self._show_caches.invalidate(resource_config.name)
 
             cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            connectivity_operations = CiscoNXOSConnectivityFlow(
-                logger=logger,
-                cli_handler=cli_handler,
-                support_multi_vlan_str=True,
-                support_vlan_range_str=True,
-                is_switch=True,
-            )
+            flow_kwargs = {
+                "logger": logger,
+                "cli_handler": cli_handler,
+                "support_multi_vlan_str": True,
+                "support_vlan_range_str": True,
+                "is_switch": True,
+            }
+            if self.CONNECTIVITY_BATCHED:
+                max_workers = 1
+                if self.CONNECTIVITY_CONCURRENT:
+                    max_workers = int(resource_config.sessions_concurrency_limit or 1)
+                connectivity_operations = BatchedCiscoNXOSConnectivityFlow(
+                    max_workers=max_workers, **flow_kwargs
+                )
+            else:
+                connectivity_operations = CiscoNXOSConnectivityFlow(**flow_kwargs)
             logger.info("Start applying connectivity changes.")
             result = connectivity_operations.apply_connectivity(request=request)
             logger.info("Apply Connectivity changes completed")
             return result
 
+    @instrumented
+    @ResourceLock.read
     def save(
         self,
         context: ResourceCommandContext,
@@ -177,12 +379,7 @@ class CiscoNXOSShellDriver(
     ) -> str:
         """Save selected file to the provided destination."""
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
-
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+            resource_config = self._get_resource_config(context)
 
             if not configuration_type:
                 configuration_type = "running"
@@ -191,8 +388,8 @@ class CiscoNXOSShellDriver(
                 vrf_management_name = resource_config.vrf_management_name
 
             cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            configuration_flow = CiscoNXOSConfigurationFlow(
-                cli_handler=cli_handler, logger=logger, resource_config=resource_config
+            configuration_flow = self._get_configuration_flow(
+                cli_handler, logger, resource_config
             )
 
             logger.info("Save started")
@@ -204,7 +401,8 @@ class CiscoNXOSShellDriver(
             logger.info("Save completed")
             return response
 
-    @GlobalLock.lock
+    @instrumented
+    @ResourceLock.write
     def restore(
             self,
             context: ResourceCommandContext,
@@ -222,12 +420,8 @@ class CiscoNXOSShellDriver(
         :param vrf_management_name: VRF management Name
         """
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
-
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+            resource_config = self._get_resource_config(context)
+            self._show_caches.invalidate(resource_config.name)
 
             if not configuration_type:
                 configuration_type = "running"
@@ -239,8 +433,8 @@ class CiscoNXOSShellDriver(
                 vrf_management_name = resource_config.vrf_management_name
 
             cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            configuration_flow = CiscoNXOSConfigurationFlow(
-                cli_handler=cli_handler, logger=logger, resource_config=resource_config
+            configuration_flow = self._get_configuration_flow(
+                cli_handler, logger, resource_config
             )
 
             logger.info("Restore started")
@@ -252,7 +446,43 @@ class CiscoNXOSShellDriver(
             )
             logger.info("Restore completed")
 
+    @instrumented
+    @ResourceLock.write
+    def restore_diff(
+        self,
+        context: ResourceCommandContext,
+        path: str,
+        vrf_management_name: str,
+        dry_run: str,
+    ) -> str:
+        """Apply only the difference between the file and running config.
+
+        :param context: an object with all Resource Attributes inside
+        :param path: source config file
+        :param vrf_management_name: VRF management Name
+        :param dry_run: if "True" the commands are returned without applying
+        :return: configuration commands of the diff
+        """
+        with LoggingSessionContext(context) as logger:
+            resource_config = self._get_resource_config(context)
+            dry_run = str(dry_run).lower() == "true"
+            if not dry_run:
+                self._show_caches.invalidate(resource_config.name)
 
+            cli_handler = self._cli.get_cli_handler(resource_config, logger)
+            configuration_flow = self._get_configuration_flow(
+                cli_handler, logger, resource_config
+            )
+            commands = configuration_flow.incremental_restore(
+                path=path,
+                vrf_management_name=vrf_management_name
+                or resource_config.vrf_management_name,
+                dry_run=dry_run,
+            )
+            return "\n".join(commands)
+
+    @instrumented
+    @ResourceLock.read
     def orchestration_save(
         self, context: ResourceCommandContext, mode: str, custom_params: str
     ) -> str:
@@ -267,28 +497,78 @@ class CiscoNXOSShellDriver(
             mode = "shallow"
 
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
+            return self._orchestration_save(context, logger, mode, custom_params)
 
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+    @instrumented
+    def orchestration_save_bulk(
+        self,
+        context: ResourceCommandContext,
+        resource_names: str,
+        mode: str,
+        custom_params: str,
+    ) -> str:
+        """Save configuration of several resources concurrently.
 
-            cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            configuration_flow = CiscoNXOSConfigurationFlow(
-                cli_handler=cli_handler, logger=logger, resource_config=resource_config
-            )
+        :param context: an object with all Resource Attributes inside
+        :param resource_names: json list or ';' separated names of the resources
+        :param mode: mode
+        :param custom_params: json with custom save parameters
+        :return str response: json with orchestration save result and duration
+            of every resource
+        """
+        if not mode:
+            mode = "shallow"
 
-            logger.info("Orchestration save started")
-            response = configuration_flow.orchestration_save(
-                mode=mode, custom_params=custom_params
+        with LoggingSessionContext(context) as logger:
+            api = self._get_api(context)
+            names = parse_resource_names(resource_names) or [context.resource.name]
+
+            def save_resource(resource_name):
+                resource_context = context
+                if resource_name != context.resource.name:
+                    resource_context = build_resource_context(
+                        context, api, resource_name
+                    )
+                with ResourceLock.acquire(resource_name):
+                    return json.loads(
+                        self._orchestration_save(
+                            resource_context, logger, mode, custom_params
+                        )
+                    )
+
+            logger.info("Bulk orchestration save started for {}".format(names))
+            started = time.time()
+            results = FleetExecutor(
+                logger, self.FLEET_MAX_CONCURRENCY, self.FLEET_DEVICE_TIMEOUT
+            ).run(names, save_resource)
+            logger.info("Bulk orchestration save completed")
+            return json.dumps(
+                {
+                    "results": [result.to_dict() for result in results],
+                    "duration": round(time.time() - started, 3),
+                }
             )
-            response_json = OrchestrationSaveRestore(
-                logger, resource_config.name
-            ).prepare_orchestration_save_result(response)
-            logger.info("Orchestration save completed")
-            return response_json
 
+    def _orchestration_save(self, context, logger, mode, custom_params):
+        resource_config = self._get_resource_config(context)
+
+        cli_handler = self._cli.get_cli_handler(resource_config, logger)
+        configuration_flow = self._get_configuration_flow(
+            cli_handler, logger, resource_config
+        )
+
+        logger.info("Orchestration save started")
+        response = configuration_flow.orchestration_save(
+            mode=mode, custom_params=custom_params
+        )
+        response_json = OrchestrationSaveRestore(
+            logger, resource_config.name
+        ).prepare_orchestration_save_result(response)
+        logger.info("Orchestration save completed")
+        return response_json
+
+    @instrumented
+    @ResourceLock.write
     def orchestration_restore(
         self,
         context: ResourceCommandContext,
@@ -302,52 +582,231 @@ class CiscoNXOSShellDriver(
         :param custom_params: json with custom restore parameters
         """
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
-
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
+            self._orchestration_restore(
+                context, logger, saved_artifact_info, custom_params
             )
 
-            cli_handler = self._cli.get_cli_handler(resource_config, logger)
-            configuration_flow = CiscoNXOSConfigurationFlow(
-                cli_handler=cli_handler, logger=logger, resource_config=resource_config
+    @instrumented
+    def orchestration_restore_bulk(
+        self,
+        context: ResourceCommandContext,
+        saved_artifacts: str,
+        custom_params: str,
+        max_concurrency: str,
+        fail_fast: str,
+    ) -> str:
+        """Validate saved artifacts and restore several resources concurrently.
+
+        Artifacts of all resources are validated in parallel first, resources
+        with invalid artifacts are not restored. With fail_fast nothing is
+        restored if any artifact is invalid and no new restore is started
+        after the first failed one.
+
+        :param context: an object with all Resource Attributes inside
+        :param saved_artifacts: json object with saved artifact info of every
+            resource name or result of orchestration_save_bulk
+        :param custom_params: json with custom restore parameters
+        :param max_concurrency: number of resources restored at once
+        :param fail_fast: "True" to stop on the first failure
+        :return str response: json with validation and restore result of every
+            resource
+        """
+        fail_fast = str(fail_fast).lower() == "true"
+        max_concurrency = int(max_concurrency or self.FLEET_MAX_CONCURRENCY)
+
+        with LoggingSessionContext(context) as logger:
+            api = self._get_api(context)
+            artifacts = parse_saved_artifacts(saved_artifacts)
+            started = time.time()
+
+            def get_context(resource_name):
+                if resource_name == context.resource.name:
+                    return context
+                return build_resource_context(context, api, resource_name)
+
+            def validate_artifact(resource_name):
+                path = OrchestrationSaveRestore(
+                    logger, resource_name
+                ).parse_orchestration_save_result(artifacts[resource_name])["path"]
+                error = check_artifact(path)
+                if error:
+                    raise Exception(error)
+                return path
+
+            def restore_resource(resource_name):
+                resource_context = get_context(resource_name)
+                with ResourceLock.acquire(resource_name, write=True):
+                    self._orchestration_restore(
+                        resource_context,
+                        logger,
+                        artifacts[resource_name],
+                        custom_params,
+                    )
+
+            logger.info("Validating saved artifacts of {}".format(list(artifacts)))
+            validation = FleetExecutor(
+                logger, len(artifacts) or 1, self.FLEET_DEVICE_TIMEOUT
+            ).run(list(artifacts), validate_artifact)
+            valid = [result.resource_name for result in validation if result.success]
+            if fail_fast and len(valid) < len(validation):
+                logger.error("Restore is cancelled, some artifacts are invalid")
+                valid = []
+
+            logger.info("Bulk orchestration restore started for {}".format(valid))
+            results = FleetExecutor(
+                logger, max_concurrency, self.FLEET_DEVICE_TIMEOUT
+            ).run(valid, restore_resource, fail_fast)
+            logger.info("Bulk orchestration restore completed")
+            return json.dumps(
+                {
+                    "validation": [result.to_dict() for result in validation],
+                    "results": [result.to_dict() for result in results],
+                    "duration": round(time.time() - started, 3),
+                }
             )
 
-            logger.info("Orchestration restore started")
-            restore_params = OrchestrationSaveRestore(
-                resource_config.name
-            ).parse_orchestration_save_result(saved_artifact_info)
-            configuration_flow.restore(**restore_params)
-            logger.info("Orchestration restore completed")
+    def _orchestration_restore(
+        self, context, logger, saved_artifact_info, custom_params
+    ):
+        resource_config = self._get_resource_config(context)
+        self._show_caches.invalidate(resource_config.name)
+
+        cli_handler = self._cli.get_cli_handler(resource_config, logger)
+        configuration_flow = self._get_configuration_flow(
+            cli_handler, logger, resource_config
+        )
+
+        logger.info("Orchestration restore started")
+        restore_params = OrchestrationSaveRestore(
+            logger, resource_config.name
+        ).parse_orchestration_save_result(saved_artifact_info, custom_params)
+        configuration_flow.restore(**restore_params)
+        logger.info("Orchestration restore completed")
 
-    @GlobalLock.lock
+    @instrumented
+    @ResourceLock.write
     def load_firmware(
         self, context: ResourceCommandContext, path: str, vrf_management_name: str
     ):
         """Upload and updates firmware on the resource."""
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
-
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+            resource_config = self._get_resource_config(context)
+            self._show_caches.invalidate(resource_config.name)
+            self._health_checks.invalidate(resource_config.name)
 
             if not vrf_management_name:
                 vrf_management_name = resource_config.vrf_management_name
 
-            cli_handler = self._cli.get_cli_handler(resource_config, logger)
-
             logger.info("Start Load Firmware")
-            firmware_operations = CiscoLoadFirmwareFlow(
-                cli_handler=cli_handler, logger=logger
+            firmware_operations = self._get_firmware_flow(
+                resource_config,
+                logger,
+                checksum=None,
+                progress=self._get_progress_reporter(context, logger),
             )
             firmware_operations.load_firmware(
                 path=path, vrf_management_name=vrf_management_name
             )
             logger.info("Finish Load Firmware.")
 
+    @instrumented
+    def load_firmware_bulk(
+        self,
+        context: ResourceCommandContext,
+        resource_names: str,
+        path: str,
+        vrf_management_name: str,
+        checksum: str,
+        stage_only: str,
+    ) -> str:
+        """Stage firmware on several resources in parallel and install it.
+
+        Images are copied to bootflash of all resources concurrently, at most
+        FIRMWARE_MAX_TRANSFERS transfers at once, the copy is skipped where
+        bootflash already holds the image with the checksum. Staged resources
+        are then installed and reloaded one by one, the install stops on the
+        first failure.
+
+        :param context: an object with all Resource Attributes inside
+        :param resource_names: json list or ';' separated names of the resources
+        :param path: full path to firmware file, i.e. tftp://10.0.0.1/nxos.bin
+        :param vrf_management_name: VRF management Name
+        :param checksum: expected md5, sha256 or sha512 hex digest of the image
+        :param stage_only: "True" to only copy the image without install
+        :return str response: json with stage and install result of every
+            resource
+        """
+        stage_only = str(stage_only).lower() == "true"
+
+        with LoggingSessionContext(context) as logger:
+            api = self._get_api(context)
+            names = parse_resource_names(resource_names) or [context.resource.name]
+            report_progress = self._get_progress_reporter(context, logger)
+            staged = {}
+            started = time.time()
+
+            def get_resource_config(resource_name):
+                resource_context = context
+                if resource_name != context.resource.name:
+                    resource_context = build_resource_context(
+                        context, api, resource_name
+                    )
+                return self._get_resource_config(resource_context)
+
+            def stage_resource(resource_name):
+                resource_config = get_resource_config(resource_name)
+                firmware_operations = self._get_firmware_flow(
+                    resource_config,
+                    logger,
+                    checksum,
+                    progress=lambda message: report_progress(
+                        "{}: {}".format(resource_name, message)
+                    ),
+                )
+                with ResourceLock.acquire(resource_name):
+                    staged[resource_name] = firmware_operations.stage(
+                        path,
+                        vrf_management_name or resource_config.vrf_management_name,
+                    )
+                    return staged[resource_name]
+
+            def install_resource(resource_name):
+                resource_config = get_resource_config(resource_name)
+                with ResourceLock.acquire(resource_name, write=True):
+                    self._show_caches.invalidate(resource_name)
+                    self._health_checks.invalidate(resource_name)
+                    self._get_firmware_flow(resource_config, logger, checksum).install(
+                        staged[resource_name],
+                        vrf_management_name or resource_config.vrf_management_name,
+                    )
+
+            logger.info("Firmware staging started for {}".format(names))
+            retry_policy = self._get_firmware_retry_policy()
+            stage_timeout = (
+                retry_policy.attempts * self.FIRMWARE_TRANSFER_TIMEOUT
+                + (retry_policy.attempts - 1) * retry_policy.max_backoff
+            )
+            staging = FleetExecutor(
+                logger, self.FIRMWARE_MAX_TRANSFERS, stage_timeout
+            ).run(names, stage_resource)
+            installs = []
+            if not stage_only:
+                ready = [result.resource_name for result in staging if result.success]
+                logger.info("Firmware install started for {}".format(ready))
+                installs = FleetExecutor(logger, 1, self.FIRMWARE_TRANSFER_TIMEOUT).run(
+                    ready, install_resource, fail_fast=True
+                )
+            logger.info("Bulk firmware load completed")
+            return json.dumps(
+                {
+                    "staging": [result.to_dict() for result in staging],
+                    "install": [result.to_dict() for result in installs],
+                    "duration": round(time.time() - started, 3),
+                }
+            )
+
+    @instrumented
+    @ResourceLock.read
     def health_check(self, context: ResourceCommandContext):
         """Performs device health check.
 
@@ -355,25 +814,204 @@ class CiscoNXOSShellDriver(
         :return: Success or Error message
         """
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
+            api = self._get_api(context)
+            resource_config = self._get_resource_config(context)
+            result = self._health_check(context, resource_config, logger)
+            self._live_statuses.write(api, [result], logger)
+            return result.description
+
+    @instrumented
+    def health_check_bulk(
+        self, context: ResourceCommandContext, resource_names: str, use_cache: str
+    ) -> str:
+        """Check health of several resources concurrently.
 
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
+        :param context: an object with all Resource Attributes inside
+        :param resource_names: json list or ';' separated names of the resources
+        :param use_cache: "False" to ignore cached health check results
+        :return str response: json report with reachability, latency of the
+            probes and failure reason of every resource
+        """
+        use_cache = str(use_cache).lower() != "false"
+
+        with LoggingSessionContext(context) as logger:
+            api = self._get_api(context)
+            names = parse_resource_names(resource_names) or [context.resource.name]
+            started = time.time()
+
+            def check_resource(resource_name):
+                resource_context = context
+                if resource_name != context.resource.name:
+                    resource_context = build_resource_context(
+                        context, api, resource_name
+                    )
+                resource_config = self._get_resource_config(resource_context)
+                if not use_cache:
+                    self._health_checks.invalidate(resource_name)
+                with ResourceLock.acquire(resource_name):
+                    return self._health_check(resource_context, resource_config, logger)
+
+            logger.info("Bulk health check started for {}".format(names))
+            results = collect_health_results(
+                FleetExecutor(
+                    logger, self.FLEET_MAX_CONCURRENCY, self.FLEET_DEVICE_TIMEOUT
+                ).run(names, check_resource)
+            )
+            self._live_statuses.write(api, results, logger)
+            logger.info("Bulk health check completed")
+            return json.dumps(
+                {
+                    "results": [result.to_dict() for result in results],
+                    "online": sum(1 for result in results if result.online),
+                    "offline": sum(1 for result in results if not result.online),
+                    "duration": round(time.time() - started, 3),
+                }
             )
-            cli_handler = self._cli.get_cli_handler(resource_config, logger)
 
-            state_operations = CiscoStateFlow(
-                logger=logger,
-                api=api,
+    def get_metrics(self, context: ResourceCommandContext, metrics_format: str) -> str:
+        """Return duration histograms of the driver commands.
+
+        :param context: an object with all Resource Attributes inside
+        :param metrics_format: "prometheus" or "json"
+        :return: metrics in Prometheus text format or json
+        """
+        if (metrics_format or "").lower() == "json":
+            return self._metrics.to_json()
+        return self._metrics.to_prometheus()
+
+    def cleanup(self):
+        if self._cli:
+            self._cli.close()
+        self._api_cache.invalidate()
+        self._resource_config_cache.invalidate()
+        self._snmp_states.invalidate()
+        self._show_caches.invalidate()
+        self._health_checks.invalidate()
+        self._live_statuses.invalidate()
+        if self._session_capture:
+            self._session_capture.close()
+
+    def _health_check(self, context, resource_config, logger) -> HealthCheckResult:
+        """Return health check result of the resource cached for a short TTL."""
+
+        def run_health_check():
+            snmp_enabled = self._snmp_states.get(
+                resource_config.name,
+                snmp_parameters_fingerprint(
+                    SnmpParametersHelper(resource_config).get_snmp_parameters()
+                ),
+            )
+            return TieredHealthCheck(
                 resource_config=resource_config,
-                cli_configurator=cli_handler,
+                cli_handler=self._cli.get_cli_handler(resource_config, logger),
+                logger=logger,
+                snmp_enabled=snmp_enabled,
+                snmp=self._get_snmp(
+                    resource_config.name,
+                    timeout=TieredHealthCheck.SNMP_PROBE_TIMEOUT,
+                    retry_count=TieredHealthCheck.SNMP_PROBE_RETRY_COUNT,
+                ),
+            ).run()
+
+        return self._health_checks.get(
+            resource_config.name, context_fingerprint(context), run_health_check
+        )
+
+    def _get_snmp(self, resource_name, **kwargs):
+        """Return Snmp recording or replaying the traffic, None without capture."""
+        if self._session_capture:
+            return self._session_capture.snmp(resource_name, **kwargs)
+
+    def _get_run_command_flow(self, cli_handler, logger):
+        if self.RUN_COMMAND_PIPELINED:
+            return PipelinedCiscoRunCommandFlow(
+                logger=logger, cli_configurator=cli_handler
             )
-            return state_operations.health_check()
+        return CiscoRunCommandFlow(logger=logger, cli_configurator=cli_handler)
+
+    def _get_configuration_flow(
+        self, cli_handler, logger, resource_config
+    ) -> NXOSConfigurationFlow:
+        backup_index = self._backup_index if self.BACKUP_DEDUPLICATE else None
+        return NXOSConfigurationFlow(
+            cli_handler=cli_handler,
+            logger=logger,
+            resource_config=resource_config,
+            backup_index=backup_index,
+            compress=self.BACKUP_COMPRESS,
+            chunk_size=self.CONFIG_TRANSFER_CHUNK_SIZE,
+        )
 
-    def cleanup(self):
-        pass
+    def _get_firmware_flow(
+        self, resource_config, logger, checksum, progress=None
+    ) -> StagedCiscoLoadFirmwareFlow:
+        return StagedCiscoLoadFirmwareFlow(
+            cli_handler=self._cli.get_cli_handler(resource_config, logger),
+            logger=logger,
+            checksum=checksum,
+            transfer_slots=self._firmware_transfers,
+            retry_policy=self._get_firmware_retry_policy(),
+            progress=progress,
+            transfer_timeout=self.FIRMWARE_TRANSFER_TIMEOUT,
+        )
+
+    def _get_firmware_retry_policy(self) -> RetryPolicy:
+        return RetryPolicy(
+            attempts=self.FIRMWARE_TRANSFER_ATTEMPTS,
+            backoff=self.FIRMWARE_TRANSFER_BACKOFF,
+            max_backoff=self.FIRMWARE_TRANSFER_MAX_BACKOFF,
+        )
+
+    def _get_progress_reporter(self, context, logger):
+        """Return callable writing progress messages to the reservation output."""
+        api = self._get_api(context)
+        reservation_id = context.reservation.reservation_id
+
+        def report_progress(message):
+            logger.info(message)
+            try:
+                api.WriteMessageToReservationOutput(reservation_id, message)
+            except Exception:
+                logger.debug("Unable to write progress to reservation output")
+
+        return report_progress
+
+    def _get_show_cache(self, context) -> ResourceCache:
+        """Return cache of show command results of the resource."""
+        return self._show_caches.get(
+            context.resource.name,
+            context_fingerprint(context),
+            lambda: ResourceCache(ttl=self.SHOW_COMMAND_CACHE_TTL),
+        )
+
+    def _get_api(self, context):
+        """Return CloudShell API session, reused between commands of the resource."""
 
+        def create_api():
+            with timed_phase("api_session"):
+                return CloudShellSessionContext(context).get_api()
+
+        return self._api_cache.get(
+            context.resource.name, connectivity_fingerprint(context), create_api
+        )
+
+    def _get_resource_config(self, context) -> NetworkingResourceConfig:
+        """Return resource config, rebuilt only when resource attributes change."""
+        api = self._get_api(context)
+        fingerprint = "{}:{}".format(
+            context_fingerprint(context), connectivity_fingerprint(context)
+        )
+
+        def create_resource_config():
+            with timed_phase("resource_config"):
+                return NetworkingResourceConfig.from_context(context=context, api=api)
+
+        return self._resource_config_cache.get(
+            context.resource.name, fingerprint, create_resource_config
+        )
+
+    @instrumented
+    @ResourceLock.write
     def shutdown(self, context: ResourceCommandContext):
         """Shutdown device.
 
@@ -381,12 +1019,10 @@ class CiscoNXOSShellDriver(
         :return:
         """
         with LoggingSessionContext(context) as logger:
-            api = CloudShellSessionContext(context).get_api()
-
-            resource_config = NetworkingResourceConfig.from_context(
-                context=context,
-                api=api,
-            )
+            api = self._get_api(context)
+            resource_config = self._get_resource_config(context)
+            self._show_caches.invalidate(resource_config.name)
+            self._health_checks.invalidate(resource_config.name)
 
             cli_handler = self._cli.get_cli_handler(resource_config, logger)
             state_operations = CiscoStateFlow(
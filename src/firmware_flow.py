@@ -0,0 +1,217 @@
+import re
+import time
+from contextlib import nullcontext
+
+from cloudshell.networking.cisco.command_actions.system_actions import SystemActions
+from cloudshell.networking.cisco.flows.cisco_load_firmware_flow import (
+    CiscoLoadFirmwareFlow,
+)
+from cloudshell.shell.flows.utils.networking_utils import UrlParser
+
+from metrics import timed_phase
+
+CHECKSUM_ALGORITHMS = {32: "md5sum", 64: "sha256sum", 128: "sha512sum"}
+CHECKSUM_PATTERN = re.compile(r"\b([0-9a-f]{128}|[0-9a-f]{64}|[0-9a-f]{32})\b", re.I)
+
+
+def parse_checksum(checksum):
+    """Return "show file" checksum option and digest of the expected checksum.
+
+    :param str checksum: hex digest optionally prefixed with the algorithm,
+        e.g. "md5:1f3870be274f6c49b3e31a0c6728957f"
+    :rtype: tuple[str, str]
+    """
+    digest = checksum.strip().lower().split(":")[-1]
+    algorithm = CHECKSUM_ALGORITHMS.get(len(digest))
+    if not algorithm or not CHECKSUM_PATTERN.match(digest):
+        raise ValueError("Unsupported checksum {}".format(checksum))
+    return algorithm, digest
+
+
+class RetryPolicy(object):
+    """Number of attempts and exponential backoff between them."""
+
+    def __init__(self, attempts=3, backoff=30, max_backoff=600, factor=2):
+        self.attempts = max(int(attempts), 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.factor = factor
+
+    def get_delay(self, attempt):
+        """Return seconds to wait after the failed attempt (counted from 1)."""
+        return min(self.backoff * self.factor ** (attempt - 1), self.max_backoff)
+
+
+class StagedCiscoLoadFirmwareFlow(CiscoLoadFirmwareFlow):
+    """Load firmware flow split into stage and install steps.
+
+    Staging copies the image to bootflash, the copy is skipped when the file
+    on bootflash already has the expected checksum and is verified after the
+    transfer. Concurrent transfers of the process are limited by
+    transfer_slots. Install updates the boot configuration and reloads the
+    device.
+
+    A failed transfer is retried in a new CLI session according to the retry
+    policy. NX-OS copy can't continue a partial file, so a retry resumes at
+    file level: the image left by an attempt which lost its session after
+    the transfer completed is accepted if the checksum matches. Progress is
+    reported with the progress callable.
+    """
+
+    BOOTFLASH = "bootflash:"
+    TRANSFER_TIMEOUT = 60 * 60
+
+    def __init__(
+        self,
+        cli_handler,
+        logger,
+        checksum=None,
+        transfer_slots=None,
+        retry_policy=None,
+        progress=None,
+        transfer_timeout=TRANSFER_TIMEOUT,
+    ):
+        super(StagedCiscoLoadFirmwareFlow, self).__init__(
+            cli_handler=cli_handler, logger=logger
+        )
+        self._checksum = parse_checksum(checksum) if checksum else None
+        self._transfer_slots = transfer_slots
+        self._retry_policy = retry_policy or RetryPolicy(attempts=1)
+        self._progress = progress or logger.info
+        self._transfer_timeout = transfer_timeout
+
+    def _load_firmware_flow(self, path, vrf_management_name, timeout):
+        firmware_dst_path = self.stage(path, vrf_management_name)
+        self.install(firmware_dst_path, vrf_management_name, timeout)
+
+    def stage(self, path, vrf_management_name=None):
+        """Copy the image to bootflash unless it is already there.
+
+        :param str path: url of the firmware image
+        :param str vrf_management_name: Virtual Routing and Forwarding Name
+        :return: path of the image on the device
+        :rtype: str
+        """
+        firmware_file_name = UrlParser.parse_url(path).get(UrlParser.FILENAME)
+        if not firmware_file_name:
+            raise Exception(self.__class__.__name__, "Unable to find firmware file")
+        firmware_dst_path = "{0}/{1}".format(self.BOOTFLASH, firmware_file_name)
+
+        attempts = self._retry_policy.attempts
+        for attempt in range(1, attempts + 1):
+            try:
+                self._stage_attempt(path, firmware_dst_path, vrf_management_name)
+            except Exception as e:
+                if attempt == attempts:
+                    self._progress(
+                        "Transfer of {} failed after {} attempts".format(
+                            firmware_file_name, attempts
+                        )
+                    )
+                    raise
+                delay = self._retry_policy.get_delay(attempt)
+                self._logger.exception("Transfer attempt {} failed".format(attempt))
+                self._progress(
+                    "Transfer of {} failed ({}), retry {}/{} in {}s".format(
+                        firmware_file_name, e, attempt, attempts - 1, delay
+                    )
+                )
+                time.sleep(delay)
+            else:
+                break
+        return firmware_dst_path
+
+    def _stage_attempt(self, path, firmware_dst_path, vrf_management_name):
+        with self._cli_handler.get_cli_service(
+            self._cli_handler.enable_mode
+        ) as enable_session:
+            if self._is_staged(enable_session, firmware_dst_path):
+                self._progress(
+                    "{} is already staged, skipping copy".format(firmware_dst_path)
+                )
+                return
+
+            system_action = SystemActions(enable_session, self._logger)
+            with self._transfer_slots or nullcontext(), timed_phase("file_transfer"):
+                self._progress("Copying image to {}".format(firmware_dst_path))
+                started = time.time()
+                system_action.copy(
+                    path,
+                    firmware_dst_path,
+                    vrf=vrf_management_name,
+                    action_map=system_action.prepare_action_map(
+                        path, firmware_dst_path
+                    ),
+                    timeout=self._transfer_timeout,
+                )
+
+            if self._checksum and not self._is_staged(
+                enable_session, firmware_dst_path
+            ):
+                raise Exception(
+                    self.__class__.__name__,
+                    "Checksum of {} doesn't match after copy".format(firmware_dst_path),
+                )
+            self._progress(
+                "Copied image to {} in {:.0f}s".format(
+                    firmware_dst_path, time.time() - started
+                )
+            )
+
+    def install(self, firmware_dst_path, vrf_management_name=None, timeout=None):
+        """Boot the device from the staged image.
+
+        :param str firmware_dst_path: path of the image on the device
+        :param str vrf_management_name: Virtual Routing and Forwarding Name
+        :param int timeout: session reconnect timeout
+        """
+        timeout = timeout or self._timeout
+        firmware_file_name = firmware_dst_path.split("/")[-1]
+        with self._cli_handler.get_cli_service(
+            self._cli_handler.enable_mode
+        ) as enable_session:
+            system_action = SystemActions(enable_session, self._logger)
+            self._logger.info("Get current boot configuration")
+            current_boot = system_action.get_current_boot_image()
+            self._logger.info("Modifying boot configuration")
+            self._apply_firmware(enable_session, current_boot, firmware_dst_path)
+
+            output = system_action.get_current_boot_config()
+            if output.find(firmware_file_name) == -1:
+                raise Exception(
+                    self.__class__.__name__,
+                    "Can't add firmware '{}' for boot!".format(firmware_file_name),
+                )
+
+            system_action.copy(
+                self.RUNNING_CONFIG,
+                self.STARTUP_CONFIG,
+                vrf=vrf_management_name,
+                action_map=system_action.prepare_action_map(
+                    self.RUNNING_CONFIG, self.STARTUP_CONFIG
+                ),
+            )
+            if "CONSOLE" in enable_session.session.SESSION_TYPE:
+                system_action.reload_device_via_console(timeout)
+            else:
+                system_action.reload_device(timeout)
+
+            os_version = system_action.get_current_os_version()
+            if os_version.find(firmware_file_name) == -1:
+                raise Exception(
+                    self.__class__.__name__,
+                    "Failed to load firmware, Please check logs",
+                )
+
+    def get_file_checksum(self, enable_session, path, algorithm="md5sum"):
+        """Return checksum of the file on the device or None if it is missing."""
+        output = enable_session.send_command("show file {} {}".format(path, algorithm))
+        match = CHECKSUM_PATTERN.search(output)
+        return match.group(1).lower() if match else None
+
+    def _is_staged(self, enable_session, firmware_dst_path):
+        if not self._checksum:
+            return False
+        algorithm, digest = self._checksum
+        checksum = self.get_file_checksum(enable_session, firmware_dst_path, algorithm)
+        return checksum == digest
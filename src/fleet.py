@@ -0,0 +1,157 @@
+import copy
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+
+from cloudshell.shell.core.driver_context import ResourceContextDetails
+
+
+def parse_resource_names(resource_names):
+    """Return list of resource names from json list or ';' separated string."""
+    resource_names = (resource_names or "").strip()
+    if resource_names.startswith("["):
+        names = json.loads(resource_names)
+    else:
+        names = resource_names.split(";")
+    result = []
+    for name in names:
+        name = name.strip()
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+def build_resource_context(context, api, resource_name):
+    """Return copy of the command context describing another resource.
+
+    Resource details and attributes are loaded with GetResourceDetails, other
+    parts of the context (connectivity, reservation) are reused.
+    """
+    details = api.GetResourceDetails(resource_name)
+    resource_context = copy.copy(context)
+    resource_context.resource = ResourceContextDetails(
+        id=getattr(details, "UniqeIdentifier", None),
+        name=details.Name,
+        fullname=details.Name,
+        type="Resource",
+        address=details.Address,
+        model=details.ResourceModelName,
+        family=details.ResourceFamilyName,
+        description=getattr(details, "Description", ""),
+        attributes={
+            attribute.Name: attribute.Value for attribute in details.ResourceAttributes
+        },
+        app_context=None,
+        networks_info=None,
+        shell_standard=None,
+        shell_standard_version=None,
+    )
+    return resource_context
+
+
+class DeviceResult(object):
+    def __init__(self, resource_name):
+        self.resource_name = resource_name
+        self.success = False
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return round(self.finished - self.started, 3)
+
+    def to_dict(self):
+        return {
+            "resource_name": self.resource_name,
+            "success": self.success,
+            "result": self.result,
+            "error": self.error,
+            "duration": self.duration,
+        }
+
+
+class FleetExecutor(object):
+    """Run an operation for many resources with a concurrency cap.
+
+    Every device gets device_timeout seconds from the moment its operation
+    starts. A timed out operation is reported as failed but keeps its slot
+    until it exits, so no more than max_concurrency operations ever run at
+    once. CLI session timeouts bound how long a hung operation takes to exit.
+    """
+
+    MAX_CONCURRENCY = 10
+    DEVICE_TIMEOUT = 600
+
+    def __init__(
+        self, logger, max_concurrency=MAX_CONCURRENCY, device_timeout=DEVICE_TIMEOUT
+    ):
+        self._logger = logger
+        self._max_concurrency = max(int(max_concurrency), 1)
+        self._device_timeout = device_timeout
+
+    def run(self, resource_names, operation, fail_fast=False):
+        """Run operation(resource_name) for every resource.
+
+        :param list[str] resource_names:
+        :param operation: callable returning JSON serializable result
+        :param bool fail_fast: don't start operations after the first failure
+        :rtype: list[DeviceResult]
+        """
+        results = [DeviceResult(name) for name in resource_names]
+        if not results:
+            return results
+
+        failed = Event() if fail_fast else None
+        workers = min(self._max_concurrency, len(results))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [
+                executor.submit(self._run_device, result, operation, failed)
+                for result in results
+            ]:
+                future.result()
+        return results
+
+    def _run_device(self, device_result, operation, failed=None):
+        if failed is not None and failed.is_set():
+            device_result.error = "Skipped after a failure of another resource"
+            return
+
+        outcome = {}
+
+        def target():
+            try:
+                outcome["result"] = operation(device_result.resource_name)
+            except Exception as e:
+                self._logger.exception(
+                    "Operation failed for {}".format(device_result.resource_name)
+                )
+                outcome["error"] = str(e)
+
+        device_result.started = time.time()
+        thread = Thread(target=target, name=device_result.resource_name)
+        thread.daemon = True
+        thread.start()
+        thread.join(self._device_timeout)
+        if thread.is_alive():
+            device_result.error = "Timed out after {}s".format(self._device_timeout)
+            self._logger.error(
+                "Operation for {} timed out, waiting for it to exit".format(
+                    device_result.resource_name
+                )
+            )
+            if failed is not None:
+                failed.set()
+            thread.join()
+        elif "error" in outcome:
+            device_result.error = outcome["error"]
+        else:
+            device_result.result = outcome.get("result")
+            device_result.success = True
+        device_result.finished = time.time()
+        if failed is not None and not device_result.success:
+            failed.set()
@@ -0,0 +1,214 @@
+import socket
+import time
+
+from cloudshell.networking.cisco.flows.cisco_run_command_flow import CiscoRunCommandFlow
+from cloudshell.snmp.cloudshell_snmp import Snmp
+from cloudshell.snmp.core.domain.snmp_oid import SnmpMibObject
+from cloudshell.snmp.snmp_parameters import SnmpParametersHelper
+
+from resource_cache import ResourceCache
+
+SYS_UP_TIME = SnmpMibObject("SNMPv2-MIB", "sysUpTime", "0")
+CLI_PORTS = {"telnet": 23}
+DEFAULT_CLI_PORT = 22
+
+
+def get_cli_port(resource_config):
+    """Return TCP port of the CLI of the resource."""
+    port = getattr(resource_config, "cli_tcp_port", None)
+    if port and str(port).isdigit() and int(port):
+        return int(port)
+    connection_type = (
+        getattr(resource_config, "cli_connection_type", "") or ""
+    ).lower()
+    return CLI_PORTS.get(connection_type, DEFAULT_CLI_PORT)
+
+
+def tcp_probe(address, port, timeout):
+    """Return seconds needed to open a TCP connection to the port."""
+    started = time.time()
+    socket.create_connection((address, port), timeout).close()
+    return time.time() - started
+
+
+class HealthCheckResult(object):
+    def __init__(self, resource_name):
+        self.resource_name = resource_name
+        self.online = False
+        self.tier = None
+        self.tcp_latency = None
+        self.snmp_latency = None
+        self.cli_latency = None
+        self.error = None
+        self.checked = None
+
+    @property
+    def live_status(self):
+        return "Online" if self.online else "Error"
+
+    @property
+    def description(self):
+        return "Health check on resource {} {}.".format(
+            self.resource_name, "passed" if self.online else "failed"
+        )
+
+    def to_dict(self):
+        return {
+            "resource_name": self.resource_name,
+            "online": self.online,
+            "tier": self.tier,
+            "tcp_latency": self.tcp_latency,
+            "snmp_latency": self.snmp_latency,
+            "cli_latency": self.cli_latency,
+            "error": self.error,
+            "checked": self.checked,
+        }
+
+
+def collect_health_results(device_results):
+    """Return health check results of the fleet run.
+
+    Resources whose check couldn't run (e.g. timed out) are reported failed
+    with the reason of the fleet operation failure.
+
+    :param list[fleet.DeviceResult] device_results:
+    :rtype: list[HealthCheckResult]
+    """
+    results = []
+    for device_result in device_results:
+        result = device_result.result
+        if result is None:
+            result = HealthCheckResult(device_result.resource_name)
+            result.error = device_result.error
+        results.append(result)
+    return results
+
+
+class TieredHealthCheck(object):
+    """Health check escalating from TCP and SNMP probes to the CLI.
+
+    The resource passes without a CLI session when the CLI port accepts a TCP
+    connection and sysUpTime answers over SNMP. If any of the probes fails,
+    or SNMP is known to be disabled, the check falls back to sending an
+    empty command over the CLI as the library health check does.
+    """
+
+    PROBE_TIMEOUT = 2
+    SNMP_PROBE_TIMEOUT = 200  # pysnmp timeouts are in 1/100 s
+    SNMP_PROBE_RETRY_COUNT = 0
+
+    def __init__(
+        self,
+        resource_config,
+        cli_handler,
+        logger,
+        snmp_enabled=None,
+        snmp=None,
+        timeout=PROBE_TIMEOUT,
+    ):
+        """Tiered health check.
+
+        :param resource_config: networking resource config
+        :param cli_handler: cli handler of the resource
+        :param logging.Logger logger:
+        :param bool snmp_enabled: last known SNMP state, None if unknown
+        :param cloudshell.snmp.cloudshell_snmp.Snmp snmp:
+        :param float timeout: TCP probe timeout in seconds
+        """
+        self._resource_config = resource_config
+        self._cli_handler = cli_handler
+        self._logger = logger
+        self._snmp_enabled = snmp_enabled
+        self._snmp = snmp or Snmp(
+            timeout=self.SNMP_PROBE_TIMEOUT, retry_count=self.SNMP_PROBE_RETRY_COUNT
+        )
+        self._timeout = timeout
+
+    def run(self):
+        """Check the resource.
+
+        :rtype: HealthCheckResult
+        """
+        result = HealthCheckResult(self._resource_config.name)
+        try:
+            result.tcp_latency = round(
+                tcp_probe(
+                    self._resource_config.address,
+                    get_cli_port(self._resource_config),
+                    self._timeout,
+                ),
+                4,
+            )
+            if self._snmp_enabled is not False:
+                result.snmp_latency = round(self._snmp_probe(), 4)
+                result.tier = "snmp"
+                result.online = True
+        except Exception as e:
+            self._logger.debug("Health check probe failed: {}".format(e))
+            result.error = str(e) or e.__class__.__name__
+
+        if not result.online:
+            self._cli_check(result)
+        result.checked = time.time()
+        return result
+
+    def _snmp_probe(self):
+        started = time.time()
+        snmp_parameters = SnmpParametersHelper(
+            self._resource_config
+        ).get_snmp_parameters()
+        with self._snmp.get_snmp_service(snmp_parameters, self._logger) as service:
+            response = service.get(SYS_UP_TIME)
+        if not response or not response.safe_value:
+            raise Exception("sysUpTime is empty")
+        return time.time() - started
+
+    def _cli_check(self, result):
+        started = time.time()
+        result.tier = "cli"
+        try:
+            CiscoRunCommandFlow(self._logger, self._cli_handler).run_custom_command("")
+        except Exception as e:
+            self._logger.exception(e)
+            result.error = str(e) or e.__class__.__name__
+        else:
+            result.online = True
+            result.error = None
+        result.cli_latency = round(time.time() - started, 4)
+
+
+class LiveStatusWriter(object):
+    """Write live status of resources.
+
+    A status equal to the one written less than ttl seconds ago is skipped,
+    older statuses are written again in case the status was changed on the
+    portal since.
+    """
+
+    def __init__(self, ttl=ResourceCache.DEFAULT_TTL):
+        self._statuses = ResourceCache(ttl=ttl)
+
+    def write(self, api, results, logger):
+        """Write live status of all the health check results.
+
+        :param api: CloudShell API session
+        :param list[HealthCheckResult] results:
+        :param logging.Logger logger:
+        """
+        for result in results:
+            status = (result.live_status, result.description)
+            if self._statuses.peek(result.resource_name, status):
+                continue
+            try:
+                api.SetResourceLiveStatus(result.resource_name, *status)
+            except Exception:
+                logger.error(
+                    "Cannot update {} resource status on portal".format(
+                        result.resource_name
+                    )
+                )
+            else:
+                self._statuses.put(result.resource_name, status, True)
+
+    def invalidate(self, resource_name=None):
+        self._statuses.invalidate(resource_name)
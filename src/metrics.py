@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    900.0,
+)
+METRIC_NAME = "cisco_nxos_driver_duration_seconds"
+TOTAL_PHASE = "total"
+EXECUTION_PHASE = "execution"
+
+_local = threading.local()
+
+
+@contextmanager
+def timed_phase(phase):
+    """Add duration of the block to the phase of the current command call.
+
+    Nested phases are counted in the outermost one only. Blocks running
+    outside of an instrumented command (e.g. in worker threads) are ignored.
+    """
+    timer = getattr(_local, "timer", None)
+    if timer is None or timer.active_phase is not None:
+        yield
+        return
+
+    timer.active_phase = phase
+    started = time.time()
+    try:
+        yield
+    finally:
+        timer.active_phase = None
+        timer.add(phase, time.time() - started)
+
+
+class CallTimer(object):
+    """Durations of the phases of a single driver command call."""
+
+    def __init__(self, command, resource_name):
+        self.command = command
+        self.resource_name = resource_name
+        self.active_phase = None
+        self.started = time.time()
+        self._phases = OrderedDict()
+
+    def add(self, phase, seconds):
+        self._phases[phase] = self._phases.get(phase, 0.0) + seconds
+
+    def breakdown(self):
+        """Return durations of the phases, the rest of the call is execution.
+
+        :rtype: collections.OrderedDict
+        """
+        total = time.time() - self.started
+        phases = OrderedDict(self._phases)
+        phases[EXECUTION_PHASE] = max(total - sum(self._phases.values()), 0.0)
+        phases[TOTAL_PHASE] = total
+        return phases
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {
+            "buckets": OrderedDict(
+                (str(bucket), count) for bucket, count in zip(self.buckets, self.counts)
+            ),
+            "sum": round(self.sum, 6),
+            "count": self.count,
+        }
+
+
+class MetricsRegistry(object):
+    """Duration histograms of driver commands per command, resource and phase.
+
+    When textfile_path is set the metrics are written in Prometheus text
+    format after every command, ready for the node exporter textfile
+    collector.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, textfile_path=None):
+        self._buckets = buckets
+        self._textfile_path = textfile_path
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._histograms = OrderedDict()
+
+    def observe(self, command, resource_name, phase, seconds):
+        key = (command, resource_name or "", phase)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def measure(self, command, resource_name, log_breakdown=False):
+        """Time the command call, phases are added with timed_phase."""
+        previous = getattr(_local, "timer", None)
+        timer = _local.timer = CallTimer(command, resource_name)
+        try:
+            yield timer
+        finally:
+            _local.timer = previous
+            breakdown = timer.breakdown()
+            for phase, seconds in breakdown.items():
+                self.observe(command, resource_name, phase, seconds)
+            if log_breakdown:
+                logger.info(
+                    "{} on {} timing: {}".format(
+                        command,
+                        resource_name,
+                        ", ".join(
+                            "{}={:.3f}s".format(phase, seconds)
+                            for phase, seconds in breakdown.items()
+                        ),
+                    )
+                )
+            if self._textfile_path:
+                self._write_textfile()
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps(
+                [
+                    dict(
+                        command=command,
+                        resource=resource_name,
+                        phase=phase,
+                        **histogram.to_dict()
+                    )
+                    for (command, resource_name, phase), histogram in (
+                        self._histograms.items()
+                    )
+                ]
+            )
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP {} Duration of driver commands by phase.".format(METRIC_NAME),
+            "# TYPE {} histogram".format(METRIC_NAME),
+        ]
+        with self._lock:
+            for (command, resource_name, phase), histogram in self._histograms.items():
+                labels = 'command="{}",resource="{}",phase="{}"'.format(
+                    _escape(command), _escape(resource_name), _escape(phase)
+                )
+                for bucket, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(
+                        '{}_bucket{{{},le="{}"}} {}'.format(
+                            METRIC_NAME, labels, bucket, count
+                        )
+                    )
+                lines.append(
+                    '{}_bucket{{{},le="+Inf"}} {}'.format(
+                        METRIC_NAME, labels, histogram.count
+                    )
+                )
+                lines.append(
+                    "{}_sum{{{}}} {}".format(METRIC_NAME, labels, histogram.sum)
+                )
+                lines.append(
+                    "{}_count{{{}}} {}".format(METRIC_NAME, labels, histogram.count)
+                )
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def _write_textfile(self):
+        folder, name = os.path.split(os.path.abspath(self._textfile_path))
+        with self._write_lock:
+            try:
+                handle, temp_path = tempfile.mkstemp(
+                    prefix=name, suffix=".tmp", dir=folder
+                )
+            except (IOError, OSError) as e:
+                logger.warning("Unable to write metrics: {}".format(e))
+                return
+            try:
+                with os.fdopen(handle, "w") as textfile:
+                    textfile.write(self.to_prometheus())
+                # readable by the node exporter, mkstemp creates 0600 files
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, self._textfile_path)
+            except (IOError, OSError) as e:
+                os.remove(temp_path)
+                logger.warning("Unable to write metrics: {}".format(e))
+
+
+def instrumented(func):
+    """Record durations of the driver command in the driver metrics."""
+
+    @wraps(func)
+    def _wrap_func(self, context, *args, **kwargs):
+        resource_name = getattr(getattr(context, "resource", None), "name", None)
+        with self._metrics.measure(
+            func.__name__, resource_name, self.METRICS_LOG_BREAKDOWN
+        ):
+            return func(self, context, *args, **kwargs)
+
+    return _wrap_func
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
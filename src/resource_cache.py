@@ -0,0 +1,88 @@
+import hashlib
+import time
+from threading import Lock
+
+
+def context_fingerprint(context) -> str:
+    """Return a digest of the resource name, address and attributes in context."""
+    resource = context.resource
+    attributes = sorted((resource.attributes or {}).items())
+    data = repr((resource.name, resource.address, attributes))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def connectivity_fingerprint(context) -> str:
+    """Return a digest of the CloudShell API connection details in context."""
+    connectivity = context.connectivity
+    reservation = getattr(context, "reservation", None)
+    data = repr(
+        (
+            connectivity.server_address,
+            connectivity.admin_auth_token,
+            getattr(connectivity, "cloudshell_api_scheme", None),
+            getattr(reservation, "domain", None),
+        )
+    )
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class ResourceCache(object):
+    """Thread safe per-resource cache with TTL and fingerprint invalidation.
+
+    An entry is reused only while it is younger than ttl seconds and was built
+    for the same fingerprint, so a change of the resource attributes drops it.
+    """
+
+    DEFAULT_TTL = 300
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self._ttl = ttl
+        self._lock = Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fingerprint, factory):
+        """Return cached value for key or build it with factory.
+
+        :param str key: resource name
+        :param str fingerprint: digest of the data the value was built from
+        :param factory: callable without arguments that builds the value
+        """
+        value = self.peek(key, fingerprint)
+        if value is None:
+            value = factory()
+            self.put(key, fingerprint, value)
+        return value
+
+    def peek(self, key, fingerprint):
+        """Return cached value for key or None if it is missing or stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == fingerprint and not self._expired(entry):
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+    def put(self, key, fingerprint, value):
+        with self._lock:
+            self._entries[key] = (fingerprint, time.time(), value)
+
+    def invalidate(self, key=None):
+        """Drop the entry for key, or every entry if key is not provided."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+    def _expired(self, entry):
+        return time.time() - entry[1] >= self._ttl
@@ -0,0 +1,129 @@
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+from threading import Condition, Lock
+
+from metrics import timed_phase
+
+logger = logging.getLogger(__name__)
+
+
+class ReadWriteLock(object):
+    """Lock allowing concurrent readers and a single writer.
+
+    Waiting writers block new readers, so writers are not starved.
+    """
+
+    def __init__(self):
+        self._condition = Condition(Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+
+class ResourceLock(object):
+    """Per-resource reader/writer locks shared by the driver process.
+
+    Read-only commands of a resource run concurrently, mutating commands are
+    serialized against any other command of the same resource only.
+    """
+
+    _lock = Lock()
+    _locks = {}
+    _wait_stats = {}
+
+    @staticmethod
+    def read(func):
+        return ResourceLock._decorate(func, write=False)
+
+    @staticmethod
+    def write(func):
+        return ResourceLock._decorate(func, write=True)
+
+    @staticmethod
+    def get_lock(resource_name) -> ReadWriteLock:
+        with ResourceLock._lock:
+            return ResourceLock._locks.setdefault(resource_name, ReadWriteLock())
+
+    @staticmethod
+    def wait_stats():
+        """Return lock wait statistics per resource and lock kind.
+
+        :rtype: dict[str, dict[str, dict[str, float]]]
+        """
+        with ResourceLock._lock:
+            return {
+                name: {kind: dict(values) for kind, values in kinds.items()}
+                for name, kinds in ResourceLock._wait_stats.items()
+            }
+
+    @staticmethod
+    def _record_wait(resource_name, kind, wait):
+        with ResourceLock._lock:
+            stats = ResourceLock._wait_stats.setdefault(resource_name, {})
+            values = stats.setdefault(kind, {"count": 0, "total": 0.0, "max": 0.0})
+            values["count"] += 1
+            values["total"] += wait
+            values["max"] = max(values["max"], wait)
+        logger.debug(
+            "Waited {:.3f}s for {} lock of {}".format(wait, kind, resource_name)
+        )
+
+    @staticmethod
+    @contextmanager
+    def acquire(resource_name, write=False):
+        """Hold read or write lock of the resource."""
+        kind = "write" if write else "read"
+        lock = ResourceLock.get_lock(resource_name)
+        started = time.time()
+        with timed_phase("lock_wait"):
+            if write:
+                lock.acquire_write()
+            else:
+                lock.acquire_read()
+        ResourceLock._record_wait(resource_name, kind, time.time() - started)
+        try:
+            yield
+        finally:
+            if write:
+                lock.release_write()
+            else:
+                lock.release_read()
+
+    @staticmethod
+    def _decorate(func, write):
+        @wraps(func)
+        def _wrap_func(self, context, *args, **kwargs):
+            resource_name = getattr(getattr(context, "resource", None), "name", None)
+            with ResourceLock.acquire(resource_name, write):
+                return func(self, context, *args, **kwargs)
+
+        return _wrap_func
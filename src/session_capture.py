@@ -0,0 +1,541 @@
+import base64
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+from cloudshell.cli.session.session_exceptions import (
+    ExpectedSessionException,
+    SessionReadTimeout,
+)
+from cloudshell.snmp.cloudshell_snmp import Snmp
+from cloudshell.snmp.core.tools.snmp_constants import SNMP_RETRIES_COUNT, SNMP_TIMEOUT
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.carrier.asynsock.dgram import udp, udp6
+from pysnmp.entity import config
+from pysnmp.proto import api
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_FORMAT = "cisco-nxos-session-capture"
+CAPTURE_VERSION = 1
+REDACTED = "<redacted>"
+URL_CREDENTIALS_PATTERN = re.compile(r"(?<=://)[^/@\s]*@")
+
+# Event kinds, every event is stored as [timestamp, stream, kind, data]
+OPEN = "o"
+ERROR = "e"
+SEND = "s"
+RECEIVE = "r"
+SNMP_REQUEST = "q"
+SNMP_RESPONSE = "a"
+
+
+def read_capture(path):
+    """Yield events of the capture file.
+
+    A file cut short by a crash of the recording process is read up to the
+    last complete event.
+    """
+    with gzip.open(path, "rt") as capture:
+        try:
+            for line in capture:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if isinstance(record, dict):
+                    if record.get("format") != CAPTURE_FORMAT:
+                        raise ValueError(
+                            "{} is not a session capture file".format(path)
+                        )
+                    continue
+                yield record
+        except EOFError:
+            logger.debug("Capture file {} is truncated".format(path))
+
+
+def redact(data, secrets):
+    """Replace the secrets in the data and drop credentials of urls.
+
+    :param str data: sent or received CLI data
+    :param list[str] secrets: secrets, the longest first
+    """
+    data = URL_CREDENTIALS_PATTERN.sub("", data)
+    for secret in secrets:
+        data = data.replace(secret, REDACTED)
+    return data
+
+
+def split_snmp_message(message):
+    """Return request-id, community and the message without both of them.
+
+    SNMPv3 messages can't be decoded without the keys and are returned as is.
+
+    :param bytes message: BER encoded SNMP message
+    :rtype: tuple[int|None, str|None, bytes]
+    """
+    try:
+        module = api.protoModules[int(api.decodeMessageVersion(message))]
+        decoded, _ = decoder.decode(message, asn1Spec=module.Message())
+    except Exception:
+        return None, None, message
+    pdu = module.apiMessage.getPDU(decoded)
+    request_id = int(module.apiPDU.getRequestID(pdu))
+    community = str(module.apiMessage.getCommunity(decoded))
+    module.apiPDU.setRequestID(pdu, 0)
+    module.apiMessage.setCommunity(decoded, "")
+    return request_id, community, encoder.encode(decoded)
+
+
+def join_snmp_message(message, request_id, community):
+    """Put request-id and community back into the message split before."""
+    if request_id is None:
+        return message
+    module = api.protoModules[int(api.decodeMessageVersion(message))]
+    decoded, _ = decoder.decode(message, asn1Spec=module.Message())
+    module.apiPDU.setRequestID(module.apiMessage.getPDU(decoded), request_id)
+    module.apiMessage.setCommunity(decoded, community)
+    return encoder.encode(decoded)
+
+
+def get_secrets(secrets, session):
+    """Return secrets and the password of the session, the longest first."""
+    secrets = set(secrets) | {getattr(session, "password", None)}
+    return sorted(
+        (secret for secret in secrets if secret and isinstance(secret, str)),
+        key=len,
+        reverse=True,
+    )
+
+
+class CapturedSnmp(Snmp):
+    """Snmp which sends the traffic of its engines through the session capture."""
+
+    DOMAINS = (udp.domainName, udp6.domainName)
+
+    def __init__(
+        self,
+        capture,
+        resource_name,
+        timeout=SNMP_TIMEOUT,
+        retry_count=SNMP_RETRIES_COUNT,
+    ):
+        super(CapturedSnmp, self).__init__(timeout=timeout, retry_count=retry_count)
+        self._capture = capture
+        self._resource_name = resource_name
+
+    def _get_snmp_engine(self, pysnmp_params, logger):
+        snmp_engine = super(CapturedSnmp, self)._get_snmp_engine(pysnmp_params, logger)
+        dispatcher = snmp_engine.transportDispatcher
+        for domain in self.DOMAINS:
+            transport = config.getTransport(snmp_engine, domain)
+            if transport is None:
+                continue
+            dispatcher.unregisterTransport(domain)
+            transport.closeTransport()
+            dispatcher.registerTransport(
+                domain, self._capture.create_snmp_transport(domain, self._resource_name)
+            )
+        return snmp_engine
+
+
+class _RecordingTransportMixin(object):
+    def __init__(self, recorder, stream, sock=None, sockMap=None):
+        self._recorder = recorder
+        self._stream = stream
+        super(_RecordingTransportMixin, self).__init__(sock, sockMap)
+
+    def sendMessage(self, outgoingMessage, transportAddress):
+        self._recorder.record_snmp(self._stream, SNMP_REQUEST, outgoingMessage)
+        super(_RecordingTransportMixin, self).sendMessage(
+            outgoingMessage, transportAddress
+        )
+
+    def registerCbFun(self, cbFun):
+        def record_response(transport, transport_address, incoming_message):
+            self._recorder.record_snmp(self._stream, SNMP_RESPONSE, incoming_message)
+            return cbFun(transport, transport_address, incoming_message)
+
+        super(_RecordingTransportMixin, self).registerCbFun(record_response)
+
+
+class RecordingUdpTransport(_RecordingTransportMixin, udp.UdpSocketTransport):
+    pass
+
+
+class RecordingUdp6Transport(_RecordingTransportMixin, udp6.Udp6SocketTransport):
+    pass
+
+
+class _ReplayTransportMixin(object):
+    """Transport answering requests with the recorded responses.
+
+    Responses are sent from a timer to the own loopback socket, so the
+    dispatcher receives them like the ones of the device.
+    """
+
+    LOOPBACK = None
+
+    def __init__(self, replay, stream, sock=None, sockMap=None):
+        self._replay = replay
+        self._stream = stream
+        self._peer = None
+        super(_ReplayTransportMixin, self).__init__(sock, sockMap)
+
+    def openClientMode(self, iface=None):
+        return super(_ReplayTransportMixin, self).openClientMode((self.LOOPBACK, 0))
+
+    def sendMessage(self, outgoingMessage, transportAddress):
+        self._peer = transportAddress
+        response, delay = self._replay.answer_snmp(self._stream, outgoingMessage)
+        if response is None:
+            return
+        timer = threading.Timer(delay, self._deliver, (response,))
+        timer.daemon = True
+        timer.start()
+
+    def registerCbFun(self, cbFun):
+        def restore_address(transport, transport_address, incoming_message):
+            return cbFun(transport, self.normalizeAddress(self._peer), incoming_message)
+
+        super(_ReplayTransportMixin, self).registerCbFun(restore_address)
+
+    def _deliver(self, response):
+        try:
+            self.socket.sendto(response, self.socket.getsockname())
+        except (AttributeError, OSError):
+            logger.debug("Replay transport is closed, response dropped")
+
+
+class ReplayUdpTransport(_ReplayTransportMixin, udp.UdpSocketTransport):
+    LOOPBACK = "127.0.0.1"
+
+
+class ReplayUdp6Transport(_ReplayTransportMixin, udp6.Udp6SocketTransport):
+    LOOPBACK = "::1"
+
+
+class _CliSessionRecording(object):
+    """Recording of the CLI session with the secrets redacted.
+
+    Received data ending with the start of a secret is held back until the
+    next read, so a secret split between two reads is redacted as well.
+    """
+
+    def __init__(self, recorder, resource_name, session, secrets):
+        self._recorder = recorder
+        self._resource_name = resource_name
+        self._session = session
+        self._secrets = secrets
+        self._stream = None
+        self._pending = ""
+        self._initialize_session = session._initialize_session
+        self._send = session._send
+        self._receive = session._receive
+
+    def attach(self):
+        self._session._initialize_session = self.initialize_session
+        self._session._send = self.send
+        self._session._receive = self.receive
+        return self._session
+
+    def initialize_session(self, prompt, logger):
+        self._stream = self._recorder.open_cli_stream(self._resource_name)
+        self._recorder.record(self._stream, OPEN, self._session.session_type)
+        try:
+            self._initialize_session(prompt, logger)
+        except Exception as e:
+            self._recorder.record(self._stream, ERROR, redact(str(e), self._secrets))
+            raise
+
+    def send(self, command, logger):
+        self._flush()
+        if command.strip() in self._secrets:
+            data = REDACTED
+        else:
+            data = redact(command, self._secrets)
+        self._recorder.record(self._stream, SEND, data)
+        return self._send(command, logger)
+
+    def receive(self, timeout, logger):
+        try:
+            data = self._receive(timeout, logger)
+        except Exception:
+            self._flush()
+            raise
+        pending = redact(self._pending + data, self._secrets)
+        split = len(pending) - self._partial_secret_length(pending)
+        if split:
+            self._recorder.record(self._stream, RECEIVE, pending[:split])
+        self._pending = pending[split:]
+        return data
+
+    def _flush(self):
+        if self._pending:
+            self._recorder.record(self._stream, RECEIVE, self._pending)
+            self._pending = ""
+
+    def _partial_secret_length(self, data):
+        """Return length of the end of the data which starts a secret."""
+        longest = max((len(secret) for secret in self._secrets), default=1)
+        for length in range(min(len(data), longest - 1), 0, -1):
+            if any(secret.startswith(data[-length:]) for secret in self._secrets):
+                return length
+        return 0
+
+
+class SessionRecorder(object):
+    """Record CLI and SNMP traffic of the driver to a capture file.
+
+    The capture is a gzip file of JSON lines, a header followed by events
+    [timestamp, stream, kind, data]. Every CLI session is a stream of its
+    own, SNMP traffic is a stream per resource. The secrets of the resource
+    are replaced in the sent and received CLI data, credentials of urls are
+    dropped and SNMP communities are not recorded. SNMPv3 messages are
+    recorded encrypted.
+    """
+
+    FLUSH_INTERVAL = 1
+
+    SNMP_TRANSPORTS = {
+        udp.domainName: RecordingUdpTransport,
+        udp6.domainName: RecordingUdp6Transport,
+    }
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._flushed = 0
+        self._cli_streams = defaultdict(int)
+
+    def wrap_cli_session(self, resource_name, session, secrets=()):
+        """Record the traffic of the CLI session before it connects.
+
+        :param list[str] secrets: passwords, communities and keys to redact
+        """
+        secrets = get_secrets(secrets, session)
+        return _CliSessionRecording(self, resource_name, session, secrets).attach()
+
+    def snmp(self, resource_name, timeout=SNMP_TIMEOUT, retry_count=SNMP_RETRIES_COUNT):
+        return CapturedSnmp(self, resource_name, timeout, retry_count)
+
+    def create_snmp_transport(self, domain, resource_name):
+        transport = self.SNMP_TRANSPORTS[domain](self, "snmp/{}".format(resource_name))
+        return transport.openClientMode()
+
+    def open_cli_stream(self, resource_name):
+        with self._lock:
+            index = self._cli_streams[resource_name]
+            self._cli_streams[resource_name] += 1
+        return "cli/{}/{}".format(resource_name, index)
+
+    def record_snmp(self, stream, kind, message):
+        request_id, _, message = split_snmp_message(message)
+        self.record(
+            stream,
+            kind,
+            {"id": request_id, "pdu": base64.b64encode(message).decode("ascii")},
+        )
+
+    def record(self, stream, kind, data):
+        line = json.dumps([round(time.time(), 6), stream, kind, data])
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(line.encode("utf-8") + b"\n")
+            if time.time() - self._flushed >= self.FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed = time.time()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        new_file = not os.path.exists(self._path) or not os.path.getsize(self._path)
+        self._file = gzip.open(self._path, "ab")
+        if new_file:
+            header = {
+                "format": CAPTURE_FORMAT,
+                "version": CAPTURE_VERSION,
+                "started": time.time(),
+            }
+            self._file.write(json.dumps(header).encode("utf-8") + b"\n")
+
+
+class _CliReplayStream(object):
+    def __init__(self, session_type, opened_at):
+        self.session_type = session_type
+        self.events = deque()
+        self.replayed_at = None
+        self.recorded_at = opened_at
+
+    def take(self, event):
+        self.events.popleft()
+        self.replayed_at = time.time()
+        self.recorded_at = event[0]
+        return event
+
+
+class _CliSessionReplay(object):
+    def __init__(self, replay, resource_name, session, secrets):
+        self._replay = replay
+        self._resource_name = resource_name
+        self._session = session
+        self._secrets = secrets
+        self._stream = None
+
+    def attach(self):
+        self._session._initialize_session = self.initialize_session
+        self._session._send = self.send
+        self._session._receive = self.receive
+        return self._session
+
+    def initialize_session(self, prompt, logger):
+        self._stream = self._replay.next_cli_stream(
+            self._resource_name, self._session.session_type
+        )
+        if self._stream is None:
+            raise ExpectedSessionException(
+                self.__class__.__name__,
+                "No recorded {} session of {} left to replay".format(
+                    self._session.session_type, self._resource_name
+                ),
+            )
+        self._stream.replayed_at = time.time()
+        event = self._stream.events[0] if self._stream.events else None
+        if event and event[2] == ERROR:
+            self._stream.take(event)
+            raise ExpectedSessionException(self.__class__.__name__, event[3])
+
+    def send(self, command, logger):
+        event = self._stream.events[0] if self._stream.events else None
+        if not event or event[2] != SEND:
+            raise ExpectedSessionException(
+                self.__class__.__name__,
+                "Replay diverged, unexpected command {!r}".format(command),
+            )
+        if event[3] not in (REDACTED, command, redact(command, self._secrets)):
+            raise ExpectedSessionException(
+                self.__class__.__name__,
+                "Replay diverged, expected command {!r}, got {!r}".format(
+                    event[3], command
+                ),
+            )
+        self._stream.take(event)
+
+    def receive(self, timeout, logger):
+        event = self._stream.events[0] if self._stream.events else None
+        if not event or event[2] != RECEIVE:
+            self._replay.sleep(timeout)
+            raise SessionReadTimeout()
+
+        wait = self._replay.delay(event[0] - self._stream.recorded_at) - (
+            time.time() - self._stream.replayed_at
+        )
+        if wait > timeout:
+            time.sleep(timeout)
+            raise SessionReadTimeout()
+        time.sleep(max(wait, 0))
+        return self._stream.take(event)[3]
+
+
+class SessionReplay(object):
+    """Feed the driver with CLI and SNMP traffic of a capture file.
+
+    CLI sessions get the recorded streams of the resource in the recorded
+    order and fail when the driver sends a command which differs from the
+    recorded one. SNMP requests are matched by content, ignoring request-id
+    and community. Delays between the events are replayed divided by speed,
+    speed 0 replays without delays. SNMPv3 traffic can't be matched.
+    """
+
+    SNMP_TRANSPORTS = {
+        udp.domainName: ReplayUdpTransport,
+        udp6.domainName: ReplayUdp6Transport,
+    }
+
+    def __init__(self, path, speed=1.0):
+        self._speed = speed
+        self._lock = threading.Lock()
+        self._cli_streams = defaultdict(list)
+        self._snmp_responses = defaultdict(lambda: defaultdict(deque))
+        self._load(path)
+
+    def wrap_cli_session(self, resource_name, session, secrets=()):
+        """Replace the connection of the CLI session with the recorded stream."""
+        secrets = get_secrets(secrets, session)
+        return _CliSessionReplay(self, resource_name, session, secrets).attach()
+
+    def snmp(self, resource_name, timeout=SNMP_TIMEOUT, retry_count=SNMP_RETRIES_COUNT):
+        return CapturedSnmp(self, resource_name, timeout, retry_count)
+
+    def create_snmp_transport(self, domain, resource_name):
+        transport = self.SNMP_TRANSPORTS[domain](self, "snmp/{}".format(resource_name))
+        return transport.openClientMode()
+
+    def next_cli_stream(self, resource_name, session_type):
+        with self._lock:
+            streams = self._cli_streams.get(resource_name, [])
+            for index, stream in enumerate(streams):
+                if stream.session_type == session_type:
+                    return streams.pop(index)
+
+    def answer_snmp(self, stream, message):
+        """Return the recorded response to the request and its delay.
+
+        :rtype: tuple[bytes|None, float]
+        """
+        request_id, community, request = split_snmp_message(message)
+        key = base64.b64encode(request).decode("ascii")
+        with self._lock:
+            responses = self._snmp_responses[stream].get(key)
+            if not responses:
+                logger.debug(
+                    "No recorded response for SNMP request of {}".format(stream)
+                )
+                return None, 0
+            response, delay = responses.popleft()
+        if response is None:
+            return None, 0
+        response = join_snmp_message(base64.b64decode(response), request_id, community)
+        return response, self.delay(delay)
+
+    def delay(self, seconds):
+        return seconds / self._speed if self._speed and self._speed > 0 else 0
+
+    def sleep(self, seconds):
+        time.sleep(self.delay(seconds))
+
+    def close(self):
+        pass
+
+    def _load(self, path):
+        cli_streams = OrderedDict()
+        pending_requests = defaultdict(dict)
+        for timestamp, stream, kind, data in read_capture(path):
+            if kind == OPEN:
+                cli_streams[stream] = _CliReplayStream(data, timestamp)
+            elif kind in (ERROR, SEND, RECEIVE) and stream in cli_streams:
+                cli_streams[stream].events.append([timestamp, stream, kind, data])
+            elif kind == SNMP_REQUEST:
+                # requests left without a response time out in the replay as well
+                entry = [None, timestamp]
+                self._snmp_responses[stream][data["pdu"]].append(entry)
+                pending_requests[stream][data["id"]] = entry
+            elif kind == SNMP_RESPONSE:
+                entry = pending_requests[stream].pop(data["id"], None)
+                if entry is not None:
+                    entry[:] = [data["pdu"], timestamp - entry[1]]
+
+        for stream, cli_stream in cli_streams.items():
+            resource_name = stream.split("/", 1)[1].rsplit("/", 1)[0]
+            self._cli_streams[resource_name].append(cli_stream)
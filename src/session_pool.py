@@ -0,0 +1,255 @@
+import hashlib
+import logging
+import time
+from functools import partial
+from threading import Lock
+
+from cloudshell.cli.service.cli import CLI
+from cloudshell.cli.service.session_manager_impl import SessionManagerImpl
+from cloudshell.cli.service.session_pool_manager import SessionPoolManager
+from cloudshell.networking.cisco.cisco_constants import DEFAULT_SESSION_POOL_TIMEOUT
+from cloudshell.networking.cisco.nxos.cli.cisco_nxos_cli_handler import CiscoNXOSCli
+from cloudshell.shell.standards import attribute_names
+
+from metrics import timed_phase
+
+CONNECTION_ATTRIBUTES = (
+    attribute_names.USER,
+    attribute_names.PASSWORD,
+    attribute_names.ENABLE_PASSWORD,
+    attribute_names.CLI_CONNECTION_TYPE,
+    attribute_names.CLI_TCP_PORT,
+    attribute_names.SESSION_CONCURRENCY_LIMIT,
+    attribute_names.CONSOLE_SERVER_IP_ADDRESS,
+    attribute_names.CONSOLE_USER,
+    attribute_names.CONSOLE_PORT,
+    attribute_names.CONSOLE_PASSWORD,
+)
+
+SECRET_ATTRIBUTES = (
+    attribute_names.PASSWORD,
+    attribute_names.ENABLE_PASSWORD,
+    attribute_names.CONSOLE_PASSWORD,
+    attribute_names.BACKUP_PASSWORD,
+    attribute_names.SNMP_READ_COMMUNITY,
+    attribute_names.SNMP_WRITE_COMMUNITY,
+    attribute_names.SNMP_V3_PASSWORD,
+    attribute_names.SNMP_V3_PRIVATE_KEY,
+)
+
+
+def connection_fingerprint(resource_config, names=CONNECTION_ATTRIBUTES) -> str:
+    """Return a digest of the attributes used to open CLI sessions."""
+    attributes = sorted(
+        (name, value)
+        for name, value in resource_config.attributes.items()
+        if name.rsplit(".", 1)[-1] in names
+    )
+    data = repr((resource_config.address, attributes))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def get_resource_secrets(resource_config):
+    """Return decrypted passwords, SNMP communities and keys of the resource."""
+    secrets = []
+    for name in SECRET_ATTRIBUTES:
+        value = getattr(resource_config, name.lower().replace(" ", "_"), None)
+        if value and isinstance(value, str):
+            secrets.append(value)
+    return secrets
+
+
+class IdleTimeoutSessionPoolManager(SessionPoolManager):
+    """Session pool which keeps authenticated sessions warm between commands.
+
+    Sessions idle longer than idle_timeout are disconnected, sessions idle
+    longer than health_check_interval are probed for the prompt before reuse.
+    New sessions are passed through session_wrapper before they connect.
+    """
+
+    IDLE_TIMEOUT = 600
+    HEALTH_CHECK_INTERVAL = 60
+
+    def __init__(
+        self,
+        max_pool_size=SessionPoolManager.MAX_POOL_SIZE,
+        pool_timeout=SessionPoolManager.POOL_TIMEOUT,
+        idle_timeout=IDLE_TIMEOUT,
+        health_check_interval=HEALTH_CHECK_INTERVAL,
+        session_wrapper=None,
+    ):
+        # every pool needs its own manager, the parent default is shared
+        super(IdleTimeoutSessionPoolManager, self).__init__(
+            session_manager=SessionManagerImpl(),
+            max_pool_size=max_pool_size,
+            pool_timeout=pool_timeout,
+        )
+        self._idle_timeout = idle_timeout
+        self._health_check_interval = health_check_interval
+        self._session_wrapper = session_wrapper
+
+    def get_session(self, defined_sessions, prompt, logger):
+        self.evict_idle_sessions(logger)
+        return super(IdleTimeoutSessionPoolManager, self).get_session(
+            defined_sessions, prompt, logger
+        )
+
+    def return_session(self, session, logger):
+        session.last_used = time.time()
+        super(IdleTimeoutSessionPoolManager, self).return_session(session, logger)
+
+    def evict_idle_sessions(self, logger):
+        """Disconnect pooled sessions which were idle longer than idle timeout."""
+        with self._session_condition:
+            sessions = []
+            while not self._pool.empty():
+                sessions.append(self._pool.get(False))
+            for session in sessions:
+                if self._idle_time(session) >= self._idle_timeout:
+                    logger.debug("Session idle timeout expired")
+                    self._drop_session(session, logger)
+                else:
+                    self._pool.put(session)
+
+    def close(self, logger):
+        """Disconnect all pooled sessions."""
+        with self._session_condition:
+            while not self._pool.empty():
+                self._drop_session(self._pool.get(False), logger)
+
+    def _get_from_pool(self, new_sessions, prompt, logger):
+        session = super(IdleTimeoutSessionPoolManager, self)._get_from_pool(
+            new_sessions, prompt, logger
+        )
+        if session.new_session or self._is_healthy(session, prompt, logger):
+            return session
+
+        logger.debug("Pooled session failed health check, creating new session")
+        self._drop_session(session, logger)
+        return self._new_session(new_sessions, prompt, logger)
+
+    def _is_healthy(self, session, prompt, logger):
+        if not session.active():
+            return False
+        if self._idle_time(session) < self._health_check_interval:
+            return True
+        try:
+            session.probe_for_prompt(prompt, logger)
+        except Exception as e:
+            logger.debug(e)
+            return False
+        return True
+
+    def _new_session(self, new_sessions, prompt, logger):
+        if self._session_wrapper:
+            if not isinstance(new_sessions, list):
+                new_sessions = [new_sessions]
+            new_sessions = [self._session_wrapper(session) for session in new_sessions]
+        with timed_phase("cli_connect"):
+            return super(IdleTimeoutSessionPoolManager, self)._new_session(
+                new_sessions, prompt, logger
+            )
+
+    def _drop_session(self, session, logger):
+        try:
+            session.disconnect()
+        except Exception as e:
+            logger.debug(e)
+        self.remove_session(session, logger)
+
+    @staticmethod
+    def _idle_time(session):
+        return time.time() - getattr(session, "last_used", time.time())
+
+
+class PooledCiscoNXOSCli(CiscoNXOSCli):
+    def __init__(
+        self,
+        resource_config,
+        pool_timeout=DEFAULT_SESSION_POOL_TIMEOUT,
+        idle_timeout=IdleTimeoutSessionPoolManager.IDLE_TIMEOUT,
+        session_capture=None,
+        cli_latency=None,
+    ):
+        self._session_wrappers = []
+        if session_capture:
+            self._session_wrappers.append(
+                partial(
+                    session_capture.wrap_cli_session,
+                    resource_config.name,
+                    secrets=get_resource_secrets(resource_config),
+                )
+            )
+        if cli_latency:
+            self._session_wrappers.append(cli_latency.tune_session)
+        self.session_pool = IdleTimeoutSessionPoolManager(
+            max_pool_size=int(resource_config.sessions_concurrency_limit or 1),
+            pool_timeout=pool_timeout,
+            idle_timeout=idle_timeout,
+            session_wrapper=self._wrap_session if self._session_wrappers else None,
+        )
+        self.cli = CLI(session_pool=self.session_pool)
+
+    def close(self, logger):
+        self.session_pool.close(logger)
+
+    def _wrap_session(self, session):
+        for session_wrapper in self._session_wrappers:
+            session = session_wrapper(session)
+        return session
+
+
+class SessionPoolRegistry(object):
+    """Per-resource CLI session pools owned by the driver instance.
+
+    A pool is rebuilt when credentials, "CLI Connection Type" or
+    "Sessions Concurrency Limit" of the resource change. With session_capture
+    the sessions are recorded or replayed, see session_capture module. With
+    cli_latencies the session timeouts adapt to the latency of the resource,
+    see cli_latency module.
+    """
+
+    def __init__(
+        self, cli_class=PooledCiscoNXOSCli, session_capture=None, cli_latencies=None
+    ):
+        self._cli_class = cli_class
+        self._session_capture = session_capture
+        self._cli_latencies = cli_latencies
+        self._lock = Lock()
+        self._clis = {}
+
+    def get_cli(self, resource_config, logger=None) -> CiscoNXOSCli:
+        logger = logger or logging.getLogger(__name__)
+        fingerprint = connection_fingerprint(resource_config)
+        if self._session_capture:
+            # the secrets redacted from the capture are taken when pool is built
+            fingerprint += connection_fingerprint(resource_config, SECRET_ATTRIBUTES)
+        with self._lock:
+            cached = self._clis.get(resource_config.name)
+            if cached and cached[0] == fingerprint:
+                return cached[1]
+            if cached:
+                logger.info("Connection attributes changed, rebuilding session pool")
+                cached[1].close(logger)
+            cli_kwargs = {}
+            if self._session_capture:
+                cli_kwargs["session_capture"] = self._session_capture
+            if self._cli_latencies:
+                cli_kwargs["cli_latency"] = self._cli_latencies.get(
+                    resource_config.name
+                )
+            cli = self._cli_class(resource_config, **cli_kwargs)
+            self._clis[resource_config.name] = (fingerprint, cli)
+            return cli
+
+    def get_cli_handler(self, resource_config, logger):
+        return self.get_cli(resource_config, logger).get_cli_handler(
+            resource_config, logger
+        )
+
+    def close(self, logger=None):
+        logger = logger or logging.getLogger(__name__)
+        with self._lock:
+            for _, cli in self._clis.values():
+                cli.close(logger)
+            self._clis.clear()
@@ -0,0 +1,427 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from cloudshell.networking.cisco.flows.cisco_autoload_flow import CiscoSnmpAutoloadFlow
+from cloudshell.snmp.autoload.constants import entity_constants, port_constants
+from cloudshell.snmp.core.domain.snmp_oid import SnmpMibObject, SnmpRawOid
+from cloudshell.snmp.core.domain.snmp_response import SnmpResponse
+from cloudshell.snmp.core.snmp_response_reader import SnmpResponseReader
+from cloudshell.snmp.core.snmp_service import SnmpService
+from pyasn1.type import univ
+
+# Independent MIB tables read by the autoload, grouped by MIB for timing reports
+AUTOLOAD_TABLES = OrderedDict(
+    [
+        (
+            "ENTITY-MIB",
+            [
+                entity_constants.ENTITY_POSITION.get_snmp_mib_oid(),
+                entity_constants.ENTITY_DESCRIPTION.get_snmp_mib_oid(),
+                entity_constants.ENTITY_NAME.get_snmp_mib_oid(),
+                entity_constants.ENTITY_PARENT_ID.get_snmp_mib_oid(),
+                entity_constants.ENTITY_CLASS.get_snmp_mib_oid(),
+                entity_constants.ENTITY_VENDOR_TYPE.get_snmp_mib_oid(),
+                entity_constants.ENTITY_MODEL.get_snmp_mib_oid(),
+                entity_constants.ENTITY_SERIAL.get_snmp_mib_oid(),
+                entity_constants.ENTITY_OS_VERSION.get_snmp_mib_oid(),
+                entity_constants.ENTITY_HW_VERSION.get_snmp_mib_oid(),
+                entity_constants.ENTITY_TO_IF_ID,
+            ],
+        ),
+        (
+            "IF-MIB",
+            [
+                port_constants.PORT_DESCR_NAME.get_snmp_mib_oid(),
+                port_constants.PORT_NAME.get_snmp_mib_oid(),
+                port_constants.PORT_DESCRIPTION.get_snmp_mib_oid(),
+                port_constants.PORT_TYPE.get_snmp_mib_oid(),
+                port_constants.PORT_MTU.get_snmp_mib_oid(),
+                port_constants.PORT_SPEED.get_snmp_mib_oid(),
+                port_constants.PORT_MAC.get_snmp_mib_oid(),
+                port_constants.PORT_AUTO_NEG.get_snmp_mib_oid(),
+                SnmpMibObject("EtherLike-MIB", "dot3StatsIndex"),
+                SnmpMibObject("EtherLike-MIB", "dot3StatsDuplexStatus"),
+                SnmpMibObject("IEEE8023-LAG-MIB", "dot3adAggPortAttachedAggID"),
+                SnmpMibObject("CISCO-STACK-MIB", "portIfIndex"),
+            ],
+        ),
+        (
+            "IP-MIB",
+            [
+                SnmpMibObject("IP-MIB", "ipAdEntIfIndex"),
+                SnmpMibObject("IP-MIB", "ipAddressIfIndex"),
+                SnmpMibObject("IPV6-MIB", "ipv6AddrType"),
+            ],
+        ),
+        (
+            "LLDP/CDP",
+            [
+                port_constants.PORT_ADJACENT_REM_TABLE,
+                port_constants.PORT_ADJACENT_LOC_TABLE,
+                port_constants.PORT_ADJACENT_REM_PORT_DESCR.get_snmp_mib_oid(),
+                SnmpMibObject("CISCO-CDP-MIB", "cdpCacheDeviceId"),
+            ],
+        ),
+    ]
+)
+
+# Groups without a change marker of their own, always re-walked
+UNMARKED_GROUPS = ["IP-MIB", "LLDP/CDP"]
+
+CHANGE_MARKERS = OrderedDict(
+    [
+        ("sysUpTime", SnmpMibObject("SNMPv2-MIB", "sysUpTime", "0")),
+        ("ifTableLastChange", SnmpMibObject("IF-MIB", "ifTableLastChange", "0")),
+        ("entLastChangeTime", SnmpMibObject("ENTITY-MIB", "entLastChangeTime", "0")),
+    ]
+)
+
+# Identity of the device, read together with the change markers
+SYS_OBJECT_ID = SnmpMibObject("SNMPv2-MIB", "sysObjectID", "0")
+ENTITY_CLASS_OID = "1.3.6.1.2.1.47.1.1.1.1.5"
+ENTITY_SERIAL_OID = "1.3.6.1.2.1.47.1.1.1.1.11"
+CHASSIS_CLASS = 3
+
+
+def get_varbind(response):
+    """Return oid and raw value of SnmpResponse or of an (oid, value) pair."""
+    if isinstance(response, tuple):
+        return str(response[0]), response[1]
+    return str(response._raw_oid), response.raw_value
+
+
+class TimedSnmpResponseReader(SnmpResponseReader):
+    """Response reader which remembers when the last walk response arrived."""
+
+    def __init__(self, *args, **kwargs):
+        super(TimedSnmpResponseReader, self).__init__(*args, **kwargs)
+        self.started = time.time()
+        self.finished = self.started
+
+    def cb_walk_fun(self, *args, **kwargs):
+        self.finished = time.time()
+        return super(TimedSnmpResponseReader, self).cb_walk_fun(*args, **kwargs)
+
+
+class BulkWalkSnmpService(SnmpService):
+    """SNMP service answering autoload requests from prefetched tables.
+
+    All tables are requested at once with GETBULK (GETNEXT for SNMP v1) and
+    collected in a single dispatcher run, so the walks run concurrently.
+    Walks and per-index gets which fall into a prefetched table are served
+    from memory instead of a round-trip to the device.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(BulkWalkSnmpService, self).__init__(*args, **kwargs)
+        self._tables = {}
+        self._values = {}
+        self.tables = {}
+        self.table_timings = OrderedDict()
+
+    @classmethod
+    def from_service(cls, snmp_service):
+        """Create bulk walk service sharing the engine of the snmp_service."""
+        return cls(
+            snmp_engine=snmp_service._snmp_engine,
+            context_id=snmp_service._context_id,
+            context_name=snmp_service._context_name,
+            logger=snmp_service._logger,
+            retries=snmp_service._retries,
+            get_bulk_flag=snmp_service._get_bulk_flag,
+            is_snmp_read_only=snmp_service._is_snmp_read_only,
+        )
+
+    def prefetch(
+        self,
+        tables=AUTOLOAD_TABLES,
+        get_bulk_repetitions=SnmpService.DEFAULT_GET_BULK_REPETITIONS,
+        retry_count=SnmpService.WALK_RETRY_COUNT,
+    ):
+        """Walk all tables concurrently and keep the responses.
+
+        :param collections.OrderedDict tables: MIB group name to list of oids
+        :param int get_bulk_repetitions: GETBULK max-repetitions
+        :param int retry_count: retries for every table walk
+        """
+        readers = OrderedDict()
+        for group, snmp_oid_objs in tables.items():
+            for snmp_oid_obj in snmp_oid_objs:
+                try:
+                    start_oid = univ.ObjectIdentifier(
+                        snmp_oid_obj.get_oid(self._snmp_engine)
+                    )
+                except Exception:
+                    self._logger.debug(
+                        "Skipping prefetch of unresolved oid", exc_info=True
+                    )
+                    continue
+                readers[str(start_oid)] = (
+                    group,
+                    self._send_prefetch(start_oid, get_bulk_repetitions, retry_count),
+                )
+
+        start_time = time.time()
+        self._start_dispatcher()
+
+        for oid, (group, reader) in readers.items():
+            if reader.cb_ctx.get("is_snmp_timeout") and not reader.result:
+                self._logger.debug("Prefetch of {} timed out".format(oid))
+                continue
+            self._add_table(group, oid, reader.result)
+            group_timing = self.table_timings.setdefault(
+                group, {"seconds": 0.0, "entries": 0}
+            )
+            group_timing["seconds"] = max(
+                group_timing["seconds"], reader.finished - start_time
+            )
+            group_timing["entries"] += len(reader.result)
+
+        for group, timing in self.table_timings.items():
+            self._logger.info(
+                "SNMP {} tables walked in {:.3f} sec, {} entries".format(
+                    group, timing["seconds"], timing["entries"]
+                )
+            )
+
+    def reuse_tables(self, tables):
+        """Serve tables prefetched by a previous discovery.
+
+        Responses restored from a snapshot as (oid, value) pairs are bound to
+        the engine of this service.
+
+        :param dict tables: MIB group name to dict of table oid and responses
+        """
+        for group, group_tables in tables.items():
+            for oid, responses in group_tables.items():
+                self._add_table(
+                    group, oid, [self._bind_response(item) for item in responses]
+                )
+
+    def get_change_markers(self, serial_oid=None):
+        """Read sysUpTime, last change times of the autoload tables and identity.
+
+        sysObjectID and the chassis serial number at serial_oid are read in
+        the same request to recognize a replaced device.
+
+        :param str serial_oid: oid of the chassis entPhysicalSerialNum
+        :return: marker name to TimeTicks value or identity string, None if
+            it can't be read
+        :rtype: dict
+        """
+        markers = dict.fromkeys(CHANGE_MARKERS)
+        markers["sysObjectID"] = None
+        snmp_oids = list(CHANGE_MARKERS.values()) + [SYS_OBJECT_ID]
+        if serial_oid:
+            markers["entPhysicalSerialNum"] = None
+            snmp_oids.append(SnmpRawOid(serial_oid))
+        try:
+            responses = self.get_list(snmp_oids)
+        except Exception:
+            self._logger.debug("Failed to read change markers", exc_info=True)
+            return markers
+
+        for response in responses:
+            if response.mib_id not in markers:
+                continue
+            if response.mib_id not in CHANGE_MARKERS:
+                markers[response.mib_id] = str(response.raw_value)
+                continue
+            try:
+                markers[response.mib_id] = int(response.safe_value)
+            except ValueError:
+                pass
+        return markers
+
+    def get(self, snmp_oid):
+        oid = str(snmp_oid.get_oid(self._snmp_engine))
+        if self._is_prefetched(oid):
+            return self._values.get(oid)
+        return super(BulkWalkSnmpService, self).get(snmp_oid)
+
+    def _walk(self, snmp_oid_obj, stop_oid=None, get_subtree=True, **kwargs):
+        if get_subtree and not stop_oid:
+            table = self._tables.get(str(snmp_oid_obj.get_oid(self._snmp_engine)))
+            if table is not None:
+                return table
+        return super(BulkWalkSnmpService, self)._walk(
+            snmp_oid_obj, stop_oid=stop_oid, get_subtree=get_subtree, **kwargs
+        )
+
+    def _add_table(self, group, oid, responses):
+        self._tables[oid] = responses
+        self.tables.setdefault(group, {})[oid] = responses
+        for response in responses:
+            self._values[str(response._raw_oid)] = response
+
+    def _bind_response(self, response):
+        if isinstance(response, tuple):
+            return SnmpResponse(
+                response[0], response[1], self._snmp_engine, self._logger
+            )
+        return response
+
+    def _is_prefetched(self, oid):
+        return any(oid.startswith(table + ".") for table in self._tables)
+
+    def _send_prefetch(self, start_oid, get_bulk_repetitions, retry_count):
+        stop_oid = univ.ObjectIdentifier(
+            tuple(start_oid)[:-1] + (tuple(start_oid)[-1] + 1,)
+        )
+        reader = TimedSnmpResponseReader(
+            snmp_engine=self._snmp_engine,
+            logger=self._logger,
+            cb_ctx={
+                "total": 0,
+                "count": 0,
+                "errors": 0,
+                "is_snmp_timeout": False,
+                "iteration": 0,
+                "reqTime": time.time(),
+                "": True,
+                "retries": retry_count,
+                "lastOID": start_oid,
+            },
+            context_id=self._context_id,
+            context_name=self._context_name,
+            get_bulk_flag=self._get_bulk_flag,
+            get_bulk_repetitions=get_bulk_repetitions,
+            retry_count=retry_count,
+        )
+        if self._get_bulk_flag:
+            reader.send_bulk_var_binds(start_oid, stop_oid)
+        else:
+            reader.send_walk_var_binds(start_oid, stop_oid)
+        return reader
+
+
+class AutoloadState(object):
+    """Result of the last discovery of a resource and the markers it was read at.
+
+    sysUpTime detects a reboot, ifTableLastChange and entLastChangeTime detect
+    changes of the interface and physical entity tables since the discovery.
+    Address and neighbor tables change without touching these markers and are
+    re-walked on every discovery.
+    """
+
+    def __init__(self, markers, details, tables):
+        """Autoload state.
+
+        :param dict markers: change marker name to TimeTicks value
+        :param cloudshell.shell.core.driver_context.AutoLoadDetails details:
+        :param dict tables: MIB group name to prefetched tables of the group
+        """
+        self.markers = markers
+        self.details = details
+        self.tables = tables
+
+    def chassis_serial(self):
+        """Return oid and value of the chassis serial number in entity tables.
+
+        :rtype: tuple[str|None, str|None]
+        """
+        entity_tables = self.tables.get("ENTITY-MIB", {})
+        serials = dict(map(get_varbind, entity_tables.get(ENTITY_SERIAL_OID, ())))
+        for oid, value in map(get_varbind, entity_tables.get(ENTITY_CLASS_OID, ())):
+            try:
+                is_chassis = int(value) == CHASSIS_CLASS
+            except (TypeError, ValueError):
+                continue
+            serial_oid = ENTITY_SERIAL_OID + oid[len(ENTITY_CLASS_OID) :]
+            if is_chassis and serial_oid in serials:
+                return serial_oid, str(serials[serial_oid])
+        return None, None
+
+    def same_device(self, markers):
+        """Return False if sysObjectID or chassis serial number changed."""
+        if self.markers.get("sysObjectID") != markers.get("sysObjectID"):
+            return False
+        serial_oid, serial = self.chassis_serial()
+        return serial_oid is None or markers.get("entPhysicalSerialNum") == serial
+
+    def changed_groups(self, markers):
+        """Return names of MIB groups to re-walk for the current markers."""
+        if any(self.markers.get(name) is None for name in CHANGE_MARKERS) or any(
+            markers.get(name) is None for name in CHANGE_MARKERS
+        ):
+            return list(AUTOLOAD_TABLES)
+        if markers["sysUpTime"] < self.markers["sysUpTime"]:
+            return list(AUTOLOAD_TABLES)
+
+        groups = []
+        if markers["entLastChangeTime"] != self.markers["entLastChangeTime"]:
+            groups.append("ENTITY-MIB")
+        if markers["ifTableLastChange"] != self.markers["ifTableLastChange"]:
+            groups.append("IF-MIB")
+        return groups + UNMARKED_GROUPS
+
+
+class StaticSnmpHandler(object):
+    """SNMP handler yielding an already prepared SNMP service."""
+
+    def __init__(self, snmp_service):
+        self._snmp_service = snmp_service
+
+    @contextmanager
+    def get_service(self):
+        yield self._snmp_service
+
+
+class CiscoBulkSnmpAutoloadFlow(CiscoSnmpAutoloadFlow):
+    DEFAULT_GET_BULK_REPETITIONS = 50
+
+    def __init__(
+        self,
+        logger,
+        snmp_handler,
+        get_bulk_repetitions=DEFAULT_GET_BULK_REPETITIONS,
+        previous_state=None,
+    ):
+        """Autoload flow with bulk table prefetch and incremental rediscovery.
+
+        :param logging.Logger logger:
+        :param snmp_handler:
+        :param int get_bulk_repetitions: GETBULK max-repetitions
+        :param AutoloadState previous_state: state of the last discovery
+        """
+        super(CiscoBulkSnmpAutoloadFlow, self).__init__(logger, snmp_handler)
+        self._get_bulk_repetitions = get_bulk_repetitions
+        self._previous_state = previous_state
+        self.table_timings = OrderedDict()
+        self.state = None
+
+    def _autoload_flow(self, supported_os, resource_model):
+        with self._snmp_handler.get_service() as snmp_service:
+            bulk_service = BulkWalkSnmpService.from_service(snmp_service)
+            bulk_service.add_mib_folder_path(self.CISCO_MIBS_FOLDER)
+            previous_state = self._previous_state
+            markers = bulk_service.get_change_markers(
+                previous_state.chassis_serial()[0] if previous_state else None
+            )
+            if previous_state and not previous_state.same_device(markers):
+                self._logger.info("Device was replaced since the last autoload")
+                previous_state = None
+
+            groups = list(AUTOLOAD_TABLES)
+            if previous_state:
+                groups = previous_state.changed_groups(markers)
+                self._logger.info("Re-walking changed tables: {}".format(groups))
+                bulk_service.reuse_tables(
+                    {
+                        group: tables
+                        for group, tables in previous_state.tables.items()
+                        if group not in groups
+                    }
+                )
+
+            bulk_service.prefetch(
+                OrderedDict((group, AUTOLOAD_TABLES[group]) for group in groups),
+                get_bulk_repetitions=self._get_bulk_repetitions,
+            )
+            self.table_timings = bulk_service.table_timings
+            details = CiscoSnmpAutoloadFlow(
+                self._logger, StaticSnmpHandler(bulk_service)
+            )._autoload_flow(supported_os, resource_model)
+            self.state = AutoloadState(markers, details, bulk_service.tables)
+            return details
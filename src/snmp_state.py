@@ -0,0 +1,109 @@
+import hashlib
+from threading import Lock
+
+from cloudshell.snmp.autoload.constants.snmpv_v2_constants import SYS_OBJECT_ID
+from cloudshell.snmp.cloudshell_snmp import Snmp
+from cloudshell.snmp.snmp_configurator import EnableDisableSnmpFlowInterface
+
+
+def snmp_parameters_fingerprint(snmp_parameters) -> str:
+    """Return a digest of the SNMP parameters used to reach the device."""
+    data = repr(sorted(vars(snmp_parameters).items()))
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class SnmpStateRegistry(object):
+    """Last verified SNMP state of every resource handled by the driver."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._states = {}
+        self.skipped = 0
+        self.enabled = 0
+        self.disabled = 0
+
+    def get(self, key, fingerprint):
+        """Return True/False for a verified state or None if it is unknown."""
+        with self._lock:
+            state = self._states.get(key)
+            if state and state[0] == fingerprint:
+                return state[1]
+
+    def set(self, key, fingerprint, enabled):  # noqa: A003
+        with self._lock:
+            self._states[key] = (fingerprint, enabled)
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._states.clear()
+            else:
+                self._states.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "skipped": self.skipped,
+                "enabled": self.enabled,
+                "disabled": self.disabled,
+            }
+
+
+class CachedEnableDisableSnmpFlow(EnableDisableSnmpFlowInterface):
+    """Enable/Disable SNMP flow which skips the CLI when SNMP already answers.
+
+    Before enabling SNMP over the CLI the device is probed with a single
+    sysObjectID GET unless SNMP is known to be disabled by the previous run.
+    """
+
+    PROBE_TIMEOUT = 200  # pysnmp timeouts are in 1/100 s
+    PROBE_RETRY_COUNT = 0
+
+    def __init__(self, enable_disable_flow, registry, resource_name, logger, snmp=None):
+        """Cached Enable/Disable SNMP flow.
+
+        :param EnableDisableSnmpFlowInterface enable_disable_flow:
+        :param SnmpStateRegistry registry:
+        :param str resource_name:
+        :param logging.Logger logger:
+        :param cloudshell.snmp.cloudshell_snmp.Snmp snmp:
+        """
+        self._enable_disable_flow = enable_disable_flow
+        self._registry = registry
+        self._resource_name = resource_name
+        self._logger = logger
+        self._snmp = snmp or Snmp(
+            timeout=self.PROBE_TIMEOUT, retry_count=self.PROBE_RETRY_COUNT
+        )
+
+    def enable_snmp(self, snmp_parameters):
+        fingerprint = snmp_parameters_fingerprint(snmp_parameters)
+        state = self._registry.get(self._resource_name, fingerprint)
+        if state is not False and self._probe(snmp_parameters):
+            self._logger.debug("SNMP is already enabled, skipping enable SNMP flow")
+            self._registry.set(self._resource_name, fingerprint, True)
+            self._registry.count("skipped")
+            return
+
+        self._enable_disable_flow.enable_snmp(snmp_parameters)
+        self._registry.set(self._resource_name, fingerprint, True)
+        self._registry.count("enabled")
+
+    def disable_snmp(self, snmp_parameters):
+        fingerprint = snmp_parameters_fingerprint(snmp_parameters)
+        self._enable_disable_flow.disable_snmp(snmp_parameters)
+        self._registry.set(self._resource_name, fingerprint, False)
+        self._registry.count("disabled")
+
+    def _probe(self, snmp_parameters):
+        try:
+            with self._snmp.get_snmp_service(snmp_parameters, self._logger) as service:
+                response = service.get(SYS_OBJECT_ID)
+        except Exception as e:
+            self._logger.debug("SNMP probe failed: {}".format(e))
+            return False
+        return bool(response and response.safe_value)
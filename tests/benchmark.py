@@ -0,0 +1,567 @@
+import argparse
+import hashlib
+import ipaddress
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+from cloudshell.shell.core.driver_context import (
+    AutoLoadCommandContext,
+    ConnectivityContext,
+    InitCommandContext,
+    ReservationContextDetails,
+    ResourceCommandContext,
+    ResourceContextDetails,
+)
+
+import driver as driver_module
+from driver import CiscoNXOSShellDriver
+
+from tests.simulator import SimulatedDevice, TftpServer
+
+DEVICE_COUNTS = (1, 10, 100)
+FIRMWARE_IMAGE = "n7000-s2-dk9.9.3.6.bin"
+FIRMWARE_SIZE = 1024 * 1024
+RESERVATION_ID = "benchmark"
+
+logger = logging.getLogger("benchmark")
+
+
+class FakeCloudShellApi(object):
+    """CloudShell API answered from the simulated lab, no server is needed."""
+
+    def __init__(self, lab):
+        self._lab = lab
+        self.live_statuses = {}
+        self.messages = []
+
+    def DecryptPassword(self, value):
+        return SimpleNamespace(Value=value)
+
+    def GetResourceDetails(self, resource_name):
+        resource = self._lab.resource_details(self._lab.get_device(resource_name))
+        return SimpleNamespace(
+            UniqeIdentifier=resource.id,
+            Name=resource.name,
+            Address=resource.address,
+            ResourceModelName=resource.model,
+            ResourceFamilyName=resource.family,
+            Description=resource.description,
+            ResourceAttributes=[
+                SimpleNamespace(Name=name, Value=value)
+                for name, value in resource.attributes.items()
+            ],
+        )
+
+    def SetResourceLiveStatus(self, resource_name, live_status, description=""):
+        self.live_statuses[resource_name] = (live_status, description)
+
+    def WriteMessageToReservationOutput(self, reservation_id, message):
+        self.messages.append(message)
+
+
+class SimulatedLab(object):
+    """Simulated NX-OS devices and a TFTP server for configs and images.
+
+    The driver reads SNMP from the standard port, so every device gets its
+    own loopback address starting from base_address (Linux routes the whole
+    127.0.0.0/8 to loopback) and binding port 161 needs root or
+    CAP_NET_BIND_SERVICE. CLI ports are allocated dynamically.
+    """
+
+    def __init__(
+        self,
+        count,
+        protocol="telnet",
+        latency=0.0,
+        transfer_rate=None,
+        base_address="127.0.1.1",
+        snmp_port=161,
+        reload_time=1.0,
+    ):
+        first_address = ipaddress.ip_address(base_address)
+        self.devices = OrderedDict()
+        for index in range(count):
+            device = SimulatedDevice(
+                hostname="nxos-{:03d}".format(index + 1),
+                address=str(first_address + index),
+                protocol=protocol,
+                snmp_port=snmp_port,
+                latency=latency,
+                transfer_rate=transfer_rate,
+                reload_time=reload_time,
+            )
+            self.devices[device.hostname] = device
+        self.tftp = TftpServer()
+        self.api = FakeCloudShellApi(self)
+        self.firmware = b"\x7fELF" + b"\0" * (FIRMWARE_SIZE - 4)
+        self.saved = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self.tftp.start()
+        self.tftp.put_file(FIRMWARE_IMAGE, self.firmware)
+        for device in self.devices.values():
+            device.start()
+
+    def stop(self):
+        for device in self.devices.values():
+            device.stop()
+        self.tftp.stop()
+
+    @property
+    def names(self):
+        return list(self.devices)
+
+    @property
+    def firmware_url(self):
+        return self.tftp.url(FIRMWARE_IMAGE)
+
+    @property
+    def firmware_checksum(self):
+        return "md5:" + hashlib.md5(self.firmware).hexdigest()
+
+    def get_device(self, name):
+        return self.devices[name]
+
+    def resource_details(self, device):
+        prefix = CiscoNXOSShellDriver.SHELL_NAME + "."
+        attributes = {
+            "User": device.username,
+            "Password": device.password,
+            "Enable Password": device.password,
+            "CLI Connection Type": device.cli.protocol.upper(),
+            "CLI TCP Port": str(device.cli_port),
+            "Sessions Concurrency Limit": "1",
+            "SNMP Version": "v2c",
+            "SNMP Read Community": device.community,
+            "SNMP Write Community": "",
+            "Enable SNMP": "False",
+            "Disable SNMP": "False",
+            "Backup Location": self.tftp.url(device.hostname),
+            "Backup Type": "tftp",
+            "VRF Management Name": "management",
+        }
+        return ResourceContextDetails(
+            id=device.hostname,
+            name=device.hostname,
+            fullname=device.hostname,
+            type="Resource",
+            address=device.address,
+            model="Cisco NXOS Switch 2G",
+            family="CS_Switch",
+            description="",
+            attributes={prefix + name: value for name, value in attributes.items()},
+            app_context=None,
+            networks_info=None,
+            shell_standard=None,
+            shell_standard_version=None,
+        )
+
+    def connectivity(self):
+        return ConnectivityContext(
+            server_address="127.0.0.1",
+            cloudshell_api_port="8029",
+            quali_api_port="9000",
+            admin_auth_token="benchmark",
+            cloudshell_version="2023.2",
+            cloudshell_api_scheme="http",
+        )
+
+    def init_context(self, device):
+        return InitCommandContext(self.connectivity(), self.resource_details(device))
+
+    def autoload_context(self, device):
+        return AutoLoadCommandContext(
+            self.connectivity(), self.resource_details(device)
+        )
+
+    def resource_context(self, device):
+        reservation = ReservationContextDetails(
+            environment_name="benchmark",
+            environment_path="benchmark",
+            domain="Global",
+            description="",
+            owner_user="admin",
+            owner_email="",
+            reservation_id=RESERVATION_ID,
+            saved_sandbox_name="",
+            saved_sandbox_id="",
+            running_user="admin",
+            cloud_info_access_key="",
+        )
+        return ResourceCommandContext(
+            self.connectivity(), self.resource_details(device), reservation, []
+        )
+
+
+class _LoggingSessionContext(object):
+    def __init__(self, context):
+        pass
+
+    def __enter__(self):
+        return logger
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+def connectivity_request(device, vlan_id="100"):
+    port = "{}/Chassis 1/Module 1/Ethernet1-3".format(device.hostname)
+    action = {
+        "connectionId": "benchmark",
+        "connectionParams": {
+            "vlanId": vlan_id,
+            "mode": "Trunk",
+            "vlanServiceAttributes": [],
+            "type": "setVlanParameter",
+        },
+        "connectorAttributes": [],
+        "actionId": "benchmark_{}".format(device.hostname),
+        "actionTarget": {"fullName": port, "fullAddress": port},
+        "customActionAttributes": [],
+        "type": "setVlan",
+    }
+    return json.dumps({"driverRequest": {"actions": [action]}})
+
+
+def get_device_commands(lab):
+    """Return driver commands measured once per device.
+
+    Commands are run in this order, restores use the configs saved before.
+    """
+
+    def save(driver, device):
+        path = driver.save(
+            lab.resource_context(device), lab.tftp.url(""), "running", ""
+        )
+        lab.saved[device.hostname] = path
+
+    def orchestration_save(driver, device):
+        lab.saved[device.hostname, "orchestration"] = driver.orchestration_save(
+            lab.resource_context(device), "shallow", ""
+        )
+
+    def saved_path(device):
+        path = lab.saved[device.hostname]
+        return path if "://" in path else lab.tftp.url(path)
+
+    return OrderedDict(
+        [
+            (
+                "get_inventory",
+                lambda driver, device: driver.get_inventory(
+                    lab.autoload_context(device)
+                ),
+            ),
+            (
+                "health_check",
+                lambda driver, device: driver.health_check(
+                    lab.resource_context(device)
+                ),
+            ),
+            (
+                "run_custom_command",
+                lambda driver, device: driver.run_custom_command(
+                    lab.resource_context(device), "show version"
+                ),
+            ),
+            (
+                "run_custom_commands",
+                lambda driver, device: driver.run_custom_commands(
+                    lab.resource_context(device), "show version;show running-config"
+                ),
+            ),
+            (
+                "run_custom_command_json",
+                lambda driver, device: driver.run_custom_command_json(
+                    lab.resource_context(device), "show version"
+                ),
+            ),
+            (
+                "run_custom_config_command",
+                lambda driver, device: driver.run_custom_config_command(
+                    lab.resource_context(device), "vlan 100"
+                ),
+            ),
+            (
+                "ApplyConnectivityChanges",
+                lambda driver, device: driver.ApplyConnectivityChanges(
+                    lab.resource_context(device), connectivity_request(device)
+                ),
+            ),
+            ("save", save),
+            (
+                "restore",
+                lambda driver, device: driver.restore(
+                    lab.resource_context(device),
+                    saved_path(device),
+                    "running",
+                    "append",
+                    "",
+                ),
+            ),
+            (
+                "restore_diff",
+                lambda driver, device: driver.restore_diff(
+                    lab.resource_context(device), saved_path(device), "", "False"
+                ),
+            ),
+            ("orchestration_save", orchestration_save),
+            (
+                "orchestration_restore",
+                lambda driver, device: driver.orchestration_restore(
+                    lab.resource_context(device),
+                    lab.saved[device.hostname, "orchestration"],
+                    "",
+                ),
+            ),
+            (
+                "load_firmware",
+                lambda driver, device: driver.load_firmware(
+                    lab.resource_context(device), lab.firmware_url, ""
+                ),
+            ),
+        ]
+    )
+
+
+def get_bulk_commands(lab):
+    """Return bulk driver commands measured once for all the devices."""
+
+    def orchestration_save_bulk(driver, context):
+        lab.saved["bulk"] = driver.orchestration_save_bulk(
+            context, json.dumps(lab.names), "shallow", ""
+        )
+
+    return OrderedDict(
+        [
+            (
+                "health_check_bulk",
+                lambda driver, context: driver.health_check_bulk(
+                    context, json.dumps(lab.names), "False"
+                ),
+            ),
+            ("orchestration_save_bulk", orchestration_save_bulk),
+            (
+                "orchestration_restore_bulk",
+                lambda driver, context: driver.orchestration_restore_bulk(
+                    context, lab.saved["bulk"], "", "", "False"
+                ),
+            ),
+            (
+                "load_firmware_bulk",
+                lambda driver, context: driver.load_firmware_bulk(
+                    context,
+                    json.dumps(lab.names),
+                    lab.firmware_url,
+                    "",
+                    lab.firmware_checksum,
+                    "True",
+                ),
+            ),
+        ]
+    )
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summarize(devices, command, durations, errors, wall_time):
+    return OrderedDict(
+        [
+            ("devices", devices),
+            ("command", command),
+            ("calls", len(durations) + len(errors)),
+            ("errors", len(errors)),
+            ("p50", round(percentile(durations, 0.5) or 0, 4)),
+            ("p95", round(percentile(durations, 0.95) or 0, 4)),
+            ("max", round(max(durations) if durations else 0, 4)),
+            ("throughput", round(len(durations) / wall_time, 2) if wall_time else 0),
+            ("error", errors[0] if errors else None),
+        ]
+    )
+
+
+def timed_call(operation, *args):
+    started = time.time()
+    try:
+        operation(*args)
+    except Exception as e:
+        logger.debug("Benchmark call failed", exc_info=True)
+        return None, str(e) or e.__class__.__name__
+    return time.time() - started, None
+
+
+def run_command(driver, lab, name, operation, rounds):
+    """Run the command on all devices at once, rounds times."""
+    devices = list(lab.devices.values())
+    durations, errors = [], []
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=len(devices)) as executor:
+        for _ in range(rounds):
+            for duration, error in executor.map(
+                lambda device: timed_call(operation, driver, device), devices
+            ):
+                if error is None:
+                    durations.append(duration)
+                else:
+                    errors.append(error)
+    return summarize(len(devices), name, durations, errors, time.time() - started)
+
+
+def run_bulk_command(driver, lab, name, operation, rounds):
+    """Run the bulk command for all devices, throughput counts devices."""
+    context = lab.resource_context(next(iter(lab.devices.values())))
+    durations, errors = [], []
+    started = time.time()
+    for _ in range(rounds):
+        duration, error = timed_call(operation, driver, context)
+        if error is None:
+            durations.append(duration)
+        else:
+            errors.append(error)
+    wall_time = (time.time() - started) / len(lab.devices)
+    return summarize(len(lab.devices), name, durations, errors, wall_time)
+
+
+def run_benchmark(count, commands=None, rounds=1, metrics_path=None, **lab_options):
+    """Benchmark driver commands against count simulated devices.
+
+    :param int count: number of simulated devices
+    :param list[str] commands: names of commands to run, all when None
+    :param int rounds: how many times every command is run
+    :param str metrics_path: file for the driver metrics in Prometheus format
+    :rtype: list[collections.OrderedDict]
+    """
+    results = []
+    with SimulatedLab(count, **lab_options) as lab, mock.patch.object(
+        driver_module,
+        "CloudShellSessionContext",
+        lambda context: SimpleNamespace(get_api=lambda: lab.api),
+    ), mock.patch.object(
+        driver_module, "LoggingSessionContext", _LoggingSessionContext
+    ):
+        driver = CiscoNXOSShellDriver()
+        driver.initialize(lab.init_context(next(iter(lab.devices.values()))))
+        try:
+            for name, operation in get_device_commands(lab).items():
+                if commands is None or name in commands:
+                    results.append(run_command(driver, lab, name, operation, rounds))
+                    report(results[-1])
+            for name, operation in get_bulk_commands(lab).items():
+                if commands is None or name in commands:
+                    results.append(
+                        run_bulk_command(driver, lab, name, operation, rounds)
+                    )
+                    report(results[-1])
+            if metrics_path:
+                with open(metrics_path, "w") as metrics_file:
+                    metrics_file.write(driver.get_metrics(None, "prometheus"))
+        finally:
+            driver.cleanup()
+    return results
+
+
+def report(result):
+    output(
+        "{devices:>7} {command:<28} {calls:>6} {errors:>6} {p50:>9.3f} "
+        "{p95:>9.3f} {max:>9.3f} {throughput:>10.2f}".format(**result)
+    )
+    if result["error"]:
+        output("        first error: {}".format(result["error"]))
+
+
+def output(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def find_regressions(results, baseline, tolerance):
+    """Return results whose median latency grew over the tolerance."""
+    previous = {(item["devices"], item["command"]): item for item in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result["devices"], result["command"]))
+        if base and base["p50"] and result["p50"] > base["p50"] * (1 + tolerance):
+            regressions.append((result, base))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure latency and throughput of the driver commands "
+        "against simulated NX-OS devices, "
+        "e.g. PYTHONPATH=src python -m tests.benchmark --devices 1 10"
+    )
+    parser.add_argument("--devices", type=int, nargs="+", default=DEVICE_COUNTS)
+    parser.add_argument("--commands", nargs="+", help="commands to run, default all")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--protocol", choices=("telnet", "ssh"), default="telnet")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--transfer-rate", type=int, help="bytes per second")
+    parser.add_argument("--base-address", default="127.0.1.1")
+    parser.add_argument("--output", help="write results to the json file")
+    parser.add_argument("--baseline", help="json results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--metrics", help="write driver metrics to the file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    output(
+        "{:>7} {:<28} {:>6} {:>6} {:>9} {:>9} {:>9} {:>10}".format(
+            "devices", "command", "calls", "errors", "p50", "p95", "max", "per sec"
+        )
+    )
+    results = []
+    for count in args.devices:
+        results.extend(
+            run_benchmark(
+                count,
+                commands=args.commands,
+                rounds=args.rounds,
+                metrics_path=args.metrics,
+                protocol=args.protocol,
+                latency=args.latency,
+                transfer_rate=args.transfer_rate,
+                base_address=args.base_address,
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(
+                results, json.load(baseline_file), args.tolerance
+            )
+        for result, base in regressions:
+            output(
+                "Regression: {} on {} devices, p50 {}s, baseline {}s".format(
+                    result["command"], result["devices"], result["p50"], base["p50"]
+                )
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1089 @@
+import hashlib
+import json
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import paramiko
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_WALK = os.path.join(DATA_FOLDER, "nxos_n7k.snmprec")
+DEFAULT_IMAGE = "n7000-s2-dk9.9.3.5.bin"
+SYS_UP_TIME_OID = (1, 3, 6, 1, 2, 1, 1, 3, 0)
+SYS_NAME_OID = (1, 3, 6, 1, 2, 1, 1, 5, 0)
+
+INVALID_COMMAND = "                ^\n% Invalid command at '^' marker.\n"
+CONFIG_MODE_BANNER = "Enter configuration commands, one per line. End with CNTL/Z.\n"
+SECTION_MODES = OrderedDict(
+    [
+        ("interface ", "config-if"),
+        ("vlan ", "config-vlan"),
+        ("vrf context ", "config-vrf"),
+        ("router ", "config-router"),
+        ("line ", "config-line"),
+    ]
+)
+SHOW_VERSION = """Cisco Nexus Operating System (NX-OS) Software
+TAC support: http://www.cisco.com/tac
+Copyright (C) 2002-2020, Cisco and/or its affiliates.
+All rights reserved.
+
+Software
+  BIOS: version 2.12.0
+  NXOS: version {version}
+  BIOS compile time:  05/29/2013
+  NXOS image file is: bootflash:///{image}
+  NXOS compile time:  7/20/2020 20:00:00 [07/21/2020 04:53:31]
+
+Hardware
+  cisco Nexus7000 C7010 (10 Slot) Chassis ("Supervisor Module-2")
+  Intel(R) Xeon(R) CPU with 32745060 kB of memory.
+  Processor Board ID JAF1234ABCD
+
+  Device name: {hostname}
+  bootflash:    1966080 kB
+
+Kernel uptime is 0 day(s), 0 hour(s), {minutes} minute(s), {seconds} second(s)
+"""
+DEFAULT_CONFIG = """version 9.3(5) Bios:version 05.39
+hostname {hostname}
+feature lacp
+feature lldp
+username admin password 5 $5$KNB7kE9D role network-admin
+ip domain-lookup
+snmp-server community public group network-operator
+vrf context management
+  ip route 0.0.0.0/0 10.0.0.1
+vlan 1
+interface mgmt0
+  vrf member management
+  ip address 10.0.0.10/24
+{interfaces}boot nxos bootflash:/{image}
+line console
+line vty
+"""
+
+# snmprec type tags, names of SNMPv1 types follow the SNMPv2 ones
+SNMP_TYPES = {
+    "2": ("Integer",),
+    "4": ("OctetString",),
+    "5": ("Null",),
+    "6": ("ObjectIdentifier",),
+    "64": ("IpAddress",),
+    "65": ("Counter32", "Counter"),
+    "66": ("Gauge32", "Gauge"),
+    "67": ("TimeTicks",),
+    "68": ("Opaque",),
+    "70": ("Counter64",),
+}
+SNMP_NUMERIC_TAGS = ("2", "65", "66", "67", "70")
+
+TFTP_BLOCK_SIZE = 512
+TFTP_TIMEOUT = 5
+TFTP_RETRIES = 3
+TFTP_RRQ, TFTP_WRQ, TFTP_DATA, TFTP_ACK, TFTP_ERROR = range(1, 6)
+
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def get_host_key():
+    """Return RSA host key of the SSH servers, generated once per process."""
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+class NXOSConfig(object):
+    """Configuration of the simulated device as top level lines and sections."""
+
+    def __init__(self, text=""):
+        self._lines = OrderedDict()
+        self.load(text)
+
+    def load(self, text):
+        self._lines.clear()
+        self.merge(text)
+
+    def merge(self, text):
+        section = None
+        for line in text.splitlines():
+            if not line.strip() or line.startswith("!"):
+                continue
+            if line.startswith(" "):
+                if section is not None:
+                    self.apply(line.strip(), section)
+                continue
+            section = self.apply(line.strip())
+
+    def apply(self, line, section=None):
+        """Apply config line, return section the following lines belong to."""
+        if line.startswith("no ") and line != "no shutdown":
+            target = line[3:].strip()
+            if section is not None:
+                self._remove_child(section, target)
+                return section
+            for existing in list(self._lines):
+                if existing == target or existing.startswith(target + " "):
+                    del self._lines[existing]
+            return None
+        if line.startswith("default interface ") and section is None:
+            interface = line[len("default ") :]
+            if interface in self._lines:
+                self._lines[interface] = []
+            return None
+        if section is not None:
+            children = self._lines.setdefault(section, [])
+            if line in ("shutdown", "no shutdown"):
+                self._remove_child(section, "shutdown")
+                self._remove_child(section, "no shutdown")
+            if line not in children:
+                children.append(line)
+            return section
+        self._lines.setdefault(line, [])
+        if get_section_mode(line):
+            return line
+        return None
+
+    def section(self, line):
+        """Return text of the section, i.e. "interface Ethernet1/1"."""
+        if line not in self._lines:
+            return ""
+        return "\n".join([line] + ["  " + child for child in self._lines[line]]) + "\n"
+
+    def text(self):
+        lines = []
+        for line, children in self._lines.items():
+            lines.append(line)
+            lines.extend("  " + child for child in children)
+        return "\n".join(lines) + "\n"
+
+    def find(self, prefix):
+        return [line for line in self._lines if line.startswith(prefix)]
+
+    def _remove_child(self, section, target):
+        children = self._lines.get(section, [])
+        for child in list(children):
+            if child == target or child.startswith(target + " "):
+                children.remove(child)
+
+
+def get_section_mode(line):
+    for prefix, mode in SECTION_MODES.items():
+        if line.startswith(prefix):
+            return mode
+    return None
+
+
+def strip_telnet_commands(data):
+    """Remove telnet negotiation sequences from the received bytes."""
+    result = bytearray()
+    index = 0
+    while index < len(data):
+        byte = data[index]
+        if byte != 255:
+            result.append(byte)
+            index += 1
+        elif index + 1 < len(data) and data[index + 1] == 255:
+            result.append(255)
+            index += 2
+        elif index + 1 < len(data) and data[index + 1] == 250:
+            end = data.find(b"\xff\xf0", index)
+            index = len(data) if end == -1 else end + 2
+        elif index + 1 < len(data) and 251 <= data[index + 1] <= 254:
+            index += 3
+        else:
+            index += 2
+    return bytes(result)
+
+
+class NXOSShell(object):
+    """NX-OS like CLI served over a connected socket or SSH channel.
+
+    Exec and configuration modes with their prompts are emulated, the
+    configuration is kept in the device, files are copied to and from
+    bootflash and TFTP servers. Every command is answered after the latency
+    of the device.
+    """
+
+    DISCONNECT = object()
+
+    def __init__(self, device, connection, login=False, telnet=False):
+        self._device = device
+        self._connection = connection
+        self._login = login
+        self._telnet = telnet
+        self._section = None
+        self._config_mode = False
+        self._confirm = None
+        self._skip_lf = False
+
+    @property
+    def prompt(self):
+        hostname = self._device.hostname
+        if self._section is not None:
+            return "{}({})# ".format(hostname, get_section_mode(self._section))
+        if self._config_mode:
+            return "{}(config)# ".format(hostname)
+        return "{}# ".format(hostname)
+
+    def run(self):
+        try:
+            lines = self._read_lines()
+            if self._login and not self._authenticate(lines):
+                return
+            self._write("\n{}".format(self.prompt))
+            for line in lines:
+                if not self._handle_line(line):
+                    break
+        except (socket.error, EOFError, paramiko.SSHException):
+            pass
+        finally:
+            self._connection.close()
+
+    def _authenticate(self, lines):
+        for _ in range(3):
+            self._write("login: ")
+            username = next(lines)
+            self._write(username + "\n")
+            self._write("Password: ")
+            password = next(lines)
+            self._write("\n")
+            if self._device.check_credentials(username, password):
+                return True
+            self._write("Login incorrect\n")
+        return False
+
+    def _read_lines(self):
+        buffer = ""
+        while True:
+            data = self._connection.recv(4096)
+            if not data:
+                raise EOFError()
+            if self._telnet:
+                data = strip_telnet_commands(data)
+            buffer += data.decode("utf-8", "replace")
+            while True:
+                match = re.search(r"\r|\n", buffer)
+                if not match:
+                    break
+                line, separator = buffer[: match.start()], match.group()
+                buffer = buffer[match.end() :]
+                if self._skip_lf and separator == "\n" and not line:
+                    self._skip_lf = False
+                    continue
+                self._skip_lf = separator == "\r"
+                yield line
+
+    def _write(self, text):
+        data = text.replace("\r\n", "\n").replace("\n", "\r\n")
+        self._connection.sendall(data.encode("utf-8"))
+
+    def _handle_line(self, line):
+        self._write(line + "\n")
+        command = line.strip()
+        if self._confirm is not None:
+            confirm, self._confirm = self._confirm, None
+            output = confirm(command)
+        else:
+            if command:
+                self._device.wait_latency()
+            output = self._execute(command)
+        if output is self.DISCONNECT:
+            return False
+        if self._confirm is not None:
+            self._write(output)
+        else:
+            self._write(output + self.prompt)
+        return True
+
+    def _execute(self, command):
+        if self._config_mode:
+            return self._execute_config(command)
+        return self._execute_exec(command)
+
+    def _execute_exec(self, command):
+        command, filters = split_pipes(command)
+        words = command.split()
+        if not words:
+            return ""
+        keyword = words[0]
+        if keyword == "terminal":
+            return ""
+        if keyword in ("configure", "conf") and (
+            len(words) == 1 or "terminal".startswith(words[1])
+        ):
+            self._config_mode = True
+            return CONFIG_MODE_BANNER
+        if keyword == "show" and "json" in filters:
+            return self._device.show_json(words[1:])
+        if keyword == "show":
+            return apply_filters(self._device.show(words[1:]), filters)
+        if keyword == "copy" and len(words) >= 3:
+            return self._device.copy(words[1], words[2])
+        if keyword in ("del", "delete") and len(words) >= 2:
+            return self._delete(words[1], "no-prompt" in words)
+        if keyword == "dir":
+            return self._device.list_files()
+        if keyword == "reload":
+            return self._reload()
+        if keyword in ("exit", "logout"):
+            return self.DISCONNECT
+        return INVALID_COMMAND
+
+    def _execute_config(self, command):
+        if command in ("end", "\x1a"):
+            self._config_mode = False
+            self._section = None
+            return ""
+        if command == "exit":
+            if self._section is not None:
+                self._section = None
+            else:
+                self._config_mode = False
+            return ""
+        if command.startswith("do "):
+            return self._execute_exec(command[3:])
+        if not command:
+            return ""
+        if get_section_mode(command) or get_section_mode(command[3:]):
+            self._section = None
+        self._section = self._device.running_config.apply(command, self._section)
+        return ""
+
+    def _delete(self, path, no_prompt):
+        name = get_bootflash_name(path)
+        if name is None or name not in self._device.bootflash:
+            return "No such file or directory\n"
+        if no_prompt:
+            self._device.delete(name)
+            return ""
+
+        def confirm(answer):
+            if answer.lower() in ("", "y", "yes"):
+                self._device.delete(name)
+            return ""
+
+        self._confirm = confirm
+        return 'Do you want to delete "/{}" ? (yes/no/abort)   [y] '.format(name)
+
+    def _reload(self):
+        def confirm(answer):
+            if answer.lower() not in ("y", "yes"):
+                return ""
+            self._device.reload()
+            return self.DISCONNECT
+
+        self._confirm = confirm
+        return (
+            "!!!WARNING! there is unsaved configuration!!!\n"
+            "This command will reboot the system. (y/n)?  [n] "
+        )
+
+
+def split_pipes(command):
+    parts = [part.strip() for part in command.split(" | ")]
+    return parts[0], parts[1:]
+
+
+def apply_filters(output, filters):
+    for output_filter in filters:
+        words = output_filter.split(None, 1)
+        if not words or words[0] == "no-more":
+            continue
+        pattern = re.compile(words[1] if len(words) > 1 else "")
+        if words[0] in ("include", "grep"):
+            lines = [line for line in output.splitlines() if pattern.search(line)]
+        elif words[0] == "exclude":
+            lines = [line for line in output.splitlines() if not pattern.search(line)]
+        else:
+            return INVALID_COMMAND
+        output = "".join(line + "\n" for line in lines)
+    return output
+
+
+def get_bootflash_name(path):
+    """Return name of the bootflash file or None for other locations."""
+    if not path.startswith("bootflash:"):
+        return None
+    return path[len("bootflash:") :].lstrip("/")
+
+
+class CliServer(object):
+    """TCP server of the device CLI, telnet or SSH with password login."""
+
+    def __init__(self, device, protocol="telnet", address="127.0.0.1", port=0):
+        self._device = device
+        self.protocol = protocol.lower()
+        self.address = address
+        self.port = port
+        self._socket = None
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.address, self.port))
+        self._socket.listen(64)
+        self.port = self._socket.getsockname()[1]
+        start_daemon(self._accept_loop, "cli-{}".format(self._device.hostname))
+
+    def stop(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+        self.close_connections()
+
+    def close_connections(self):
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            try:
+                connection.close()
+            except (socket.error, paramiko.SSHException):
+                pass
+
+    def _accept_loop(self):
+        while self._socket:
+            try:
+                client, _ = self._socket.accept()
+            except (socket.error, AttributeError):
+                return
+            if not self._device.is_up():
+                client.close()
+                continue
+            start_daemon(self._serve, "cli-session", client)
+
+    def _serve(self, client):
+        with self._lock:
+            self._connections.add(client)
+        try:
+            if self.protocol == "ssh":
+                self._serve_ssh(client)
+            else:
+                NXOSShell(self._device, client, login=True, telnet=True).run()
+        finally:
+            with self._lock:
+                self._connections.discard(client)
+
+    def _serve_ssh(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(get_host_key())
+        server = _SshServer(self._device)
+        try:
+            transport.start_server(server=server)
+            channel = transport.accept(TFTP_TIMEOUT * 2)
+            if channel is None or not server.shell_requested.wait(TFTP_TIMEOUT * 2):
+                return
+            NXOSShell(self._device, channel).run()
+        except (socket.error, EOFError, paramiko.SSHException):
+            pass
+        finally:
+            transport.close()
+
+
+class _SshServer(paramiko.ServerInterface):
+    def __init__(self, device):
+        self._device = device
+        self.shell_requested = threading.Event()
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if self._device.check_credentials(username, password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_requested.set()
+        return True
+
+
+def load_snmprec(path):
+    """Return sorted list of (oid, tag, value) of the snmprec MIB walk file.
+
+    The snmprec format is the one of snmpsim recordings, a line per object:
+    "1.3.6.1.2.1.1.5.0|4|switch", tag "4x" marks hex encoded octet strings.
+    """
+    records = []
+    with open(path) as walk_file:
+        for line in walk_file:
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#"):
+                continue
+            oid, tag, value = line.split("|", 2)
+            records.append((tuple(int(part) for part in oid.split(".")), tag, value))
+    records.sort()
+    return records
+
+
+def to_snmp_value(protocol_module, tag, value):
+    if tag == "4x":
+        return protocol_module.OctetString(hexValue=value)
+    type_name = next(
+        (name for name in SNMP_TYPES.get(tag, ()) if hasattr(protocol_module, name)),
+        "OctetString",
+    )
+    if tag in SNMP_NUMERIC_TAGS:
+        value = int(value)
+    return getattr(protocol_module, type_name)(value)
+
+
+class SnmpAgent(object):
+    """SNMP v1/v2c agent answering GET, GETNEXT and GETBULK from a MIB walk.
+
+    sysUpTime counts from the start of the agent and sysName follows the
+    device hostname, other objects are served as recorded.
+    """
+
+    def __init__(self, device, records, address="127.0.0.1", port=0):
+        self._device = device
+        self._oids = [record[0] for record in records]
+        self._records = {record[0]: (record[1], record[2]) for record in records}
+        self.address = address
+        self.port = port
+        self._socket = None
+        self._started = time.time()
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((self.address, self.port))
+        self.port = self._socket.getsockname()[1]
+        self._started = time.time()
+        start_daemon(self._serve, "snmp-{}".format(self._device.hostname))
+
+    def stop(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def _serve(self):
+        while self._socket:
+            try:
+                message, peer = self._socket.recvfrom(65535)
+            except (socket.error, AttributeError):
+                return
+            if not self._device.is_up():
+                continue
+            try:
+                response = self.handle(message)
+            except Exception:
+                continue
+            if response:
+                self._device.wait_latency()
+                try:
+                    self._socket.sendto(response, peer)
+                except (socket.error, AttributeError):
+                    return
+
+    def handle(self, message):
+        """Return encoded response to the request or None to drop it."""
+        version = api.decodeMessageVersion(message)
+        protocol_module = api.protoModules[version]
+        request, _ = decoder.decode(message, asn1Spec=protocol_module.Message())
+        community = protocol_module.apiMessage.getCommunity(request)
+        if str(community) != self._device.community:
+            return None
+        response = protocol_module.apiMessage.getResponse(request)
+        request_pdu = protocol_module.apiMessage.getPDU(request)
+        response_pdu = protocol_module.apiMessage.getPDU(response)
+        var_binds = protocol_module.apiPDU.getVarBinds(request_pdu)
+
+        if request_pdu.isSameTypeWith(protocol_module.GetRequestPDU()):
+            result = [self._get(protocol_module, tuple(oid)) for oid, _ in var_binds]
+        elif request_pdu.isSameTypeWith(protocol_module.GetNextRequestPDU()):
+            result = [
+                self._get_next(protocol_module, tuple(oid)) for oid, _ in var_binds
+            ]
+        elif version != api.protoVersion1 and request_pdu.isSameTypeWith(
+            protocol_module.GetBulkRequestPDU()
+        ):
+            result = self._get_bulk(protocol_module, request_pdu, var_binds)
+        else:
+            protocol_module.apiPDU.setErrorStatus(response_pdu, 5)
+            return encoder.encode(response)
+
+        missing = [
+            index + 1 for index, (_, value) in enumerate(result) if value is None
+        ]
+        protocol_module.apiPDU.setVarBinds(
+            response_pdu,
+            [
+                (oid, protocol_module.Null("") if value is None else value)
+                for oid, value in result
+            ],
+        )
+        for index in missing[: 1 if version == api.protoVersion1 else None]:
+            if request_pdu.isSameTypeWith(protocol_module.GetRequestPDU()):
+                protocol_module.apiPDU.setNoSuchInstanceError(response_pdu, index)
+            else:
+                protocol_module.apiPDU.setEndOfMibError(response_pdu, index)
+        return encoder.encode(response)
+
+    def _get(self, protocol_module, oid):
+        if oid not in self._records:
+            return oid, None
+        return oid, self._value(protocol_module, oid)
+
+    def _get_next(self, protocol_module, oid):
+        index = self._next_index(oid)
+        if index >= len(self._oids):
+            return oid, None
+        next_oid = self._oids[index]
+        return next_oid, self._value(protocol_module, next_oid)
+
+    def _get_bulk(self, protocol_module, request_pdu, var_binds):
+        non_repeaters = int(protocol_module.apiBulkPDU.getNonRepeaters(request_pdu))
+        max_repetitions = int(protocol_module.apiBulkPDU.getMaxRepetitions(request_pdu))
+        oids = [tuple(oid) for oid, _ in var_binds]
+        result = [self._get_next(protocol_module, oid) for oid in oids[:non_repeaters]]
+        repeaters = oids[non_repeaters:]
+        for _ in range(max_repetitions):
+            if not repeaters:
+                break
+            row = [self._get_next(protocol_module, oid) for oid in repeaters]
+            result.extend(row)
+            if all(value is None for _, value in row):
+                break
+            repeaters = [oid for oid, _ in row]
+        return result
+
+    def _next_index(self, oid):
+        low, high = 0, len(self._oids)
+        while low < high:
+            middle = (low + high) // 2
+            if self._oids[middle] <= oid:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _value(self, protocol_module, oid):
+        if oid == SYS_UP_TIME_OID:
+            return protocol_module.TimeTicks(int((time.time() - self._started) * 100))
+        if oid == SYS_NAME_OID:
+            return protocol_module.OctetString(self._device.hostname)
+        tag, value = self._records[oid]
+        return to_snmp_value(protocol_module, tag, value)
+
+
+class TftpServer(object):
+    """In-memory TFTP server, octet mode with 512 byte blocks."""
+
+    def __init__(self, address="127.0.0.1", port=0):
+        self.address = address
+        self.port = port
+        self.files = {}
+        self._lock = threading.Lock()
+        self._socket = None
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((self.address, self.port))
+        self.port = self._socket.getsockname()[1]
+        start_daemon(self._serve, "tftp")
+
+    def stop(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def url(self, path):
+        return "tftp://{}:{}/{}".format(self.address, self.port, path.lstrip("/"))
+
+    def get_file(self, path):
+        with self._lock:
+            return self.files.get(path.lstrip("/"))
+
+    def put_file(self, path, data):
+        with self._lock:
+            self.files[path.lstrip("/")] = data
+
+    def _serve(self):
+        while self._socket:
+            try:
+                packet, peer = self._socket.recvfrom(65535)
+            except (socket.error, AttributeError):
+                return
+            opcode = struct.unpack("!H", packet[:2])[0]
+            if opcode in (TFTP_RRQ, TFTP_WRQ):
+                filename = packet[2:].split(b"\0")[0].decode("utf-8")
+                start_daemon(self._transfer, "tftp-transfer", opcode, filename, peer)
+
+    def _transfer(self, opcode, filename, peer):
+        transfer_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        transfer_socket.bind((self.address, 0))
+        transfer_socket.settimeout(TFTP_TIMEOUT)
+        try:
+            if opcode == TFTP_RRQ:
+                data = self.get_file(filename)
+                if data is None:
+                    transfer_socket.sendto(tftp_error(1, "File not found"), peer)
+                    return
+                send_tftp_data(transfer_socket, peer, data)
+            else:
+                self.put_file(filename, receive_tftp_data(transfer_socket, peer))
+        except (socket.error, IOError):
+            pass
+        finally:
+            transfer_socket.close()
+
+
+def tftp_error(code, message):
+    return struct.pack("!HH", TFTP_ERROR, code) + message.encode("utf-8") + b"\0"
+
+
+def send_tftp_data(tftp_socket, peer, data, first_block=1):
+    """Send data in blocks waiting for the ack of every block."""
+    block = first_block
+    offset = (block - 1) * TFTP_BLOCK_SIZE
+    while True:
+        chunk = data[offset : offset + TFTP_BLOCK_SIZE]
+        packet = struct.pack("!HH", TFTP_DATA, block & 0xFFFF) + chunk
+        for _ in range(TFTP_RETRIES):
+            tftp_socket.sendto(packet, peer)
+            try:
+                response, _ = tftp_socket.recvfrom(65535)
+            except socket.timeout:
+                continue
+            opcode, ack_block = struct.unpack("!HH", response[:4])
+            if opcode == TFTP_ERROR:
+                raise IOError(response[4:-1].decode("utf-8", "replace"))
+            if opcode == TFTP_ACK and ack_block == block & 0xFFFF:
+                break
+        else:
+            raise IOError("Transfer timed out")
+        if len(chunk) < TFTP_BLOCK_SIZE:
+            return
+        block += 1
+        offset += TFTP_BLOCK_SIZE
+
+
+def receive_tftp_data(tftp_socket, peer, first_packet=None):
+    """Receive data blocks acknowledging them, return the received bytes.
+
+    When first_packet is None the transfer starts with the ack of block 0
+    (a write request), otherwise with the data packet answering a read
+    request.
+    """
+    data = bytearray()
+    block = 1
+    if first_packet is None:
+        tftp_socket.sendto(struct.pack("!HH", TFTP_ACK, 0), peer)
+    while True:
+        if first_packet is not None:
+            packet, first_packet = first_packet, None
+        else:
+            packet, peer = tftp_socket.recvfrom(65535)
+        opcode, packet_block = struct.unpack("!HH", packet[:4])
+        if opcode == TFTP_ERROR:
+            raise IOError(packet[4:-1].decode("utf-8", "replace"))
+        if opcode != TFTP_DATA:
+            continue
+        if packet_block == block & 0xFFFF:
+            data.extend(packet[4:])
+            block += 1
+        tftp_socket.sendto(struct.pack("!HH", TFTP_ACK, packet_block), peer)
+        if packet_block == (block - 1) & 0xFFFF and len(packet) - 4 < TFTP_BLOCK_SIZE:
+            return bytes(data)
+
+
+def tftp_download(host, port, filename, timeout=TFTP_TIMEOUT):
+    tftp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    tftp_socket.settimeout(timeout)
+    try:
+        request = struct.pack("!H", TFTP_RRQ) + filename.encode("utf-8")
+        tftp_socket.sendto(request + b"\0octet\0", (host, port))
+        packet, peer = tftp_socket.recvfrom(65535)
+        return receive_tftp_data(tftp_socket, peer, packet)
+    finally:
+        tftp_socket.close()
+
+
+def tftp_upload(host, port, filename, data, timeout=TFTP_TIMEOUT):
+    tftp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    tftp_socket.settimeout(timeout)
+    try:
+        request = struct.pack("!H", TFTP_WRQ) + filename.encode("utf-8")
+        tftp_socket.sendto(request + b"\0octet\0", (host, port))
+        packet, peer = tftp_socket.recvfrom(65535)
+        opcode, block = struct.unpack("!HH", packet[:4])
+        if opcode != TFTP_ACK or block != 0:
+            raise IOError(packet[4:-1].decode("utf-8", "replace"))
+        send_tftp_data(tftp_socket, peer, data)
+    finally:
+        tftp_socket.close()
+
+
+class SimulatedDevice(object):
+    """NX-OS device stand-in with CLI, SNMP agent and bootflash.
+
+    Every CLI command and SNMP response is delayed by latency seconds, file
+    transfers take size / transfer_rate seconds when the rate (bytes per
+    second) is set. Copies support running-config, startup-config,
+    bootflash: and tftp:// locations. A reload drops all CLI sessions, the
+    device doesn't accept connections for reload_time seconds and boots the
+    startup configuration with the image of its boot variable. Output of
+    show commands can be overridden in commands, i.e.
+    device.commands["vlan brief"] = "...".
+    """
+
+    def __init__(
+        self,
+        hostname="switch",
+        address="127.0.0.1",
+        protocol="telnet",
+        cli_port=0,
+        snmp_port=0,
+        username="admin",
+        password="admin",
+        community="public",
+        walk_path=DEFAULT_WALK,
+        latency=0.0,
+        transfer_rate=None,
+        reload_time=1.0,
+        ports=8,
+    ):
+        self.hostname = hostname
+        self.address = address
+        self.username = username
+        self.password = password
+        self.community = community
+        self.latency = latency
+        self.transfer_rate = transfer_rate
+        self.reload_time = reload_time
+        self.image = DEFAULT_IMAGE
+        self.bootflash = {self.image: b"\0" * 1024}
+        interfaces = "".join(
+            "interface Ethernet1/{}\n  no shutdown\n".format(port)
+            for port in range(1, ports + 1)
+        )
+        self.running_config = NXOSConfig(
+            DEFAULT_CONFIG.format(
+                hostname=hostname, interfaces=interfaces, image=self.image
+            )
+        )
+        self.startup_config = self.running_config.text()
+        self.commands = {}
+        self._booted = time.time()
+        self._up_at = 0
+        self._lock = threading.Lock()
+        self.cli = CliServer(self, protocol, address, cli_port)
+        self.snmp = SnmpAgent(self, load_snmprec(walk_path), address, snmp_port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def cli_port(self):
+        return self.cli.port
+
+    @property
+    def snmp_port(self):
+        return self.snmp.port
+
+    def start(self):
+        self.cli.start()
+        self.snmp.start()
+
+    def stop(self):
+        self.cli.stop()
+        self.snmp.stop()
+
+    def is_up(self):
+        return time.time() >= self._up_at
+
+    def wait_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def check_credentials(self, username, password):
+        return username == self.username and password == self.password
+
+    def reload(self):
+        with self._lock:
+            self._up_at = time.time() + self.reload_time
+            self._booted = self._up_at
+            self.running_config.load(self.startup_config)
+            boot = self.running_config.find("boot nxos ") + self.running_config.find(
+                "boot system "
+            )
+            if boot:
+                image = get_bootflash_name(boot[-1].split()[-1]) or ""
+                if image in self.bootflash:
+                    self.image = image
+        self.cli.close_connections()
+
+    def delete(self, name):
+        with self._lock:
+            self.bootflash.pop(name, None)
+
+    def show(self, words):
+        command = " ".join(words)
+        if command in self.commands:
+            return self.commands[command]
+        if not words:
+            return INVALID_COMMAND
+        if "running-config".startswith(words[0]) and len(words[0]) >= 3:
+            if len(words) >= 3 and words[1] == "interface":
+                return self.running_config.section("interface " + " ".join(words[2:]))
+            return self._config_header("running-config") + self.running_config.text()
+        if "startup-config".startswith(words[0]) and len(words[0]) >= 3:
+            return self._config_header("startup-config") + self.startup_config
+        if words[0] == "version":
+            uptime = int(time.time() - self._booted)
+            return SHOW_VERSION.format(
+                version="9.3(5)",
+                image=self.image,
+                hostname=self.hostname,
+                minutes=uptime // 60,
+                seconds=uptime % 60,
+            )
+        if words[0] == "file" and len(words) >= 2:
+            return self._show_file(words[1], words[2] if len(words) > 2 else None)
+        if words[0] == "hostname":
+            return self.hostname + "\n"
+        if words[0] == "snmp" and words[1:2] == ["user"]:
+            return "".join(
+                "{}\n".format(line.split()[2])
+                for line in self.running_config.find("snmp-server user ")
+            )
+        return INVALID_COMMAND
+
+    def show_json(self, words):
+        if words[:1] != ["version"]:
+            return INVALID_COMMAND
+        return (
+            json.dumps(
+                {
+                    "host_name": self.hostname,
+                    "nxos_ver_str": "9.3(5)",
+                    "nxos_file_name": "bootflash:///{}".format(self.image),
+                    "chassis_id": "Nexus7000 C7010 (10 Slot) Chassis",
+                    "kern_uptm_secs": int(time.time() - self._booted),
+                }
+            )
+            + "\n"
+        )
+
+    def list_files(self):
+        with self._lock:
+            files = sorted(self.bootflash.items())
+        lines = [
+            "  {:>10}    Jan 01 00:00:00 2024  {}".format(len(data), name)
+            for name, data in files
+        ]
+        return "\n".join(lines) + "\n\nUsage for bootflash://sup-local\n"
+
+    def copy(self, source, destination):
+        try:
+            data = self._read_location(source)
+        except IOError as e:
+            return "%Error opening {} ({})\n".format(source, e)
+        if self.transfer_rate and "://" in source + destination:
+            time.sleep(len(data) / float(self.transfer_rate))
+        try:
+            output = self._write_location(destination, data)
+        except IOError as e:
+            return "TFTP put operation failed:{}\n".format(e)
+        return output + "Copy complete.\n"
+
+    def _read_location(self, location):
+        if location.endswith("running-config") or location == "running":
+            return self.running_config.text().encode("utf-8")
+        if location.endswith("startup-config") or location == "startup":
+            return self.startup_config.encode("utf-8")
+        name = get_bootflash_name(location)
+        if name is not None:
+            with self._lock:
+                if name not in self.bootflash:
+                    raise IOError("No such file or directory")
+                return self.bootflash[name]
+        url = urlparse(location)
+        if url.scheme != "tftp":
+            raise IOError("Protocol {} is not supported".format(url.scheme))
+        try:
+            return tftp_download(url.hostname, url.port or 69, url.path.lstrip("/"))
+        except socket.timeout:
+            raise IOError("Timeout reached")
+
+    def _write_location(self, location, data):
+        if location.endswith("running-config"):
+            self.running_config.merge(data.decode("utf-8"))
+            return ""
+        if location.endswith("startup-config"):
+            self.startup_config = NXOSConfig(data.decode("utf-8")).text()
+            return "[########################################] 100%\n"
+        name = get_bootflash_name(location)
+        if name is not None:
+            with self._lock:
+                self.bootflash[name] = data
+            return ""
+        url = urlparse(location)
+        if url.scheme != "tftp":
+            raise IOError("Protocol {} is not supported".format(url.scheme))
+        try:
+            tftp_upload(url.hostname, url.port or 69, url.path.lstrip("/"), data)
+        except socket.timeout:
+            raise IOError("Timeout reached")
+        return (
+            "Trying to connect to tftp server......\n"
+            "Connection to Server Established.\n"
+            "TFTP put operation was successful\n"
+        )
+
+    def _show_file(self, path, algorithm):
+        name = get_bootflash_name(path)
+        with self._lock:
+            data = self.bootflash.get(name)
+        if data is None:
+            return "/{}: No such file or directory\n".format(name)
+        if algorithm in ("md5sum", "sha256sum", "sha512sum"):
+            return hashlib.new(algorithm[: -len("sum")], data).hexdigest() + "\n"
+        return data.decode("utf-8", "replace")
+
+    def _config_header(self, name):
+        now = time.strftime("%a %b %d %H:%M:%S %Y")
+        return "!Command: show {}\n!Time: {}\n\n".format(name, now)
+
+    def to_dict(self):
+        return {
+            "hostname": self.hostname,
+            "address": self.address,
+            "cli_port": self.cli_port,
+            "snmp_port": self.snmp_port,
+            "protocol": self.cli.protocol,
+        }
+
+    def __repr__(self):
+        return "SimulatedDevice({})".format(json.dumps(self.to_dict()))
+
+
+def start_daemon(target, name, *args):
+    thread = threading.Thread(target=target, name=name, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
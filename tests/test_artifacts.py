@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from artifacts import check_artifact, parse_saved_artifacts
+from configuration_flow import config_digest
+
+CONFIG = "hostname switch\ninterface Ethernet1/1\n  description uplink\n"
+
+
+class TestParseSavedArtifacts(unittest.TestCase):
+    def test_mapping_of_resource_names(self):
+        # Arrange
+        info = {"saved_artifacts_info": {"resource_name": "switch-1"}}
+
+        # Act
+        result = parse_saved_artifacts(json.dumps({"switch-1": info}))
+
+        # Assert
+        self.assertEqual(list(result), ["switch-1"])
+        self.assertEqual(json.loads(result["switch-1"]), info)
+
+    def test_result_of_bulk_save(self):
+        # Arrange
+        saved = {
+            "results": [
+                {"resource_name": "switch-1", "success": True, "result": {"a": 1}},
+                {"resource_name": "switch-2", "success": False, "result": None},
+            ]
+        }
+
+        # Act
+        result = parse_saved_artifacts(json.dumps(saved))
+
+        # Assert
+        self.assertEqual(list(result), ["switch-1"])
+
+
+class TestCheckArtifact(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def _write(self, name, config=CONFIG):
+        path = os.path.join(self.folder, name)
+        with open(path, "w") as config_file:
+            config_file.write(config)
+        return "file://" + path
+
+    def test_local_file_with_matching_digest(self):
+        # Arrange
+        url = self._write("switch-running-" + config_digest(CONFIG)[:16])
+
+        # Act
+        result = check_artifact(url)
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_local_file_corrupted(self):
+        # Arrange
+        url = self._write("switch-running-" + config_digest(CONFIG)[:16], CONFIG[:-10])
+
+        # Act
+        result = check_artifact(url)
+
+        # Assert
+        self.assertIn("Checksum", result)
+
+    def test_missing_local_file(self):
+        # Act
+        result = check_artifact("file://{}/missing".format(self.folder))
+
+        # Assert
+        self.assertIn("doesn't exist", result)
+
+    @patch("artifacts.socket.create_connection")
+    def test_unreachable_server(self, create_connection):
+        # Arrange
+        create_connection.side_effect = socket.timeout("timed out")
+
+        # Act
+        result = check_artifact("ftp://10.0.0.1/backups/switch-running")
+
+        # Assert
+        self.assertIn("not reachable", result)
+        create_connection.assert_called_once_with(("10.0.0.1", 21), 5)
+
+    @patch("artifacts.socket.create_connection")
+    def test_tftp_not_checked(self, create_connection):
+        # Act
+        result = check_artifact("tftp://10.0.0.1/backups/switch-running")
+
+        # Assert
+        self.assertIsNone(result)
+        create_connection.assert_not_called()
@@ -0,0 +1,156 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from cloudshell.shell.core.driver_context import (
+    AutoLoadAttribute,
+    AutoLoadDetails,
+    AutoLoadResource,
+)
+from pysnmp.proto import rfc1902
+
+from autoload_snapshot import (
+    AutoloadSnapshotStore,
+    dump_autoload_state,
+    load_autoload_state,
+)
+from snmp_autoload import ENTITY_CLASS_OID, ENTITY_SERIAL_OID, AutoloadState
+
+
+def create_state():
+    details = AutoLoadDetails(
+        resources=[AutoLoadResource("GenericChassis", "Chassis 1", "CH1", "id-1")],
+        attributes=[AutoLoadAttribute("CH1", "Serial Number", "JAF1234ABCD")],
+    )
+    tables = {
+        "ENTITY-MIB": {
+            ENTITY_CLASS_OID: [
+                (rfc1902.ObjectName(ENTITY_CLASS_OID + ".10"), rfc1902.Integer32(3))
+            ],
+            ENTITY_SERIAL_OID: [
+                (
+                    rfc1902.ObjectName(ENTITY_SERIAL_OID + ".10"),
+                    rfc1902.OctetString("JAF1234ABCD"),
+                )
+            ],
+        },
+        "IF-MIB": {
+            "1.3.6.1.2.1.2.2.1.10": [
+                (
+                    rfc1902.ObjectName("1.3.6.1.2.1.2.2.1.10.5"),
+                    rfc1902.Counter32(1234),
+                )
+            ]
+        },
+    }
+    markers = {
+        "sysUpTime": 1000,
+        "ifTableLastChange": 100,
+        "entLastChangeTime": 50,
+        "sysObjectID": "1.3.6.1.4.1.9.12.3.1.3.1096",
+    }
+    return AutoloadState(markers, details, tables)
+
+
+class TestAutoloadStateSerialization(unittest.TestCase):
+    def test_round_trip(self):
+        # Arrange
+        state = create_state()
+
+        # Act
+        result = load_autoload_state(dump_autoload_state(state))
+
+        # Assert
+        self.assertEqual(result.markers, state.markers)
+        resource = result.details.resources[0]
+        self.assertEqual(
+            (resource.model, resource.name, resource.relative_address),
+            ("GenericChassis", "Chassis 1", "CH1"),
+        )
+        self.assertEqual(result.details.attributes[0].attribute_value, "JAF1234ABCD")
+        oid, value = result.tables["IF-MIB"]["1.3.6.1.2.1.2.2.1.10"][0]
+        self.assertEqual(str(oid), "1.3.6.1.2.1.2.2.1.10.5")
+        self.assertIsInstance(value, rfc1902.Counter32)
+        self.assertEqual(int(value), 1234)
+        self.assertEqual(
+            result.chassis_serial(), (ENTITY_SERIAL_OID + ".10", "JAF1234ABCD")
+        )
+
+
+class TestAutoloadSnapshotStore(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, "autoload.sqlite")
+        self.store = AutoloadSnapshotStore(self.path, max_age=100)
+
+    def test_snapshot_survives_new_store(self):
+        # Arrange
+        self.store.put("switch", "fingerprint", create_state())
+
+        # Act
+        result = AutoloadSnapshotStore(self.path).get("switch", "fingerprint")
+
+        # Assert
+        self.assertEqual(result.markers["sysUpTime"], 1000)
+
+    def test_indexed_by_identity(self):
+        # Act
+        self.store.put("switch", "fingerprint", create_state())
+
+        # Assert
+        with sqlite3.connect(self.path) as connection:
+            row = connection.execute(
+                "SELECT resource_name FROM autoload_snapshot "
+                "WHERE sys_object_id = ? AND serial = ?",
+                ("1.3.6.1.4.1.9.12.3.1.3.1096", "JAF1234ABCD"),
+            ).fetchone()
+        self.assertEqual(row, ("switch",))
+
+    def test_other_fingerprint_ignored(self):
+        # Arrange
+        self.store.put("switch", "fingerprint", create_state())
+
+        # Act
+        result = self.store.get("switch", "changed")
+
+        # Assert
+        self.assertIsNone(result)
+
+    @patch("autoload_snapshot.time.time")
+    def test_expired_snapshot_ignored(self, time_mock):
+        # Arrange
+        time_mock.return_value = 0
+        self.store.put("switch", "fingerprint", create_state())
+        time_mock.return_value = 100
+
+        # Act
+        result = self.store.get("switch", "fingerprint")
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_corrupted_snapshot_ignored(self):
+        # Arrange
+        self.store.put("switch", "fingerprint", create_state())
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("UPDATE autoload_snapshot SET data = x'00'")
+
+        # Act
+        result = self.store.get("switch", "fingerprint")
+
+        # Assert
+        self.assertIsNone(result)
+
+    def test_invalidate(self):
+        # Arrange
+        self.store.put("switch", "fingerprint", create_state())
+
+        # Act
+        self.store.invalidate("switch")
+
+        # Assert
+        self.assertIsNone(self.store.get("switch", "fingerprint"))
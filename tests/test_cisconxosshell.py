@@ -13,7 +13,7 @@ from driver import CiscoNXOSShellDriver
     "cloudshell.shell.core.driver_context.ResourceCommandContext",
     autospec=ResourceCommandContext,
 )
-@patch("driver.CiscoNXOSCli")
+@patch("driver.SessionPoolRegistry")
 class TestCiscoNXOSShellDriver(unittest.TestCase):
     def setUp(self):
         self.driver = CiscoNXOSShellDriver()
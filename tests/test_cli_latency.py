@@ -0,0 +1,176 @@
+import unittest
+from collections import deque
+from unittest.mock import MagicMock
+
+from cloudshell.cli.session.expect_session import ExpectSession
+from cloudshell.cli.session.session_exceptions import SessionReadTimeout
+from cloudshell.networking.cisco.cli.cisco_command_modes import EnableCommandMode
+
+from cli_latency import CliLatency, Ewma
+from command_flow import command_pattern
+
+PROMPT = EnableCommandMode.PROMPT
+
+
+class ScriptedSession(ExpectSession):
+    SESSION_TYPE = "SCRIPTED"
+
+    def __init__(self, outputs):
+        super(ScriptedSession, self).__init__()
+        self.outputs = deque(outputs)
+        self.sent = []
+        self.receive_timeouts = []
+
+    def _initialize_session(self, prompt, logger):
+        pass
+
+    def _connect_actions(self, prompt, logger):
+        pass
+
+    def _set_timeout(self, timeout):
+        pass
+
+    def _read_byte_data(self):
+        pass
+
+    def _send(self, command, logger):
+        self.sent.append(command)
+
+    def _receive(self, timeout, logger):
+        self.receive_timeouts.append(timeout)
+        if self.sent and self.outputs:
+            return self.outputs.popleft()
+        raise SessionReadTimeout()
+
+    def disconnect(self):
+        pass
+
+
+class TestEwma(unittest.TestCase):
+    def test_converges_to_samples(self):
+        # Arrange
+        ewma = Ewma()
+
+        # Act
+        for _ in range(50):
+            ewma.observe(0.01)
+
+        # Assert
+        self.assertAlmostEqual(ewma.mean, 0.01)
+        self.assertLess(ewma.deviation, 0.001)
+
+
+class TestCliLatency(unittest.TestCase):
+    def setUp(self):
+        self.latency = CliLatency()
+
+    def test_defaults_without_samples(self):
+        # Act & Assert
+        self.assertEqual(self.latency.poll_interval(0.1), 0.1)
+        self.assertEqual(self.latency.read_timeout(30), 30)
+
+    def test_fast_device_polls_faster(self):
+        # Arrange
+        for _ in range(20):
+            self.latency.observe_round_trip(0.001)
+
+        # Act
+        result = self.latency.poll_interval(0.1)
+
+        # Assert
+        self.assertEqual(result, CliLatency.MIN_POLL_INTERVAL)
+
+    def test_slow_device_gets_longer_read_timeout(self):
+        # Arrange
+        for _ in range(20):
+            self.latency.observe_completion(20)
+
+        # Act
+        result = self.latency.read_timeout(30)
+
+        # Assert
+        self.assertAlmostEqual(result, 60, delta=1)
+
+    def test_read_timeout_limited(self):
+        # Arrange
+        self.latency.observe_completion(1000)
+
+        # Act
+        result = self.latency.read_timeout(30)
+
+        # Assert
+        self.assertEqual(result, CliLatency.MAX_READ_TIMEOUT)
+
+
+class TestAdaptiveSession(unittest.TestCase):
+    def setUp(self):
+        self.latency = CliLatency()
+        self.logger = MagicMock()
+
+    def test_latency_learned_from_commands(self):
+        # Arrange
+        session = self.latency.tune_session(
+            ScriptedSession(["show clock\r\n", "12:00\r\n", "switch# "])
+        )
+
+        # Act
+        result = session.hardware_expect("show clock", PROMPT, self.logger)
+
+        # Assert
+        self.assertIn("12:00", result)
+        self.assertEqual(self.latency.round_trip.count, 1)
+        self.assertEqual(self.latency.completion.count, 1)
+
+    def test_learned_poll_interval_used(self):
+        # Arrange
+        for _ in range(20):
+            self.latency.observe_round_trip(0.001)
+        session = self.latency.tune_session(ScriptedSession(["switch# "]))
+
+        # Act
+        session.hardware_expect("show clock", PROMPT, self.logger)
+
+        # Assert
+        self.assertEqual(set(session.receive_timeouts), {CliLatency.MIN_POLL_INTERVAL})
+
+    def test_prompt_matched_at_end_of_long_output(self):
+        # Arrange
+        session = ScriptedSession([])
+        match_prompt = session.match_prompt = MagicMock(return_value=True)
+        session = self.latency.tune_session(session)
+        output = "switch# " + "x" * 100000 + "\r\nswitch# "
+
+        # Act
+        session.match_prompt(PROMPT, output, self.logger)
+        session.match_prompt(r"switch#|[Cc]onfirm", output, self.logger)
+
+        # Assert
+        tail, full = [call.args[1] for call in match_prompt.call_args_list]
+        self.assertTrue(output.endswith(tail))
+        self.assertLess(len(tail), 5000)
+        self.assertEqual(full, output)
+
+    def test_pipelined_commands_matched_in_long_output(self):
+        # Arrange
+        commands = ["show running-config", "show version"]
+        output = (
+            "show running-config\r\n"
+            + "interface Ethernet1/1\r\n" * 500
+            + "switch# show version\r\nNXOS 9.3(5)\r\nswitch# "
+        )
+        session = self.latency.tune_session(
+            ScriptedSession([output[i : i + 1024] for i in range(0, len(output), 1024)])
+        )
+        session._timeout = 1
+        expected_string = (
+            ".*?".join(command_pattern(command) for command in commands) + ".*" + PROMPT
+        )
+
+        # Act
+        result = session.hardware_expect(
+            "\n".join(commands), expected_string, self.logger
+        )
+
+        # Assert
+        self.assertGreater(len(output), 11000)
+        self.assertIn("NXOS 9.3(5)", result)
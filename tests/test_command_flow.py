@@ -0,0 +1,132 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from command_flow import PipelinedCiscoRunCommandFlow
+from resource_cache import ResourceCache
+
+PROMPT = r"(?:(?!\)).)#\s*$"
+
+
+class TestPipelinedCiscoRunCommandFlow(unittest.TestCase):
+    def setUp(self):
+        self.cli_configurator = MagicMock()
+        service_manager = self.cli_configurator.enable_mode_service.return_value
+        self.session = service_manager.__enter__.return_value
+        self.session.command_mode.prompt = PROMPT
+        self.flow = PipelinedCiscoRunCommandFlow(MagicMock(), self.cli_configurator)
+
+    def test_commands_sent_in_one_write(self):
+        # Arrange
+        self.session.send_command.return_value = (
+            "show clock\n10:00:00 UTC\nswitch# show  hostname\nswitch\nswitch# "
+        )
+
+        # Act
+        result = self.flow.run_commands("show clock;show hostname")
+
+        # Assert
+        self.session.send_command.assert_called_once()
+        self.assertEqual(
+            [(r.command, r.output) for r in result],
+            [("show clock", "10:00:00 UTC"), ("show hostname", "switch")],
+        )
+
+    def test_failed_command_reported(self):
+        # Arrange
+        self.session.send_command.return_value = (
+            "show foo\n% Invalid command at '^' marker.\nswitch# show clock\n"
+            "10:00:00 UTC\nswitch# "
+        )
+
+        # Act
+        result = json.loads(self.flow.run_commands_json("show foo;show clock"))
+
+        # Assert
+        self.assertEqual([r["success"] for r in result], [False, True])
+
+    def test_falls_back_to_sequential_when_echo_missing(self):
+        # Arrange
+        self.session.send_command.side_effect = ["garbage\nswitch# ", "a", "b"]
+
+        # Act
+        result = self.flow.run_commands("show clock;show hostname")
+
+        # Assert
+        self.assertEqual([r.output for r in result], ["a", "b"])
+
+    def test_other_commands_sent_one_by_one(self):
+        # Arrange
+        self.session.send_command.return_value = (
+            "show clock\n10:00:00 UTC\nswitch# show hostname\nswitch\nswitch# "
+        )
+
+        # Act
+        self.flow.run_commands("show clock;show hostname;reload;show clock")
+
+        # Assert
+        sent = [c[0][0] for c in self.session.send_command.call_args_list]
+        self.assertEqual(sent, ["show clock\nshow hostname", "reload", "show clock"])
+
+    def test_batch_of_other_commands_not_resent(self):
+        # Arrange
+        self.session.send_command.return_value = "garbage\nswitch# "
+
+        # Act
+        result = self.flow._send_batch(
+            self.session, ["clear counters", "clear logging logfile"]
+        )
+
+        # Assert
+        self.session.send_command.assert_called_once()
+        self.assertEqual([r.output for r in result], ["garbage\nswitch# "])
+
+    def test_commands_split_into_batches(self):
+        # Arrange
+        self.flow._batch_size = 1
+        self.session.send_command.return_value = "output\nswitch# "
+
+        # Act
+        self.flow.run_commands("show clock;show hostname")
+
+        # Assert
+        self.assertEqual(self.session.send_command.call_count, 2)
+
+
+class TestRunJsonCommands(unittest.TestCase):
+    def setUp(self):
+        self.cli_configurator = MagicMock()
+        service_manager = self.cli_configurator.enable_mode_service.return_value
+        self.session = service_manager.__enter__.return_value
+        self.session.command_mode.prompt = PROMPT
+        self.session.send_command.return_value = '{"host_name": "switch"}\nswitch# '
+        self.flow = PipelinedCiscoRunCommandFlow(MagicMock(), self.cli_configurator)
+        self.cache = ResourceCache(ttl=60)
+
+    def test_output_parsed(self):
+        # Act
+        result = json.loads(self.flow.run_json_commands("show hostname", self.cache))
+
+        # Assert
+        self.session.send_command.assert_called_once_with("show hostname | json")
+        self.assertEqual(result[0]["output"], {"host_name": "switch"})
+        self.assertTrue(result[0]["success"])
+
+    def test_idempotent_command_served_from_cache(self):
+        # Arrange
+        self.flow.run_json_commands("show hostname", self.cache)
+
+        # Act
+        result = json.loads(self.flow.run_json_commands("show hostname", self.cache))
+
+        # Assert
+        self.session.send_command.assert_called_once()
+        self.assertTrue(result[0]["cached"])
+
+    def test_other_commands_not_cached(self):
+        # Act
+        self.flow.run_json_commands("show clock", self.cache)
+        self.flow.run_json_commands("show clock", self.cache)
+
+        # Assert
+        self.assertEqual(self.session.send_command.call_count, 2)
@@ -0,0 +1,166 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from config_diff import diff_config, parse_config
+from configuration_flow import NXOSConfigurationFlow
+
+RUNNING = """!Command: show running-config
+!Time: Mon Jan  1 10:00:00 2024
+
+version 9.3(5)
+hostname switch
+feature lacp
+interface Ethernet1/1
+  description uplink
+  switchport access vlan 10
+  no shutdown
+interface Ethernet1/2
+  shutdown
+"""
+
+TARGET = """!Command: show running-config
+!Time: Tue Jan  2 10:00:00 2024
+
+version 9.3(5)
+hostname switch
+interface Ethernet1/1
+  description uplink
+  switchport access vlan 20
+  no shutdown
+interface Ethernet1/2
+  shutdown
+vlan 20
+  name servers
+"""
+
+
+class TestConfigDiff(unittest.TestCase):
+    def test_parse_nested_sections(self):
+        # Act
+        root = parse_config(RUNNING)
+
+        # Assert
+        self.assertEqual(
+            list(root.children),
+            [
+                "hostname switch",
+                "feature lacp",
+                "interface Ethernet1/1",
+                "interface Ethernet1/2",
+            ],
+        )
+        self.assertIn(
+            "switchport access vlan 10",
+            root.children["interface Ethernet1/1"].children,
+        )
+
+    def test_unchanged_config_gives_empty_diff(self):
+        # Act
+        result = diff_config(RUNNING, RUNNING.replace("10:00:00", "11:00:00"))
+
+        # Assert
+        self.assertEqual(result, [])
+
+    def test_only_changed_sections_pushed(self):
+        # Act
+        result = diff_config(RUNNING, TARGET)
+
+        # Assert
+        self.assertEqual(
+            result,
+            [
+                "no feature lacp",
+                "interface Ethernet1/1",
+                "  no switchport access vlan 10",
+                "  switchport access vlan 20",
+                "  exit",
+                "vlan 20",
+                "  name servers",
+                "  exit",
+            ],
+        )
+
+    def test_negated_line_not_duplicated(self):
+        # Arrange
+        target = RUNNING.replace("  no shutdown", "  shutdown")
+
+        # Act
+        result = diff_config(RUNNING, target)
+
+        # Assert
+        self.assertEqual(result, ["interface Ethernet1/1", "  shutdown", "  exit"])
+
+    def test_physical_interface_missing_in_target_defaulted(self):
+        # Arrange
+        running = RUNNING + "interface Vlan10\n  no shutdown\n"
+        target = RUNNING.replace("interface Ethernet1/2\n  shutdown\n", "")
+
+        # Act
+        result = diff_config(running, target)
+
+        # Assert
+        self.assertEqual(
+            result, ["default interface Ethernet1/2", "no interface Vlan10"]
+        )
+
+
+class TestIncrementalRestore(unittest.TestCase):
+    def setUp(self):
+        self.cli_handler = MagicMock()
+        self.session = (
+            self.cli_handler.get_cli_service.return_value.__enter__.return_value
+        )
+        self.session.send_command.side_effect = lambda command, **kwargs: (
+            TARGET if command.startswith("show file") else RUNNING
+        )
+        self.config_session = self.session.enter_mode.return_value.__enter__
+        self.config_session.return_value.send_command.return_value = "switch(config)# "
+        self.flow = NXOSConfigurationFlow(self.cli_handler, MagicMock(), MagicMock())
+
+    @patch("configuration_flow.SystemActions")
+    def test_dry_run_does_not_apply(self, system_actions_class):
+        # Act
+        result = self.flow.incremental_restore(
+            "tftp://10.0.0.1/switch.cfg", "management", dry_run=True
+        )
+
+        # Assert
+        self.assertIn("  switchport access vlan 20", result)
+        self.session.enter_mode.assert_not_called()
+        system_actions_class.return_value.delete_file.assert_called_once()
+
+    @patch("configuration_flow.SystemActions")
+    def test_restore_method_incremental_applies_diff(self, system_actions_class):
+        # Act
+        self.flow.restore("tftp://10.0.0.1/switch.cfg", "running", "Incremental")
+
+        # Assert
+        config_session = self.config_session.return_value
+        sent = [c[0][0] for c in config_session.send_command.call_args_list]
+        self.assertEqual(
+            sent[:3],
+            [
+                "no feature lacp",
+                "interface Ethernet1/1",
+                "no switchport access vlan 10",
+            ],
+        )
+
+    @patch("configuration_flow.SystemActions")
+    def test_rejected_line_fails_restore(self, system_actions_class):
+        # Arrange
+        config_session = self.config_session.return_value
+        config_session.send_command.side_effect = lambda command: (
+            "% Invalid command at '^' marker.\nswitch(config)# "
+            if command == "no feature lacp"
+            else "switch(config)# "
+        )
+
+        # Act & Assert
+        with self.assertRaisesRegex(Exception, "no feature lacp"):
+            self.flow.restore("tftp://10.0.0.1/switch.cfg", "running", "Incremental")
+
+    def test_incremental_startup_restore_rejected(self):
+        # Act & Assert
+        with self.assertRaises(Exception):
+            self.flow.restore("tftp://10.0.0.1/switch.cfg", "startup", "Incremental")
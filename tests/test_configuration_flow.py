@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from configuration_flow import BackupIndex, NXOSConfigurationFlow, config_digest
+
+CONFIG = """!Command: show running-config
+!Running configuration last done at: Mon Jan  1 10:00:00 2024
+!Time: Mon Jan  1 10:00:00 2024
+
+version 9.3(5)
+hostname switch
+"""
+
+
+class TestConfigDigest(unittest.TestCase):
+    def test_timestamps_ignored(self):
+        # Arrange
+        changed_time = CONFIG.replace("10:00:00", "11:00:00")
+
+        # Act
+        result = config_digest(changed_time)
+
+        # Assert
+        self.assertEqual(result, config_digest(CONFIG))
+
+    def test_configuration_change_detected(self):
+        # Act
+        result = config_digest(CONFIG.replace("hostname switch", "hostname leaf"))
+
+        # Assert
+        self.assertNotEqual(result, config_digest(CONFIG))
+
+
+class TestNXOSConfigurationFlow(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.index = BackupIndex(os.path.join(self.folder, "index.json"))
+        self.cli_handler = MagicMock()
+        session = self.cli_handler.get_cli_service.return_value.__enter__.return_value
+        session.send_command.return_value = CONFIG
+        resource_config = MagicMock()
+        resource_config.name = "switch"
+        self.flow = NXOSConfigurationFlow(
+            self.cli_handler, resource_config, MagicMock(), backup_index=self.index
+        )
+        self.flow._save_flow = MagicMock()
+
+    def test_backup_named_by_digest(self):
+        # Act
+        result = self.flow.save("tftp://10.0.0.1/backups", "running")
+
+        # Assert
+        self.flow._save_flow.assert_called_once()
+        self.assertEqual(result, "switch-running-" + config_digest(CONFIG)[:16])
+
+    def test_upload_skipped_for_stored_configuration(self):
+        # Arrange
+        first = self.flow.save("tftp://10.0.0.1/backups", "running")
+
+        # Act
+        result = self.flow.save("tftp://10.0.0.1/backups", "running", None, True)
+
+        # Assert
+        self.flow._save_flow.assert_called_once()
+        self.assertEqual(result, "tftp://10.0.0.1/backups/" + first)
+
+    def test_index_persisted(self):
+        # Arrange
+        filename = self.flow.save("tftp://10.0.0.1/backups", "running")
+
+        # Act
+        index = BackupIndex(os.path.join(self.folder, "index.json"))
+
+        # Assert
+        self.assertEqual(
+            index.get("switch|running|tftp://10.0.0.1/backups", config_digest(CONFIG)),
+            filename,
+        )
+
+    def test_entries_of_other_processes_kept(self):
+        # Arrange
+        other = BackupIndex(os.path.join(self.folder, "index.json"))
+        self.index.get("switch|running|tftp://10.0.0.1/backups", "0" * 64)
+        other.put("leaf|running|tftp://10.0.0.1/backups", "1" * 64, "leaf-running")
+
+        # Act
+        self.index.put("switch|running|tftp://10.0.0.1/backups", "0" * 64, "switch")
+
+        # Assert
+        result = BackupIndex(os.path.join(self.folder, "index.json"))
+        self.assertEqual(
+            result.get("leaf|running|tftp://10.0.0.1/backups", "1" * 64),
+            "leaf-running",
+        )
+        self.assertEqual(
+            sorted(os.listdir(self.folder)), ["index.json", "index.json.lock"]
+        )
@@ -0,0 +1,137 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from connectivity_flow import BatchedCiscoNXOSConnectivityFlow, merge_vlan_ranges
+
+
+def create_action(action_id, action_type, port, vlan_id, mode="Trunk"):
+    return {
+        "actionId": action_id,
+        "type": action_type,
+        "actionTarget": {"fullName": port, "fullAddress": port},
+        "connectionParams": {
+            "vlanId": vlan_id,
+            "mode": mode,
+            "vlanServiceAttributes": [],
+        },
+        "customActionAttributes": [],
+    }
+
+
+class TestBatchedCiscoNXOSConnectivityFlow(unittest.TestCase):
+    def setUp(self):
+        self.cli_handler = MagicMock()
+        self.flow = BatchedCiscoNXOSConnectivityFlow(self.cli_handler, MagicMock())
+        self.flow.is_switch = True
+        self.flow.IS_VLAN_RANGE_SUPPORTED = True
+        self.flow.IS_MULTI_VLAN_SUPPORTED = True
+        self.iface_actions = MagicMock()
+        self.iface_actions.get_port_name.side_effect = lambda name: name.split("/")[-1]
+        self.vlan_actions = MagicMock()
+        self.flow._get_iface_actions = MagicMock(return_value=self.iface_actions)
+        self.flow._get_vlan_actions = MagicMock(return_value=self.vlan_actions)
+
+    def _apply(self, *actions):
+        request = json.dumps({"driverRequest": {"actions": list(actions)}})
+        response = json.loads(self.flow.apply_connectivity(request))
+        return {
+            result["actionId"]: result["success"]
+            for result in response["driverResponse"]["actionResults"]
+        }
+
+    def test_vlans_merged_and_applied_in_one_session(self):
+        # Arrange
+        self.iface_actions.get_current_interface_config.return_value = (
+            "interface Ethernet1/1\n  switchport trunk allowed vlan 10-13,20\n"
+        )
+
+        # Act
+        result = self._apply(
+            create_action("1", "setVlan", "switch/Chassis 0/Ethernet1-1", "10"),
+            create_action("2", "setVlan", "switch/Chassis 0/Ethernet1-1", "11"),
+            create_action("3", "setVlan", "switch/Chassis 0/Ethernet1-1", "12-13,20"),
+        )
+
+        # Assert
+        self.cli_handler.get_cli_service.assert_called_once()
+        self.vlan_actions.set_vlan_to_interface.assert_called_once_with(
+            "10-13,20", "trunk", "Ethernet1-1", False, ""
+        )
+        self.assertEqual(result, {"1": True, "2": True, "3": True})
+
+    def test_each_action_gets_own_result(self):
+        # Arrange
+        self.iface_actions.get_current_interface_config.return_value = (
+            "interface Ethernet1/1\n  switchport trunk allowed vlan 10\n"
+        )
+
+        # Act
+        result = self._apply(
+            create_action("1", "setVlan", "switch/Chassis 0/Ethernet1-1", "10"),
+            create_action("2", "setVlan", "switch/Chassis 0/Ethernet1-1", "11"),
+            create_action("3", "removeVlan", "switch/Chassis 0/Ethernet1-2", "30"),
+        )
+
+        # Assert
+        self.assertEqual(result, {"1": True, "2": False, "3": True})
+
+    def test_port_failure_does_not_affect_other_ports(self):
+        # Arrange
+        self.iface_actions.get_current_interface_config.return_value = ""
+        self.vlan_actions.set_vlan_to_interface.side_effect = [Exception("error"), None]
+
+        # Act
+        result = self._apply(
+            create_action("1", "setVlan", "switch/Chassis 0/Ethernet1-1", "10"),
+            create_action("2", "removeVlan", "switch/Chassis 0/Ethernet1-2", "10"),
+            create_action("3", "setVlan", "switch/Chassis 0/Ethernet1-2", "20"),
+        )
+
+        # Assert
+        self.assertEqual(result, {"1": False, "2": True, "3": False})
+
+    def test_merge_vlan_ranges(self):
+        # Act
+        result = merge_vlan_ranges(["12", "10-11", "15,20-21"])
+
+        # Assert
+        self.assertEqual(result, ["10-12", "15", "20-21"])
+
+    def test_ports_split_between_sessions(self):
+        # Arrange
+        self.flow._max_workers = 2
+        self.iface_actions.get_current_interface_config.return_value = (
+            "switchport trunk allowed vlan 10"
+        )
+
+        # Act
+        result = self._apply(
+            create_action("1", "setVlan", "switch/Chassis 0/Ethernet1-1", "10"),
+            create_action("2", "setVlan", "switch/Chassis 0/Ethernet1-2", "10"),
+            create_action("3", "setVlan", "switch/Chassis 0/Ethernet1-3", "10"),
+        )
+
+        # Assert
+        self.assertEqual(self.cli_handler.get_cli_service.call_count, 2)
+        self.assertEqual(result, {"1": True, "2": True, "3": True})
+
+    def test_same_port_actions_kept_in_one_session(self):
+        # Arrange
+        ports = list(
+            BatchedCiscoNXOSConnectivityFlow._group_by_port(
+                [
+                    MagicMock(type="setVlan", actionTarget=MagicMock(fullName=name))
+                    for name in ("port-1", "port-1", "port-2")
+                ]
+            ).values()
+        )
+
+        # Act
+        buckets = BatchedCiscoNXOSConnectivityFlow._split_ports(ports, 4)
+
+        # Assert
+        self.assertEqual(
+            [[port.full_name for port in bucket] for bucket in buckets],
+            [["port-1"], ["port-2"]],
+        )
@@ -0,0 +1,170 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from firmware_flow import RetryPolicy, StagedCiscoLoadFirmwareFlow, parse_checksum
+
+MD5 = "1f3870be274f6c49b3e31a0c6728957f"
+PATH = "tftp://10.0.0.1/images/nxos.9.3.5.bin"
+
+
+class TestParseChecksum(unittest.TestCase):
+    def test_algorithm_detected_by_length(self):
+        # Act
+        result = parse_checksum("MD5:" + MD5.upper())
+
+        # Assert
+        self.assertEqual(result, ("md5sum", MD5))
+        self.assertEqual(parse_checksum("a" * 64)[0], "sha256sum")
+
+    def test_invalid_checksum(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            parse_checksum("12345")
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_exponential_backoff_capped(self):
+        # Arrange
+        policy = RetryPolicy(attempts=5, backoff=10, max_backoff=50)
+
+        # Act
+        result = [policy.get_delay(attempt) for attempt in range(1, 5)]
+
+        # Assert
+        self.assertEqual(result, [10, 20, 40, 50])
+
+
+@patch("firmware_flow.SystemActions")
+class TestStagedCiscoLoadFirmwareFlow(unittest.TestCase):
+    def setUp(self):
+        self.cli_handler = MagicMock()
+        self.session = (
+            self.cli_handler.get_cli_service.return_value.__enter__.return_value
+        )
+
+    def test_copy_skipped_when_checksum_matches(self, system_actions_class):
+        # Arrange
+        self.session.send_command.return_value = MD5 + "\nswitch#"
+        flow = StagedCiscoLoadFirmwareFlow(self.cli_handler, MagicMock(), MD5)
+
+        # Act
+        result = flow.stage(PATH, "management")
+
+        # Assert
+        self.assertEqual(result, "bootflash:/nxos.9.3.5.bin")
+        system_actions_class.return_value.copy.assert_not_called()
+        self.session.send_command.assert_called_once_with(
+            "show file bootflash:/nxos.9.3.5.bin md5sum"
+        )
+
+    def test_copied_image_verified(self, system_actions_class):
+        # Arrange
+        self.session.send_command.side_effect = [
+            "No such file or directory",
+            MD5,
+        ]
+        flow = StagedCiscoLoadFirmwareFlow(self.cli_handler, MagicMock(), MD5)
+
+        # Act
+        flow.stage(PATH, "management")
+
+        # Assert
+        system_actions_class.return_value.copy.assert_called_once()
+
+    def test_corrupted_copy_rejected(self, system_actions_class):
+        # Arrange
+        self.session.send_command.return_value = "0" * 32
+        flow = StagedCiscoLoadFirmwareFlow(self.cli_handler, MagicMock(), MD5)
+
+        # Act & Assert
+        with self.assertRaises(Exception):
+            flow.stage(PATH, "management")
+
+    def test_copy_without_checksum_uses_transfer_slot(self, system_actions_class):
+        # Arrange
+        slots = threading.BoundedSemaphore(1)
+        holding = []
+        system_actions_class.return_value.copy.side_effect = lambda *a, **k: (
+            holding.append(not slots.acquire(blocking=False))
+        )
+        flow = StagedCiscoLoadFirmwareFlow(
+            self.cli_handler, MagicMock(), transfer_slots=slots
+        )
+
+        # Act
+        flow.stage(PATH)
+
+        # Assert
+        self.assertEqual(holding, [True])
+        self.session.send_command.assert_not_called()
+
+    def test_load_firmware_stages_and_installs(self, system_actions_class):
+        # Arrange
+        flow = StagedCiscoLoadFirmwareFlow(self.cli_handler, MagicMock())
+        flow.install = MagicMock()
+
+        # Act
+        flow.load_firmware(PATH, "management")
+
+        # Assert
+        flow.install.assert_called_once_with(
+            "bootflash:/nxos.9.3.5.bin", "management", flow._timeout
+        )
+
+    @patch("firmware_flow.time.sleep")
+    def test_failed_transfer_retried(self, sleep, system_actions_class):
+        # Arrange
+        system_actions_class.return_value.copy.side_effect = [
+            Exception("Copy", "Copy Command failed. Connection reset"),
+            None,
+        ]
+        progress = MagicMock()
+        flow = StagedCiscoLoadFirmwareFlow(
+            self.cli_handler,
+            MagicMock(),
+            retry_policy=RetryPolicy(attempts=3, backoff=5),
+            progress=progress,
+        )
+
+        # Act
+        flow.stage(PATH)
+
+        # Assert
+        self.assertEqual(system_actions_class.return_value.copy.call_count, 2)
+        sleep.assert_called_once_with(5)
+        self.assertTrue(any("retry 1/2" in c[0][0] for c in progress.call_args_list))
+        self.assertEqual(self.cli_handler.get_cli_service.call_count, 2)
+
+    @patch("firmware_flow.time.sleep")
+    def test_completed_image_accepted_after_lost_session(
+        self, sleep, system_actions_class
+    ):
+        # Arrange
+        system_actions_class.return_value.copy.side_effect = Exception("timeout")
+        self.session.send_command.side_effect = ["No such file", MD5]
+        flow = StagedCiscoLoadFirmwareFlow(
+            self.cli_handler,
+            MagicMock(),
+            MD5,
+            retry_policy=RetryPolicy(attempts=2),
+        )
+
+        # Act
+        flow.stage(PATH)
+
+        # Assert
+        system_actions_class.return_value.copy.assert_called_once()
+
+    @patch("firmware_flow.time.sleep")
+    def test_attempts_exhausted(self, sleep, system_actions_class):
+        # Arrange
+        system_actions_class.return_value.copy.side_effect = Exception("failed")
+        flow = StagedCiscoLoadFirmwareFlow(
+            self.cli_handler, MagicMock(), retry_policy=RetryPolicy(attempts=3)
+        )
+
+        # Act & Assert
+        with self.assertRaises(Exception):
+            flow.stage(PATH)
+        self.assertEqual(system_actions_class.return_value.copy.call_count, 3)
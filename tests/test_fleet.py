@@ -0,0 +1,114 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from fleet import FleetExecutor, parse_resource_names
+
+
+class TestFleetExecutor(unittest.TestCase):
+    def setUp(self):
+        self.logger = MagicMock()
+
+    def test_results_collected_per_device(self):
+        # Arrange
+        def operation(name):
+            if name == "switch-2":
+                raise Exception("failed")
+            return name.upper()
+
+        executor = FleetExecutor(self.logger, max_concurrency=2)
+
+        # Act
+        results = executor.run(["switch-1", "switch-2"], operation)
+
+        # Assert
+        self.assertEqual(
+            [(r.success, r.result, r.error) for r in results],
+            [(True, "SWITCH-1", None), (False, None, "failed")],
+        )
+        self.assertIsNotNone(results[0].to_dict()["duration"])
+
+    def test_concurrency_limited(self):
+        # Arrange
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def operation(name):
+            with lock:
+                running.append(name)
+                peak.append(len(running))
+            threading.Event().wait(0.05)
+            with lock:
+                running.remove(name)
+
+        executor = FleetExecutor(self.logger, max_concurrency=2)
+
+        # Act
+        executor.run(["switch-{}".format(i) for i in range(6)], operation)
+
+        # Assert
+        self.assertLessEqual(max(peak), 2)
+
+    def test_device_timeout(self):
+        # Arrange
+        release = threading.Event()
+        executor = FleetExecutor(self.logger, device_timeout=0.05)
+
+        # Act
+        results = executor.run(["switch-1"], lambda name: release.wait(1))
+        release.set()
+
+        # Assert
+        self.assertFalse(results[0].success)
+        self.assertIn("Timed out", results[0].error)
+
+    def test_timed_out_device_keeps_its_slot(self):
+        # Arrange
+        lock = threading.Lock()
+        running = []
+        overlapped = []
+
+        def operation(name):
+            with lock:
+                overlapped.extend(running)
+                running.append(name)
+            threading.Event().wait(0.2 if name == "switch-1" else 0)
+            with lock:
+                running.remove(name)
+
+        executor = FleetExecutor(self.logger, max_concurrency=1, device_timeout=0.05)
+
+        # Act
+        results = executor.run(["switch-1", "switch-2"], operation)
+
+        # Assert
+        self.assertEqual(overlapped, [])
+        self.assertIn("Timed out", results[0].error)
+        self.assertGreaterEqual(results[0].duration, 0.2)
+        self.assertTrue(results[1].success)
+
+    def test_fail_fast_skips_remaining_devices(self):
+        # Arrange
+        def operation(name):
+            if name == "switch-1":
+                raise Exception("failed")
+            return name
+
+        executor = FleetExecutor(self.logger, max_concurrency=1)
+
+        # Act
+        results = executor.run(["switch-1", "switch-2"], operation, fail_fast=True)
+
+        # Assert
+        self.assertFalse(results[1].success)
+        self.assertIsNone(results[1].started)
+        self.assertIn("Skipped", results[1].error)
+
+    def test_parse_resource_names(self):
+        # Act
+        result = parse_resource_names("switch-1; switch-2;;switch-1")
+
+        # Assert
+        self.assertEqual(result, ["switch-1", "switch-2"])
+        self.assertEqual(parse_resource_names('["switch-3"]'), ["switch-3"])
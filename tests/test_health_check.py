@@ -0,0 +1,151 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fleet import FleetExecutor
+from health_check import (
+    HealthCheckResult,
+    LiveStatusWriter,
+    TieredHealthCheck,
+    collect_health_results,
+    get_cli_port,
+)
+
+
+@patch("health_check.CiscoRunCommandFlow")
+@patch("health_check.tcp_probe", return_value=0.001)
+class TestTieredHealthCheck(unittest.TestCase):
+    def setUp(self):
+        self.resource_config = MagicMock()
+        self.resource_config.name = "switch"
+        self.resource_config.address = "10.0.0.1"
+        self.resource_config.snmp_version = "v2c"
+        self.snmp = MagicMock()
+        self.service = self.snmp.get_snmp_service.return_value.__enter__.return_value
+
+    def _health_check(self, snmp_enabled=None):
+        return TieredHealthCheck(
+            self.resource_config,
+            MagicMock(),
+            MagicMock(),
+            snmp_enabled=snmp_enabled,
+            snmp=self.snmp,
+        )
+
+    def test_passes_on_snmp_without_cli(self, tcp_probe, run_command_flow_class):
+        # Act
+        result = self._health_check().run()
+
+        # Assert
+        self.assertTrue(result.online)
+        self.assertEqual(result.tier, "snmp")
+        run_command_flow_class.assert_not_called()
+
+    def test_escalates_to_cli_on_snmp_failure(self, tcp_probe, run_command_flow_class):
+        # Arrange
+        self.service.get.side_effect = Exception("No SNMP response")
+
+        # Act
+        result = self._health_check().run()
+
+        # Assert
+        self.assertTrue(result.online)
+        self.assertEqual(result.tier, "cli")
+        run_command_flow_class.return_value.run_custom_command.assert_called_once_with(
+            ""
+        )
+
+    def test_snmp_skipped_when_disabled(self, tcp_probe, run_command_flow_class):
+        # Act
+        result = self._health_check(snmp_enabled=False).run()
+
+        # Assert
+        self.snmp.get_snmp_service.assert_not_called()
+        self.assertEqual(result.tier, "cli")
+
+    def test_fails_when_cli_fails(self, tcp_probe, run_command_flow_class):
+        # Arrange
+        tcp_probe.side_effect = OSError("Connection refused")
+        run_command_flow_class.return_value.run_custom_command.side_effect = Exception(
+            "Failed to open session"
+        )
+
+        # Act
+        result = self._health_check().run()
+
+        # Assert
+        self.assertFalse(result.online)
+        self.assertEqual(result.error, "Failed to open session")
+        self.assertEqual(result.description, "Health check on resource switch failed.")
+
+
+class TestGetCliPort(unittest.TestCase):
+    def test_port_by_connection_type(self):
+        # Arrange
+        resource_config = MagicMock(cli_tcp_port="", cli_connection_type="Telnet")
+
+        # Act
+        result = get_cli_port(resource_config)
+
+        # Assert
+        self.assertEqual(result, 23)
+        self.assertEqual(get_cli_port(MagicMock(cli_tcp_port="2222")), 2222)
+
+
+class TestLiveStatusWriter(unittest.TestCase):
+    def test_unchanged_status_not_written_again(self):
+        # Arrange
+        api = MagicMock()
+        writer = LiveStatusWriter()
+        result = HealthCheckResult("switch")
+        result.online = True
+        writer.write(api, [result], MagicMock())
+
+        # Act
+        writer.write(api, [result], MagicMock())
+
+        # Assert
+        api.SetResourceLiveStatus.assert_called_once_with(
+            "switch", "Online", "Health check on resource switch passed."
+        )
+
+    @patch("resource_cache.time")
+    def test_unchanged_status_written_again_after_ttl(self, mocked_time):
+        # Arrange
+        api = MagicMock()
+        writer = LiveStatusWriter(ttl=60)
+        result = HealthCheckResult("switch")
+        result.online = True
+        mocked_time.time.return_value = 1000
+        writer.write(api, [result], MagicMock())
+        mocked_time.time.return_value = 1060
+
+        # Act
+        writer.write(api, [result], MagicMock())
+
+        # Assert
+        self.assertEqual(api.SetResourceLiveStatus.call_count, 2)
+
+
+class TestCollectHealthResults(unittest.TestCase):
+    def test_failed_operation_reported_offline(self):
+        # Arrange
+        def check(name):
+            if name == "switch-2":
+                raise Exception("Resource switch-2 not found")
+            result = HealthCheckResult(name)
+            result.online = True
+            return result
+
+        device_results = FleetExecutor(MagicMock()).run(["switch-1", "switch-2"], check)
+
+        # Act
+        result = collect_health_results(device_results)
+
+        # Assert
+        self.assertEqual(
+            [(r.resource_name, r.online, r.error) for r in result],
+            [
+                ("switch-1", True, None),
+                ("switch-2", False, "Resource switch-2 not found"),
+            ],
+        )
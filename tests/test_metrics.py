@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from metrics import Histogram, MetricsRegistry, instrumented, timed_phase
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_cumulative(self):
+        # Arrange
+        histogram = Histogram(buckets=(1, 5, 10))
+
+        # Act
+        for value in (0.5, 3, 7, 20):
+            histogram.observe(value)
+
+        # Assert
+        self.assertEqual(histogram.counts, [1, 2, 3])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 30.5)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry(buckets=(1, 10))
+
+    def _phases(self):
+        return {item["phase"]: item for item in json.loads(self.registry.to_json())}
+
+    @patch("metrics.time.time")
+    def test_execution_excludes_phases(self, time_mock):
+        # Arrange
+        time_mock.side_effect = [0, 1, 3, 4, 5, 9]
+
+        # Act
+        with self.registry.measure("save", "switch"):
+            with timed_phase("file_transfer"):
+                pass
+            with timed_phase("lock_wait"):
+                pass
+
+        # Assert
+        phases = self._phases()
+        self.assertEqual(phases["file_transfer"]["sum"], 2)
+        self.assertEqual(phases["lock_wait"]["sum"], 1)
+        self.assertEqual(phases["execution"]["sum"], 6)
+        self.assertEqual(phases["total"]["sum"], 9)
+        self.assertEqual(phases["total"]["resource"], "switch")
+
+    @patch("metrics.time.time")
+    def test_nested_phase_counted_once(self, time_mock):
+        # Arrange
+        time_mock.side_effect = [0, 1, 5, 6]
+
+        # Act
+        with self.registry.measure("restore", "switch"):
+            with timed_phase("file_transfer"):
+                with timed_phase("cli_connect"):
+                    pass
+
+        # Assert
+        phases = self._phases()
+        self.assertNotIn("cli_connect", phases)
+        self.assertEqual(phases["file_transfer"]["sum"], 4)
+        self.assertEqual(phases["execution"]["sum"], 2)
+
+    def test_phase_outside_of_command_ignored(self):
+        # Act
+        with timed_phase("file_transfer"):
+            pass
+
+        # Assert
+        self.assertEqual(json.loads(self.registry.to_json()), [])
+
+    def test_recorded_on_error(self):
+        # Act
+        with self.assertRaises(ValueError):
+            with self.registry.measure("save", "switch"):
+                raise ValueError()
+
+        # Assert
+        self.assertEqual(self._phases()["total"]["count"], 1)
+
+    def test_prometheus_format(self):
+        # Arrange
+        self.registry.observe("save", "switch", "total", 5)
+
+        # Act
+        result = self.registry.to_prometheus()
+
+        # Assert
+        labels = 'command="save",resource="switch",phase="total"'
+        self.assertIn("# TYPE cisco_nxos_driver_duration_seconds histogram", result)
+        self.assertIn(
+            'cisco_nxos_driver_duration_seconds_bucket{%s,le="1"} 0' % labels, result
+        )
+        self.assertIn(
+            'cisco_nxos_driver_duration_seconds_bucket{%s,le="10"} 1' % labels, result
+        )
+        self.assertIn(
+            'cisco_nxos_driver_duration_seconds_bucket{%s,le="+Inf"} 1' % labels,
+            result,
+        )
+        self.assertIn("cisco_nxos_driver_duration_seconds_sum{%s} 5" % labels, result)
+        self.assertIn("cisco_nxos_driver_duration_seconds_count{%s} 1" % labels, result)
+
+    def test_textfile_written_after_command(self):
+        # Arrange
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "driver.prom")
+        registry = MetricsRegistry(textfile_path=path)
+
+        # Act
+        with registry.measure("save", "switch"):
+            pass
+
+        # Assert
+        with open(path) as textfile:
+            self.assertEqual(textfile.read(), registry.to_prometheus())
+        self.assertEqual(os.listdir(folder), ["driver.prom"])
+
+    @patch("metrics.logger")
+    def test_textfile_written_by_concurrent_commands(self, mocked_logger):
+        # Arrange
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "driver.prom")
+        registry = MetricsRegistry(textfile_path=path)
+
+        def command(index):
+            for _ in range(20):
+                with registry.measure("save", "switch-{}".format(index)):
+                    pass
+
+        threads = [threading.Thread(target=command, args=(i,)) for i in range(4)]
+
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert
+        mocked_logger.warning.assert_not_called()
+        with open(path) as textfile:
+            self.assertEqual(textfile.read(), registry.to_prometheus())
+        self.assertEqual(os.listdir(folder), ["driver.prom"])
+
+
+class TestInstrumented(unittest.TestCase):
+    def test_command_measured_with_resource_name(self):
+        # Arrange
+        class Driver(object):
+            METRICS_LOG_BREAKDOWN = False
+
+            def __init__(self):
+                self._metrics = MetricsRegistry()
+
+            @instrumented
+            def save(self, context, folder_path):
+                return folder_path
+
+        driver = Driver()
+        context = MagicMock()
+        context.resource.name = "switch"
+
+        # Act
+        result = driver.save(context, "tftp://server")
+
+        # Assert
+        self.assertEqual(result, "tftp://server")
+        commands = {
+            (item["command"], item["resource"])
+            for item in json.loads(driver._metrics.to_json())
+        }
+        self.assertEqual(commands, {("save", "switch")})
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from resource_cache import ResourceCache, context_fingerprint
+
+
+class TestResourceCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResourceCache(ttl=60)
+        self.factory = MagicMock(side_effect=lambda: object())
+
+    def test_get_reuses_value_for_same_fingerprint(self):
+        # Act
+        first = self.cache.get("switch", "fp", self.factory)
+        second = self.cache.get("switch", "fp", self.factory)
+
+        # Assert
+        self.assertIs(first, second)
+        self.factory.assert_called_once()
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_get_rebuilds_value_when_fingerprint_changed(self):
+        # Act
+        first = self.cache.get("switch", "fp1", self.factory)
+        second = self.cache.get("switch", "fp2", self.factory)
+
+        # Assert
+        self.assertIsNot(first, second)
+        self.assertEqual(self.cache.misses, 2)
+
+    @patch("resource_cache.time")
+    def test_get_rebuilds_expired_value(self, mocked_time):
+        # Arrange
+        mocked_time.time.return_value = 100
+        self.cache.get("switch", "fp", self.factory)
+        mocked_time.time.return_value = 161
+
+        # Act
+        self.cache.get("switch", "fp", self.factory)
+
+        # Assert
+        self.assertEqual(self.factory.call_count, 2)
+
+    def test_invalidate(self):
+        # Arrange
+        self.cache.get("switch", "fp", self.factory)
+
+        # Act
+        self.cache.invalidate("switch")
+        self.cache.get("switch", "fp", self.factory)
+
+        # Assert
+        self.assertEqual(self.factory.call_count, 2)
+
+    def test_context_fingerprint_depends_on_attributes(self):
+        # Arrange
+        context = MagicMock()
+        context.resource.name = "switch"
+        context.resource.address = "192.168.1.1"
+        context.resource.attributes = {"User": "admin"}
+        fingerprint = context_fingerprint(context)
+
+        # Act
+        context.resource.attributes = {"User": "root"}
+
+        # Assert
+        self.assertNotEqual(fingerprint, context_fingerprint(context))
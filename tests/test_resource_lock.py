@@ -0,0 +1,85 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from resource_lock import ReadWriteLock, ResourceLock
+
+
+class Driver(object):
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    @ResourceLock.read
+    def read(self, context):
+        self.started.set()
+        self.release.wait(1)
+
+    @ResourceLock.write
+    def write(self, context):
+        return context.resource.name
+
+
+class TestReadWriteLock(unittest.TestCase):
+    def test_readers_share_lock(self):
+        # Arrange
+        lock = ReadWriteLock()
+        lock.acquire_read()
+
+        # Act
+        acquired = threading.Thread(target=lock.acquire_read)
+        acquired.start()
+        acquired.join(1)
+
+        # Assert
+        self.assertFalse(acquired.is_alive())
+
+    def test_writer_waits_for_readers(self):
+        # Arrange
+        lock = ReadWriteLock()
+        lock.acquire_read()
+        writer = threading.Thread(target=lock.acquire_write)
+
+        # Act
+        writer.start()
+        writer.join(0.1)
+        blocked = writer.is_alive()
+        lock.release_read()
+        writer.join(1)
+
+        # Assert
+        self.assertTrue(blocked)
+        self.assertFalse(writer.is_alive())
+
+
+class TestResourceLock(unittest.TestCase):
+    def setUp(self):
+        self.driver = Driver()
+
+    def _context(self, name):
+        context = MagicMock()
+        context.resource.name = name
+        return context
+
+    def test_write_not_blocked_by_other_resource(self):
+        # Arrange
+        reader = threading.Thread(
+            target=self.driver.read, args=(self._context("switch-1"),)
+        )
+        reader.start()
+        self.driver.started.wait(1)
+
+        # Act
+        result = self.driver.write(self._context("switch-2"))
+
+        # Assert
+        self.driver.release.set()
+        reader.join(1)
+        self.assertEqual(result, "switch-2")
+
+    def test_wait_stats_recorded(self):
+        # Act
+        self.driver.write(self._context("switch-3"))
+
+        # Assert
+        self.assertEqual(ResourceLock.wait_stats()["switch-3"]["write"]["count"], 1)
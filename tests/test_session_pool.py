@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cli_latency import CliLatencyRegistry
+from session_pool import (
+    IdleTimeoutSessionPoolManager,
+    SessionPoolRegistry,
+    connection_fingerprint,
+)
+
+
+class TestIdleTimeoutSessionPoolManager(unittest.TestCase):
+    def setUp(self):
+        self.logger = MagicMock()
+        self.pool = IdleTimeoutSessionPoolManager(
+            max_pool_size=2, idle_timeout=100, health_check_interval=10
+        )
+        self.session = MagicMock()
+        self.session.active.return_value = True
+        self.pool._session_manager.new_session = MagicMock(return_value=self.session)
+        self.pool._session_manager.is_compatible = MagicMock(return_value=True)
+
+    @patch("session_pool.time")
+    def test_reuses_warm_session(self, mocked_time):
+        # Arrange
+        mocked_time.time.return_value = 0
+        session = self.pool.get_session([], "#", self.logger)
+        self.pool.return_session(session, self.logger)
+        mocked_time.time.return_value = 5
+
+        # Act
+        result = self.pool.get_session([], "#", self.logger)
+
+        # Assert
+        self.assertIs(result, session)
+        self.session.probe_for_prompt.assert_not_called()
+        self.pool._session_manager.new_session.assert_called_once()
+
+    @patch("session_pool.time")
+    def test_probes_session_idle_longer_than_interval(self, mocked_time):
+        # Arrange
+        mocked_time.time.return_value = 0
+        session = self.pool.get_session([], "#", self.logger)
+        self.pool.return_session(session, self.logger)
+        mocked_time.time.return_value = 50
+        self.session.probe_for_prompt.side_effect = Exception("closed")
+
+        # Act
+        self.pool.get_session([], "#", self.logger)
+
+        # Assert
+        self.session.disconnect.assert_called_once()
+        self.assertEqual(self.pool._session_manager.new_session.call_count, 2)
+
+    @patch("session_pool.time")
+    def test_evicts_idle_sessions(self, mocked_time):
+        # Arrange
+        mocked_time.time.return_value = 0
+        session = self.pool.get_session([], "#", self.logger)
+        self.pool.return_session(session, self.logger)
+        mocked_time.time.return_value = 100
+
+        # Act
+        self.pool.evict_idle_sessions(self.logger)
+
+        # Assert
+        self.assertTrue(self.pool._pool.empty())
+        self.session.disconnect.assert_called_once()
+
+
+class TestSessionPoolRegistry(unittest.TestCase):
+    def setUp(self):
+        self.cli_class = MagicMock(side_effect=lambda config: MagicMock())
+        self.registry = SessionPoolRegistry(cli_class=self.cli_class)
+        self.resource_config = MagicMock()
+        self.resource_config.name = "switch"
+        self.resource_config.address = "192.168.1.1"
+        self.resource_config.attributes = {
+            "Cisco NXOS Switch 2G.User": "admin",
+            "Cisco NXOS Switch 2G.VRF Management Name": "management",
+        }
+
+    def test_get_cli_reuses_pool(self):
+        # Act
+        first = self.registry.get_cli(self.resource_config)
+        second = self.registry.get_cli(self.resource_config)
+
+        # Assert
+        self.assertIs(first, second)
+
+    def test_get_cli_rebuilds_pool_on_credentials_change(self):
+        # Arrange
+        first = self.registry.get_cli(self.resource_config)
+        self.resource_config.attributes["Cisco NXOS Switch 2G.User"] = "root"
+
+        # Act
+        second = self.registry.get_cli(self.resource_config)
+
+        # Assert
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+
+    def test_connection_fingerprint_ignores_unrelated_attributes(self):
+        # Arrange
+        fingerprint = connection_fingerprint(self.resource_config)
+
+        # Act
+        self.resource_config.attributes["Cisco NXOS Switch 2G.VRF Management Name"] = (
+            "default"
+        )
+
+        # Assert
+        self.assertEqual(fingerprint, connection_fingerprint(self.resource_config))
+
+    def test_cli_latency_kept_when_pool_rebuilt(self):
+        # Arrange
+        cli_class = MagicMock()
+        registry = SessionPoolRegistry(
+            cli_class=cli_class, cli_latencies=CliLatencyRegistry()
+        )
+        registry.get_cli(self.resource_config)
+        self.resource_config.attributes["Cisco NXOS Switch 2G.User"] = "root"
+
+        # Act
+        registry.get_cli(self.resource_config)
+
+        # Assert
+        first, second = [
+            call.kwargs["cli_latency"] for call in cli_class.call_args_list
+        ]
+        self.assertIs(first, second)
@@ -0,0 +1,244 @@
+import logging
+import re
+import socket
+import time
+import unittest
+
+from cloudshell.snmp.cloudshell_snmp import Snmp
+from cloudshell.snmp.core.domain.snmp_oid import SnmpMibObject
+from cloudshell.snmp.snmp_parameters import SNMPReadParameters
+
+from tests.benchmark import find_regressions, percentile
+from tests.simulator import (
+    NXOSConfig,
+    SimulatedDevice,
+    TftpServer,
+    strip_telnet_commands,
+    tftp_download,
+    tftp_upload,
+)
+
+
+class TelnetClient(object):
+    def __init__(self, device):
+        self._socket = socket.create_connection((device.address, device.cli_port), 5)
+        self._buffer = ""
+
+    def read_until(self, pattern):
+        while not re.search(pattern, self._buffer):
+            data = self._socket.recv(4096)
+            if not data:
+                raise EOFError(self._buffer)
+            self._buffer += data.decode()
+        output, self._buffer = self._buffer, ""
+        return output
+
+    def login(self, username="admin", password="admin"):
+        self.read_until("login: $")
+        self._socket.sendall(username.encode() + b"\r\n")
+        self.read_until("Password: $")
+        self._socket.sendall(password.encode() + b"\r\n")
+        return self.read_until(r"# $|login: $")
+
+    def send(self, command, pattern=r"# $"):
+        self._socket.sendall(command.encode() + b"\r")
+        return self.read_until(pattern)
+
+    def close(self):
+        self._socket.close()
+
+
+class TestNXOSConfig(unittest.TestCase):
+    def test_sections_and_negation(self):
+        # Arrange
+        config = NXOSConfig("hostname sw\ninterface Ethernet1/1\n  shutdown\n")
+
+        # Act
+        section = config.apply("interface Ethernet1/1")
+        config.apply("no shutdown", section)
+        config.apply("description uplink", section)
+        config.apply("no hostname sw")
+
+        # Assert
+        self.assertEqual(
+            config.text(),
+            "interface Ethernet1/1\n  no shutdown\n  description uplink\n",
+        )
+
+    def test_telnet_negotiation_removed(self):
+        # Act
+        result = strip_telnet_commands(b"\xff\xfb\x01show\xff\xfa\x18\x00\xff\xf0 ver")
+
+        # Assert
+        self.assertEqual(result, b"show ver")
+
+
+class TestSimulatedDeviceCli(unittest.TestCase):
+    def setUp(self):
+        self.device = SimulatedDevice(hostname="nxos-1")
+        self.device.start()
+        self.addCleanup(self.device.stop)
+        self.client = TelnetClient(self.device)
+        self.addCleanup(self.client.close)
+
+    def test_wrong_password_rejected(self):
+        # Act
+        result = self.client.login(password="wrong")
+
+        # Assert
+        self.assertIn("Login incorrect", result)
+
+    def test_config_mode_prompts(self):
+        # Arrange
+        self.client.login()
+
+        # Act
+        config_prompt = self.client.send("configure terminal")
+        interface_prompt = self.client.send("interface Ethernet1/2")
+        self.client.send("description uplink")
+        self.client.send("end")
+        result = self.client.send("show running-config interface Ethernet1/2")
+
+        # Assert
+        self.assertTrue(config_prompt.endswith("nxos-1(config)# "))
+        self.assertTrue(interface_prompt.endswith("nxos-1(config-if)# "))
+        self.assertIn("interface Ethernet1/2\r\n  no shutdown\r\n  description", result)
+
+    def test_invalid_command(self):
+        # Arrange
+        self.client.login()
+
+        # Act
+        result = self.client.send("redundancy reload shelf")
+
+        # Assert
+        self.assertIn("% Invalid command at '^' marker.", result)
+
+    def test_latency(self):
+        # Arrange
+        self.client.login()
+        self.device.latency = 0.2
+        started = time.time()
+
+        # Act
+        self.client.send("show hostname")
+
+        # Assert
+        self.assertGreaterEqual(time.time() - started, 0.2)
+
+    def test_copy_to_tftp_and_back(self):
+        # Arrange
+        tftp = TftpServer()
+        tftp.start()
+        self.addCleanup(tftp.stop)
+        self.client.login()
+        url = tftp.url("backups/nxos-1.cfg")
+
+        # Act
+        saved = self.client.send("copy running-config {} vrf management".format(url))
+        self.client.send("configure terminal")
+        self.client.send("no feature lacp")
+        self.client.send("end")
+        restored = self.client.send("copy {} running-config".format(url))
+
+        # Assert
+        self.assertIn("Copy complete.", saved)
+        self.assertIn("Copy complete.", restored)
+        self.assertIn(b"hostname nxos-1", tftp.get_file("backups/nxos-1.cfg"))
+        self.assertIn("feature lacp", self.client.send("show running-config"))
+
+    def test_reload_boots_image_of_boot_variable(self):
+        # Arrange
+        self.device.reload_time = 0.2
+        self.device.bootflash["new.bin"] = b"image"
+        self.client.login()
+        self.client.send("configure terminal")
+        self.client.send("no boot nxos")
+        self.client.send("boot nxos bootflash:/new.bin")
+        self.client.send("end")
+        self.client.send("copy running-config startup-config")
+
+        # Act
+        self.client.send("reload", r"\(y/n\)\?  \[n\] $")
+        self.client.send("y", r"$")
+        time.sleep(0.3)
+        client = TelnetClient(self.device)
+        self.addCleanup(client.close)
+        client.login()
+        result = client.send("show version")
+
+        # Assert
+        self.assertIn("NXOS image file is: bootflash:///new.bin", result)
+
+
+class TestSimulatedDeviceSnmp(unittest.TestCase):
+    def setUp(self):
+        self.device = SimulatedDevice(hostname="nxos-1")
+        self.device.start()
+        self.addCleanup(self.device.stop)
+        self.parameters = SNMPReadParameters(
+            self.device.address, "public", version="2", port=self.device.snmp_port
+        )
+
+    def test_recorded_walk_served(self):
+        # Act
+        with Snmp().get_snmp_service(self.parameters, logging.getLogger()) as service:
+            name = service.get(SnmpMibObject("SNMPv2-MIB", "sysName", "0"))
+            ports = service.get_table(SnmpMibObject("IF-MIB", "ifDescr"))
+
+        # Assert
+        self.assertEqual(name.safe_value, "nxos-1")
+        self.assertEqual(len(ports), 9)
+
+    def test_wrong_community_ignored(self):
+        # Arrange
+        self.device.community = "private"
+
+        # Act
+        with Snmp(timeout=200, retry_count=0).get_snmp_service(
+            self.parameters, logging.getLogger()
+        ) as service:
+            with self.assertRaises(Exception):
+                service.get(SnmpMibObject("SNMPv2-MIB", "sysName", "0"))
+
+
+class TestTftp(unittest.TestCase):
+    def test_upload_and_download(self):
+        # Arrange
+        server = TftpServer()
+        server.start()
+        self.addCleanup(server.stop)
+        data = bytes(range(256)) * 8
+
+        # Act
+        tftp_upload(server.address, server.port, "image.bin", data)
+        result = tftp_download(server.address, server.port, "image.bin")
+
+        # Assert
+        self.assertEqual(result, data)
+
+
+class TestBenchmarkReport(unittest.TestCase):
+    def test_percentile(self):
+        # Act
+        result = percentile([5, 1, 4, 2, 3], 0.5)
+
+        # Assert
+        self.assertEqual(result, 3)
+
+    def test_regression_over_tolerance(self):
+        # Arrange
+        baseline = [
+            {"devices": 10, "command": "save", "p50": 1.0},
+            {"devices": 10, "command": "restore", "p50": 1.0},
+        ]
+        results = [
+            {"devices": 10, "command": "save", "p50": 1.1},
+            {"devices": 10, "command": "restore", "p50": 1.5},
+        ]
+
+        # Act
+        regressions = find_regressions(results, baseline, tolerance=0.2)
+
+        # Assert
+        self.assertEqual([result["command"] for result, _ in regressions], ["restore"])
@@ -0,0 +1,185 @@
+import unittest
+from collections import OrderedDict
+from unittest.mock import MagicMock, patch
+
+from pysnmp.proto import rfc1902
+
+from snmp_autoload import (
+    AUTOLOAD_TABLES,
+    ENTITY_CLASS_OID,
+    ENTITY_SERIAL_OID,
+    AutoloadState,
+    BulkWalkSnmpService,
+)
+
+IF_TYPE_OID = "1.3.6.1.2.1.2.2.1.3"
+
+
+class TestBulkWalkSnmpService(unittest.TestCase):
+    def setUp(self):
+        self.logger = MagicMock()
+        self.service = BulkWalkSnmpService(
+            snmp_engine=MagicMock(),
+            context_id=None,
+            context_name="",
+            logger=self.logger,
+            get_bulk_flag=True,
+        )
+        self.service._start_dispatcher = MagicMock()
+        self.if_type = MagicMock()
+        self.if_type.get_oid.return_value = IF_TYPE_OID
+        self.response = MagicMock(_raw_oid=IF_TYPE_OID + ".5")
+
+    @patch("snmp_autoload.TimedSnmpResponseReader")
+    def _prefetch(self, mocked_reader):
+        reader = mocked_reader.return_value
+        reader.cb_ctx = {"is_snmp_timeout": False}
+        reader.result = {self.response}
+        reader.finished = 0
+        self.service.prefetch(OrderedDict([("IF-MIB", [self.if_type])]), 30)
+        return reader
+
+    def test_prefetch_sends_all_walks_before_single_dispatch(self):
+        # Act
+        reader = self._prefetch()
+
+        # Assert
+        reader.send_bulk_var_binds.assert_called_once()
+        self.service._start_dispatcher.assert_called_once()
+        self.assertEqual(self.service.table_timings["IF-MIB"]["entries"], 1)
+
+    def test_walk_served_from_prefetched_table(self):
+        # Arrange
+        self._prefetch()
+
+        # Act
+        result = self.service.walk(self.if_type)
+
+        # Assert
+        self.assertEqual(result, [self.response])
+        self.service._start_dispatcher.assert_called_once()
+
+    def test_get_served_from_prefetched_table(self):
+        # Arrange
+        self._prefetch()
+        existing = MagicMock()
+        existing.get_oid.return_value = IF_TYPE_OID + ".5"
+        missing = MagicMock()
+        missing.get_oid.return_value = IF_TYPE_OID + ".6"
+
+        # Act
+        result = self.service.get(existing)
+        missing_result = self.service.get(missing)
+
+        # Assert
+        self.assertIs(result, self.response)
+        self.assertIsNone(missing_result)
+        self.service._start_dispatcher.assert_called_once()
+
+    @patch("snmp_autoload.SnmpResponse")
+    def test_restored_tables_bound_to_engine(self, mocked_response):
+        # Arrange
+        value = rfc1902.Integer32(6)
+
+        # Act
+        self.service.reuse_tables(
+            {"IF-MIB": {IF_TYPE_OID: [(IF_TYPE_OID + ".5", value)]}}
+        )
+
+        # Assert
+        mocked_response.assert_called_once_with(
+            IF_TYPE_OID + ".5", value, self.service._snmp_engine, self.logger
+        )
+        self.assertEqual(
+            self.service.walk(self.if_type), [mocked_response.return_value]
+        )
+
+
+class TestAutoloadState(unittest.TestCase):
+    def setUp(self):
+        self.markers = {
+            "sysUpTime": 1000,
+            "ifTableLastChange": 100,
+            "entLastChangeTime": 50,
+        }
+        self.state = AutoloadState(self.markers, MagicMock(), {})
+
+    def test_nothing_changed_rewalks_unmarked_tables(self):
+        # Act
+        result = self.state.changed_groups(dict(self.markers, sysUpTime=2000))
+
+        # Assert
+        self.assertEqual(result, ["IP-MIB", "LLDP/CDP"])
+
+    def test_reboot_rewalks_all_tables(self):
+        # Act
+        result = self.state.changed_groups(dict(self.markers, sysUpTime=10))
+
+        # Assert
+        self.assertEqual(result, list(AUTOLOAD_TABLES))
+
+    def test_missing_marker_rewalks_all_tables(self):
+        # Act
+        result = self.state.changed_groups(dict(self.markers, ifTableLastChange=None))
+
+        # Assert
+        self.assertEqual(result, list(AUTOLOAD_TABLES))
+
+    def test_interface_change_rewalks_interface_tables(self):
+        # Act
+        result = self.state.changed_groups(dict(self.markers, ifTableLastChange=200))
+
+        # Assert
+        self.assertEqual(result, ["IF-MIB", "IP-MIB", "LLDP/CDP"])
+
+    def test_entity_change_rewalks_entity_table(self):
+        # Act
+        result = self.state.changed_groups(dict(self.markers, entLastChangeTime=70))
+
+        # Assert
+        self.assertEqual(result, ["ENTITY-MIB", "IP-MIB", "LLDP/CDP"])
+
+    def _entity_state(self):
+        tables = {
+            "ENTITY-MIB": {
+                ENTITY_CLASS_OID: [
+                    (ENTITY_CLASS_OID + ".22", rfc1902.Integer32(9)),
+                    (ENTITY_CLASS_OID + ".10", rfc1902.Integer32(3)),
+                ],
+                ENTITY_SERIAL_OID: [
+                    (ENTITY_SERIAL_OID + ".22", rfc1902.OctetString("JAF0000MOD")),
+                    (ENTITY_SERIAL_OID + ".10", rfc1902.OctetString("JAF1234ABCD")),
+                ],
+            }
+        }
+        markers = dict(self.markers, sysObjectID="1.3.6.1.4.1.9.12.3.1.3.1096")
+        return AutoloadState(markers, MagicMock(), tables)
+
+    def test_chassis_serial(self):
+        # Act
+        result = self._entity_state().chassis_serial()
+
+        # Assert
+        self.assertEqual(result, (ENTITY_SERIAL_OID + ".10", "JAF1234ABCD"))
+
+    def test_same_device(self):
+        # Arrange
+        state = self._entity_state()
+
+        # Act
+        result = state.same_device(
+            dict(state.markers, entPhysicalSerialNum="JAF1234ABCD")
+        )
+
+        # Assert
+        self.assertTrue(result)
+
+    def test_replaced_device(self):
+        # Arrange
+        state = self._entity_state()
+
+        # Act
+        result = state.same_device(dict(state.markers, entPhysicalSerialNum="OTHER"))
+
+        # Assert
+        self.assertFalse(result)
@@ -0,0 +1,46 @@
+import unittest
+from unittest.mock import MagicMock
+
+from snmp_state import CachedEnableDisableSnmpFlow, SnmpStateRegistry
+
+
+class TestCachedEnableDisableSnmpFlow(unittest.TestCase):
+    def setUp(self):
+        self.inner_flow = MagicMock()
+        self.registry = SnmpStateRegistry()
+        self.snmp = MagicMock()
+        self.service = self.snmp.get_snmp_service.return_value.__enter__.return_value
+        self.flow = CachedEnableDisableSnmpFlow(
+            self.inner_flow, self.registry, "switch", MagicMock(), snmp=self.snmp
+        )
+        self.snmp_parameters = MagicMock(ip="192.168.1.1", snmp_community="public")
+
+    def test_enable_skipped_when_snmp_answers(self):
+        # Act
+        self.flow.enable_snmp(self.snmp_parameters)
+
+        # Assert
+        self.inner_flow.enable_snmp.assert_not_called()
+        self.assertEqual(self.registry.stats()["skipped"], 1)
+
+    def test_enable_runs_cli_when_probe_fails(self):
+        # Arrange
+        self.service.get.side_effect = Exception("timeout")
+
+        # Act
+        self.flow.enable_snmp(self.snmp_parameters)
+
+        # Assert
+        self.inner_flow.enable_snmp.assert_called_once_with(self.snmp_parameters)
+        self.assertEqual(self.registry.stats()["enabled"], 1)
+
+    def test_enable_after_disable_does_not_probe(self):
+        # Arrange
+        self.flow.disable_snmp(self.snmp_parameters)
+
+        # Act
+        self.flow.enable_snmp(self.snmp_parameters)
+
+        # Assert
+        self.snmp.get_snmp_service.assert_not_called()
+        self.inner_flow.enable_snmp.assert_called_once_with(self.snmp_parameters)